@@ -1,12 +1,24 @@
 import json
 import os
-from copy import copy
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from threading import BoundedSemaphore
 
 root = os.path.dirname(__file__)
 dictionary_file = os.path.join(root, 'vendor/makemeahanzi/dictionary.txt')
 graphics_file = os.path.join(root, 'vendor/makemeahanzi/graphics.txt')
 output_dir = os.path.join(root, 'data')
 
+# Shared ETL instrumentation (etl/metrics.py in the project root)
+sys.path.insert(0, os.path.join(root, '..', '..', '..', '..', 'etl'))
+from metrics import Metrics
+
+# Output is I/O bound: a few writer threads, and a cap on queued files so a
+# slow disk can't make the whole stroke set pile up in memory.
+writer_workers = 8
+max_pending_writes = 256
+
 positioners = {
   '⿰': 2,
   '⿱': 2,
@@ -23,33 +35,19 @@ positioners = {
 }
 missing_marker = '？'
 
-graphics_data = {}
-dict_data = {}
-
-with open(dictionary_file) as f:
-  lines = f.readlines()
-  for line in lines:
-    decoded_line = json.loads(line)
-    dict_data[decoded_line['character']] = decoded_line
-
-with open(graphics_file) as f:
-  lines = f.readlines()
-  for line in lines:
-    decoded_line = json.loads(line)
-    char = decoded_line.pop('character')
-    graphics_data[char] = decoded_line
 
-
-def get_decomp_index(char, subchar):
+@lru_cache(maxsize=None)
+def get_decomp_index(decomposition, subchar):
   "Parse the decomposition tree to figure out what the index of the subchar is within the char"
+  # Keyed on the IDS string rather than the char, so characters sharing a
+  # decomposition (and radical) share the walk.
   stack = []
-  for piece in dict_data[char]['decomposition']:
+  for piece in decomposition:
     last_node = None
     path = []
     if len(stack) > 0:
       last_node = stack.pop()
-      path = copy(last_node['path'])
-      path.append(last_node['children'])
+      path = last_node['path'] + [last_node['children']]
       last_node['children'] += 1
       if last_node['children'] < last_node['size']:
         stack.append(last_node)
@@ -57,38 +55,89 @@ def get_decomp_index(char, subchar):
       node = {
         'size': positioners[piece],
         'children': 0,
-        'path': path, 
+        'path': path,
       }
       stack.append(node)
     elif piece == subchar:
-      return path
+      return tuple(path)
   return None
 
-def get_radical_strokes(char):
-  radical = dict_data[char]['radical']
+def get_radical_strokes(char, entry):
+  radical = entry['radical']
   if char == radical:
     return None
-  decomp_index = get_decomp_index(char, radical)
+  decomp_index = get_decomp_index(entry['decomposition'], radical)
   if not decomp_index:
     return None
+  decomp_index = list(decomp_index)
   rad_strokes = []
-  for stroke_num, match_index in enumerate(dict_data[char]['matches']):
+  for stroke_num, match_index in enumerate(entry['matches']):
     if match_index == decomp_index:
       rad_strokes.append(stroke_num)
   return rad_strokes
 
+def iter_lockstep(dict_f, graphics_f):
+  """
+  Yield (char, graphics_data, dictionary_entry) in graphics.txt order. Both
+  files are sorted the same way, so normally each graphics line pairs with
+  the next dictionary line; entries that get out of step are parked in a
+  small dict until their partner shows up.
+  """
+  parked = {}
+  dict_lines = iter(dict_f)
+  for line in graphics_f:
+    if not line.strip():
+      continue
+    data = json.loads(line)
+    char = data.pop('character')
+    entry = parked.pop(char, None)
+    while entry is None:
+      dict_line = next(dict_lines, None)
+      if dict_line is None:
+        break
+      if not dict_line.strip():
+        continue
+      decoded = json.loads(dict_line)
+      if decoded['character'] == char:
+        entry = decoded
+      else:
+        parked[decoded['character']] = decoded
+    yield char, data, entry
+
+def write_file(path, text):
+  with open(path, 'w') as f:
+    f.write(text)
+
 
 # write out data
 
-for char in graphics_data:
-  radical = get_radical_strokes(char)
-  if radical:
-    graphics_data[char]['radStrokes'] = radical
+slots = BoundedSemaphore(max_pending_writes)
+metrics = Metrics('stroke_data_parser', [dictionary_file, graphics_file], [output_dir])
 
-for char, data in graphics_data.items():
-  out_file = os.path.join(output_dir, f'{char}.json')
-  with open(out_file, 'w') as f:
-    f.write(json.dumps(data, ensure_ascii=False))
+def submit_write(pool, path, text):
+  slots.acquire()
+  fut = pool.submit(write_file, path, text)
+  fut.add_done_callback(lambda _: slots.release())
+  return fut
 
-with open(os.path.join(output_dir, 'all.json'), 'w') as f:
-  f.write(json.dumps(graphics_data, ensure_ascii=False))
+with open(dictionary_file) as dict_f, open(graphics_file) as graphics_f, \
+     open(os.path.join(output_dir, 'all.json'), 'w') as all_f, \
+     ThreadPoolExecutor(max_workers=writer_workers) as pool:
+  futures = []
+  # all.json is written entry by entry; the bytes match json.dumps(graphics_data)
+  all_f.write('{')
+  for i, (char, data, entry) in enumerate(iter_lockstep(dict_f, graphics_f)):
+    radical = get_radical_strokes(char, entry) if entry else None
+    if radical:
+      data['radStrokes'] = radical
+    encoded = json.dumps(data, ensure_ascii=False)
+    futures.append(submit_write(pool, os.path.join(output_dir, f'{char}.json'), encoded))
+    all_f.write(f'{", " if i else ""}{json.dumps(char, ensure_ascii=False)}: {encoded}')
+  all_f.write('}')
+  metrics.mark('parse')
+  for fut in futures:
+    fut.result()
+# Writes overlap parsing; this is only the tail still queued when parsing ended
+metrics.mark('write')
+metrics.rows_in = metrics.rows_out = len(futures)
+metrics.write()
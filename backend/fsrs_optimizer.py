@@ -0,0 +1,534 @@
+"""
+Per-user FSRS weight fitting over the review log.
+
+The scheduler runs everybody on the ts-fsrs default weights. This fits the 21
+FSRS-6 weights to the review log instead: once globally, then per user with
+the global fit as the prior. Users with fewer than MIN_REVIEWS reviews keep
+the global weights.
+
+Training target, as in the FSRS optimizers: at every review after the first
+that falls on a later calendar day, predict recall (grade > Again) from the
+retrievability R(t, S) of the stability carried in from the previous review.
+Loss is log-loss. Same-day reviews still update S and D through the
+short-term formula but are not scored.
+
+Gradients are exact and forward-mode. Along with S and D, the replay carries
+dS/dw and dD/dw for every card, so one lockstep pass (as in fsrs_replay)
+yields the gradient of every user's loss at once. Each user's rows are
+weighted by 1/reviews, and all users take an Adam step together
+(full batch). Each user's weights are pulled towards the prior by PRIOR
+pseudo-reviews and clipped to the FSRS-6 parameter bounds.
+
+State is checkpointed to data/processed/fsrs_weights.npz: weights, Adam
+moments, review counts and each user's newest review. A later run resumes
+from the checkpoint and refits only users with new reviews. The global
+weights are refit only with --full.
+
+    python fsrs_optimizer.py reviews.json --out fsrs_weights.csv
+    python fsrs_optimizer.py reviews.json --apply            # user_fsrs_weights (DATABASE_URL / DB_*)
+    python fsrs_optimizer.py --bench 40 --iters 60           # synthetic users drawn from known weights
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+import fsrs_replay as fr
+from fsrs_replay import AGAIN, HARD, GOOD, EASY, MS_DAY, S_MIN, S_MAX, DEFAULT_W
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT = os.path.join(HERE, "data", "processed", "fsrs_weights.npz")
+CHECKPOINT_VERSION = 1
+
+N_W = 21
+MIN_REVIEWS = 200   # users below this keep the global weights
+PRIOR = 50.0        # pseudo-reviews pulling a user's weights towards the prior
+EPS = 1e-6
+
+# FSRS-6 parameter clipper (fsrs-rs)
+BOUNDS = np.array([
+    (S_MIN, 100), (S_MIN, 100), (S_MIN, 100), (S_MIN, 100),
+    (1, 10), (0.001, 4), (0.001, 4), (0.001, 0.75),
+    (0, 4.5), (0, 0.8), (0.001, 3.5), (0.001, 5),
+    (0.001, 0.25), (0.001, 0.9), (0, 4), (0, 1),
+    (1, 6), (0, 2), (0, 2), (0, 0.8), (0.1, 0.8),
+])
+LO, HI = BOUNDS[:, 0], BOUNDS[:, 1]
+
+
+# -- FSRS-6 with forward-mode derivatives ------------------------------------
+# w is one weight row per card (m x 21). Each J* is d(value)/dw (m x 21), or None
+# when only values are needed.
+
+def _init(w, g, grad):
+    rows = np.arange(len(g))
+    w_g = w[rows, g - 1]
+    s = np.maximum(w_g, 0.1)
+    e = np.exp((g - 1) * w[:, 5])
+    raw = w[:, 4] - e + 1
+    d = np.clip(raw, 1, 10)
+    if not grad:
+        return s, d, None, None
+    Js = np.zeros((len(g), N_W))
+    Js[rows, g - 1] = w_g > 0.1
+    inside = (raw > 1) & (raw < 10)
+    Jd = np.zeros((len(g), N_W))
+    Jd[:, 4] = inside
+    Jd[:, 5] = -(g - 1) * e * inside
+    return s, d, Js, Jd
+
+def _retrievability(w, t, s, Js):
+    c = -w[:, 20]
+    base = 0.9 ** (1 / c)
+    f = base - 1
+    u = 1 + f * t / s
+    r = u ** c
+    if Js is None:
+        return r, None
+    df_dc = base * math.log(0.9) / -(c * c)
+    Jr = (r * c / u * (-f * t / (s * s)))[:, None] * Js
+    Jr[:, 20] -= r * (np.log(u) + c / u * t / s * df_dc)
+    return r, Jr
+
+def _next_difficulty(w, d, g, Jd):
+    e3 = np.exp(3 * w[:, 5])
+    d0 = w[:, 4] - e3 + 1
+    delta = -w[:, 6] * (g - 3)
+    nd = d + delta * (10 - d) / 9
+    w7 = w[:, 7]
+    raw = w7 * d0 + (1 - w7) * nd
+    if Jd is None:
+        return np.clip(raw, 1, 10), None
+    J = ((1 - w7) * (1 - delta / 9))[:, None] * Jd
+    J[:, 6] += (1 - w7) * -(g - 3) * (10 - d) / 9
+    J[:, 7] += d0 - nd
+    J[:, 4] += w7
+    J[:, 5] -= w7 * 3 * e3
+    J *= ((raw > 1) & (raw < 10))[:, None]
+    return np.clip(raw, 1, 10), J
+
+def _short_term(w, s, g, Js):
+    ex = np.exp(w[:, 17] * (g - 3 + w[:, 18]))
+    ss = s ** (1 - w[:, 19]) * ex
+    flat = (g >= HARD) & (ss < s)   # sinc clamped to 1
+    out = np.where(flat, s, ss)
+    if Js is None:
+        return out, None
+    J = ((1 - w[:, 19]) * ss / s)[:, None] * Js
+    J[:, 19] -= np.log(s) * ss
+    J[:, 17] += (g - 3 + w[:, 18]) * ss
+    J[:, 18] += w[:, 17] * ss
+    return out, np.where(flat[:, None], Js, J)
+
+def _recall(w, s, d, r, g, Js, Jd, Jr):
+    hp = np.where(g == HARD, w[:, 15], 1.0)
+    eb = np.where(g == EASY, w[:, 16], 1.0)
+    ex = np.exp((1 - r) * w[:, 10])
+    base = np.exp(w[:, 8]) * (11 - d) * s ** -w[:, 9] * hp * eb
+    a = base * (ex - 1)
+    out = s * (1 + a)
+    if Js is None:
+        return out, None
+    J = (1 + a - w[:, 9] * a)[:, None] * Js
+    J += (-s * a / (11 - d))[:, None] * Jd
+    J += (-s * base * ex * w[:, 10])[:, None] * Jr
+    J[:, 8] += s * a
+    J[:, 9] -= s * np.log(s) * a
+    J[:, 10] += s * base * ex * (1 - r)
+    J[:, 15] += np.where(g == HARD, s * a / w[:, 15], 0.0)
+    J[:, 16] += np.where(g == EASY, s * a / w[:, 16], 0.0)
+    return out, J
+
+def _forget(w, s, d, r, Js, Jd, Jr):
+    A = w[:, 11] * d ** -w[:, 12]
+    P = (s + 1) ** w[:, 13]
+    X = np.exp((1 - r) * w[:, 14])
+    sf = A * (P - 1) * X
+    k = np.exp(-w[:, 17] * w[:, 18])
+    smin = s * k
+    use_min = smin < sf
+    out = np.where(use_min, smin, sf)
+    if Js is None:
+        return out, None
+    J = (A * w[:, 13] * P / (s + 1) * X)[:, None] * Js
+    J += (-w[:, 12] * sf / d)[:, None] * Jd
+    J += (-w[:, 14] * sf)[:, None] * Jr
+    J[:, 11] += sf / w[:, 11]
+    J[:, 12] -= np.log(d) * sf
+    J[:, 13] += A * P * np.log(s + 1) * X
+    J[:, 14] += (1 - r) * sf
+    Jm = k[:, None] * Js
+    Jm[:, 17] -= w[:, 18] * smin
+    Jm[:, 18] -= w[:, 17] * smin
+    return out, np.where(use_min[:, None], Jm, J)
+
+def _next_stability(w, s, d, t, g, grad):
+    """(S', dS'/dw, R, dR/dw); R is 1 where t == 0 (not scored)."""
+    Js, Jd = grad if grad else (None, None)
+    m = len(s)
+    out = np.empty(m)
+    J = np.empty((m, N_W)) if grad else None
+    r = np.ones(m)
+    Jr = np.zeros((m, N_W)) if grad else None
+    same_day = t == 0
+    i = np.flatnonzero(same_day)
+    if len(i):
+        out[i], Ji = _short_term(w[i], s[i], g[i], Js[i] if grad else None)
+        if grad:
+            J[i] = Ji
+    later = np.flatnonzero(~same_day)
+    if len(later):
+        r[later], Jr_l = _retrievability(w[later], t[later], s[later], Js[later] if grad else None)
+        if grad:
+            Jr[later] = Jr_l
+        for sel, fn in ((g[later] > AGAIN, "recall"), (g[later] == AGAIN, "forget")):
+            j = later[sel]
+            if not len(j):
+                continue
+            args = (w[j], s[j], d[j], r[j])
+            jac = (Js[j], Jd[j], Jr[j]) if grad else (None, None, None)
+            if fn == "recall":
+                out[j], Jj = _recall(*args, g[j], *jac)
+            else:
+                out[j], Jj = _forget(*args, *jac)
+            if grad:
+                J[j] = Jj
+    clipped = (out < S_MIN) | (out > S_MAX)
+    out = np.clip(out, S_MIN, S_MAX)
+    if grad:
+        J[clipped] = 0.0
+    return out, J, r, Jr
+
+
+# -- One lockstep pass over every card ----------------------------------------
+
+def forward(W, card_user, ts, grade, start, count, grad=True):
+    """
+    Replays every card with its user's weights W[card_user]. Returns per-user
+    (log-loss sum, squared-error sum, scored reviews, d loss/dW sum or None).
+    """
+    n_users = len(W)
+    order = np.argsort(-count, kind="stable")
+    first_row = start[order]
+    users = card_user[order]
+    max_len = int(count[order[0]]) if len(order) else 0
+    active = np.searchsorted(-count[order], -np.arange(max_len), side="left")
+
+    loss = np.zeros(n_users)
+    sq = np.zeros(n_users)
+    scored = np.zeros(n_users)
+    G = np.zeros((n_users, N_W)) if grad else None
+    s = d = Js = Jd = last = None
+    for k in range(max_len):
+        m = int(active[k])
+        rows = first_row[:m] + k
+        g = grade[rows].astype(np.int64)
+        t_ms = ts[rows]
+        u = users[:m]
+        w = W[u]
+        if k == 0:
+            s, d, Js, Jd = _init(w, g, grad)
+        else:
+            s, d, last = s[:m], d[:m], last[:m]
+            if grad:
+                Js, Jd = Js[:m], Jd[:m]
+            t = (t_ms // MS_DAY - last // MS_DAY).astype(np.float64)
+            new_s, J_s, r, Jr = _next_stability(w, s, d, t, g, (Js, Jd) if grad else None)
+            d, Jd = _next_difficulty(w, d, g, Jd)
+            s, Js = new_s, J_s
+            mask = t > 0
+            if mask.any():
+                p = np.clip(r[mask], EPS, 1 - EPS)
+                y = (g[mask] > AGAIN).astype(np.float64)
+                um = u[mask]
+                loss += np.bincount(um, -(y * np.log(p) + (1 - y) * np.log(1 - p)), n_users)
+                sq += np.bincount(um, (p - y) ** 2, n_users)
+                scored += np.bincount(um, minlength=n_users)
+                if grad:
+                    gr = ((p - y) / (p * (1 - p)))[:, None] * Jr[mask]
+                    for col in range(N_W):
+                        G[:, col] += np.bincount(um, gr[:, col], n_users)
+        last = t_ms
+    return loss, sq, scored, G
+
+
+def fit(W, prior, card_user, rows, cards, iters, lr=0.04, adam=None, on_iter=None):
+    """Full-batch Adam on every user's mean log-loss plus the pull towards prior."""
+    W = W.copy()
+    m, v, step = adam if adam is not None else (np.zeros_like(W), np.zeros_like(W), np.zeros(len(W)))
+    scale2 = (HI - LO) ** 2
+    b1, b2 = 0.9, 0.999
+    for it in range(iters):
+        loss, sq, n, G = forward(W, card_user, rows.ts, rows.grade, cards.start, cards.count)
+        N = np.maximum(n, 1)[:, None]
+        G = G / N + 2 * PRIOR / N * (W - prior) / scale2
+        step += 1
+        m = b1 * m + (1 - b1) * G
+        v = b2 * v + (1 - b2) * G * G
+        # cosine decay to 10% of lr over the run
+        rate = lr * (0.55 + 0.45 * math.cos(math.pi * it / max(1, iters)))
+        m_hat = m / (1 - b1 ** step)[:, None]
+        v_hat = v / (1 - b2 ** step)[:, None]
+        W = np.clip(W - rate * m_hat / (np.sqrt(v_hat) + 1e-8), LO, HI)
+        if on_iter:
+            on_iter(it, loss.sum() / max(1.0, n.sum()), W, (m, v, step))
+    return W, (m, v, step)
+
+
+# -- Reports ------------------------------------------------------------------
+
+def evaluate(W, card_user, rows, cards):
+    loss, sq, n, _ = forward(W, card_user, rows.ts, rows.grade, cards.start, cards.count, grad=False)
+    N = np.maximum(n, 1)
+    return loss / N, np.sqrt(sq / N), n
+
+def _total(loss, rmse, n):
+    N = max(1.0, n.sum())
+    return (loss * n).sum() / N, math.sqrt((rmse ** 2 * n).sum() / N)
+
+
+# -- Checkpoint / weights table --------------------------------------------------
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        if int(z["version"]) != CHECKPOINT_VERSION:
+            return None
+        return {k: z[k] for k in z.files}
+
+def save_checkpoint(path, ck):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, version=CHECKPOINT_VERSION, **ck)
+    os.replace(tmp, path)
+
+def weight_rows(ck, metrics):
+    """One row per user: fitted weights, or the global ones below MIN_REVIEWS."""
+    out = []
+    for i, uid in enumerate(ck["user_id"]):
+        fitted = bool(ck["fitted"][i])
+        w = ck["user_w"][i] if fitted else ck["global_w"]
+        out.append({
+            "user_id": int(uid), "source": "user" if fitted else "global", "reviews": int(ck["reviews"][i]),
+            "log_loss": round(float(metrics["log_loss"][i]), 6), "rmse": round(float(metrics["rmse"][i]), 6),
+            "log_loss_default": round(float(metrics["log_loss_default"][i]), 6),
+            "rmse_default": round(float(metrics["rmse_default"][i]), 6),
+            "weights": [round(float(x), 6) for x in w],
+        })
+    return out
+
+def write_csv(path, table):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        cols = ["user_id", "source", "reviews", "log_loss", "rmse", "log_loss_default", "rmse_default", "weights"]
+        w.writerow(cols)
+        for r in table:
+            w.writerow([r[c] if c != "weights" else json.dumps(r[c]) for c in cols])
+
+def apply_postgres(dsn, table):
+    """Upsert user_fsrs_weights (created by server.js ensureSkillsSchema)."""
+    try:
+        import psycopg
+        con = psycopg.connect(dsn)
+    except ImportError:
+        import psycopg2
+        con = psycopg2.connect(dsn)
+    try:
+        with con.cursor() as cur:
+            cur.executemany("""
+                INSERT INTO user_fsrs_weights (user_id, weights, source, review_count, log_loss, rmse, fitted_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (user_id) DO UPDATE SET weights = EXCLUDED.weights, source = EXCLUDED.source,
+                    review_count = EXCLUDED.review_count, log_loss = EXCLUDED.log_loss,
+                    rmse = EXCLUDED.rmse, fitted_at = EXCLUDED.fitted_at""",
+                [(r["user_id"], r["weights"], r["source"], r["reviews"], r["log_loss"], r["rmse"]) for r in table])
+        con.commit()
+    finally:
+        con.close()
+    return len(table)
+
+
+# -- Synthetic data -------------------------------------------------------------
+
+def simulate_reviews(n_users, cards_per_user=300, days=365, seed=0):
+    """
+    Users whose memories follow their own weights (defaults jittered by
+    +-30%): each card is reviewed when due (+-1 day) and recalled with
+    probability R. Returns (Reviews, true weights per user).
+    """
+    rng = np.random.default_rng(seed)
+    base = np.asarray(DEFAULT_W)
+    true_w = np.clip(base * rng.uniform(0.7, 1.3, (n_users, N_W)), LO, HI)
+    n = n_users * cards_per_user
+    card_user = np.repeat(np.arange(n_users), cards_per_user)
+    w = true_w[card_user]
+    now = rng.integers(0, days // 3, n).astype(np.float64)   # day of first review
+    g = rng.choice([AGAIN, HARD, GOOD, EASY], n, p=[0.25, 0.15, 0.5, 0.1])
+    s, d, _, _ = _init(w, g, False)
+    cols = [(np.arange(n), now.copy(), g)]
+    # most new cards get a same-day learning step 10 minutes later
+    step = np.flatnonzero(rng.random(n) < 0.6)
+    g = rng.choice([AGAIN, GOOD], len(step), p=[0.2, 0.8])
+    s[step], _, _, _ = _next_stability(w[step], s[step], d[step], np.zeros(len(step)), g, None)
+    d[step], _ = _next_difficulty(w[step], d[step], g, None)
+    cols.append((step, now[step] + 10 / 1440, g))
+    alive = np.arange(n)
+    while True:
+        # at retention 0.9 the interval is S itself
+        t = np.maximum(1, np.round(s) + rng.integers(-1, 2, len(alive)))
+        now = now + t
+        keep = now < days
+        if not keep.any():
+            break
+        alive, now, s, d, w, t = alive[keep], now[keep], s[keep], d[keep], w[keep], t[keep]
+        r, _ = _retrievability(w, t, s, None)
+        recalled = rng.random(len(alive)) < r
+        g = np.where(recalled, rng.choice([HARD, GOOD, EASY], len(alive), p=[0.15, 0.75, 0.1]), AGAIN)
+        s_new, _, _, _ = _next_stability(w, s, d, t, g, None)
+        d, _ = _next_difficulty(w, d, g, None)
+        s = s_new
+        cols.append((alive, now.copy(), g))
+    card = np.concatenate([c for c, _, _ in cols])
+    day = np.concatenate([x for _, x, _ in cols])
+    grade = np.concatenate([x for _, _, x in cols]).astype(np.int8)
+    ts = (1_700_000_000_000 + day * MS_DAY + 9 * 3_600_000).astype(np.int64)
+    skills = np.full(len(card), "recognition", dtype=object)
+    return fr.Reviews(card_user[card], card, skills, ts, grade), true_w
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fit global and per-user FSRS weights to the review log")
+    ap.add_argument("reviews", nargs="?", help="/api/reviews/export output (.json or .csv)")
+    ap.add_argument("--iters", type=int, default=80, help="Adam iterations per fit (default 80)")
+    ap.add_argument("--lr", type=float, default=0.04)
+    ap.add_argument("--checkpoint", default=CHECKPOINT, help=f"default {os.path.relpath(CHECKPOINT, HERE)}")
+    ap.add_argument("--every", type=int, default=10, help="save the checkpoint every N iterations")
+    ap.add_argument("--full", action="store_true", help="ignore the checkpoint and refit everyone")
+    ap.add_argument("--out", help="write the weights table as CSV")
+    ap.add_argument("--json", help="write the weights table as JSON")
+    ap.add_argument("--apply", action="store_true", help="upsert user_fsrs_weights (DATABASE_URL / DB_* env)")
+    ap.add_argument("--dsn")
+    ap.add_argument("--bench", type=int, metavar="USERS", help="fit simulated users instead of a file")
+    args = ap.parse_args()
+    if not args.reviews and not args.bench:
+        ap.error("a reviews file or --bench USERS is required")
+
+    t0 = time.perf_counter()
+    true_w = None
+    if args.bench:
+        reviews, true_w = simulate_reviews(args.bench)
+    else:
+        reviews = fr.read_reviews(args.reviews)
+    rows, cards = fr.group_cards(reviews)
+    user_ids, card_user = np.unique(cards.user_id, return_inverse=True)
+    reviews_per_user = np.bincount(card_user, cards.count, len(user_ids)).astype(np.int64)
+    newest = np.full(len(user_ids), np.iinfo(np.int64).min)
+    np.maximum.at(newest, card_user, rows.ts[cards.start + cards.count - 1])
+    print(f"{len(rows.ts):,} reviews, {len(cards.start):,} cards, {len(user_ids):,} users "
+          f"(read in {time.perf_counter() - t0:.1f}s)")
+
+    # Carry over checkpointed users
+    prev = None if args.full else load_checkpoint(args.checkpoint)
+    global_w = np.asarray(DEFAULT_W, dtype=np.float64)
+    user_w = np.tile(global_w, (len(user_ids), 1))
+    adam = [np.zeros_like(user_w), np.zeros_like(user_w), np.zeros(len(user_ids))]
+    stale = np.ones(len(user_ids), dtype=bool)
+    fitted = np.zeros(len(user_ids), dtype=bool)
+    if prev is not None:
+        global_w = prev["global_w"]
+        user_w[:] = global_w
+        pos = {int(u): i for i, u in enumerate(prev["user_id"])}
+        for i, u in enumerate(user_ids):
+            j = pos.get(int(u))
+            if j is None:
+                continue
+            user_w[i] = prev["user_w"][j]
+            adam[0][i], adam[1][i], adam[2][i] = prev["adam_m"][j], prev["adam_v"][j], prev["adam_step"][j]
+            fitted[i] = prev["fitted"][j]
+            stale[i] = newest[i] > prev["newest"][j]
+        print(f"Resuming from {args.checkpoint}: {int(stale.sum())} of {len(user_ids)} users have new reviews")
+
+    def checkpoint():
+        save_checkpoint(args.checkpoint, {
+            "user_id": user_ids, "global_w": global_w, "user_w": user_w, "fitted": fitted,
+            "reviews": reviews_per_user, "newest": np.where(stale, np.iinfo(np.int64).min, newest),
+            "adam_m": adam[0], "adam_v": adam[1], "adam_step": adam[2],
+        })
+
+    def progress(label, every):
+        def on_iter(it, mean_loss, W, state):
+            if (it + 1) % every == 0:
+                print(f"  {label} iter {it + 1:4}: log-loss {mean_loss:.4f} ({time.perf_counter() - t1:.1f}s)")
+        return on_iter
+
+    # 1. Global weights: every card as one user, prior = ts-fsrs defaults
+    if prev is None:
+        t1 = time.perf_counter()
+        W, _ = fit(global_w[None, :], np.asarray(DEFAULT_W)[None, :], np.zeros(len(cards.start), dtype=np.int64),
+                   rows, cards, args.iters, args.lr, on_iter=progress("global", args.every))
+        global_w = W[0]
+        user_w[~fitted] = global_w
+        checkpoint()
+
+    # 2. Per-user weights for users with enough (new) reviews, prior = global
+    todo = np.flatnonzero(stale & (reviews_per_user >= MIN_REVIEWS))
+    if len(todo):
+        sel = np.isin(card_user, todo)
+        remap = np.full(len(user_ids), -1)
+        remap[todo] = np.arange(len(todo))
+        sub = fr.Cards(cards.user_id[sel], cards.item_id[sel], cards.skill_code[sel], cards.start[sel], cards.count[sel])
+        t1 = time.perf_counter()
+        report = progress(f"{len(todo)} users", args.every)
+
+        def on_iter(it, mean_loss, W, state):
+            report(it, mean_loss, W, state)
+            if (it + 1) % args.every == 0:
+                user_w[todo] = W
+                for a, b in zip(adam, state):
+                    a[todo] = b
+                checkpoint()
+
+        state = (adam[0][todo], adam[1][todo], adam[2][todo])
+        W, state = fit(user_w[todo], np.tile(global_w, (len(todo), 1)), remap[card_user[sel]],
+                       rows, sub, args.iters, args.lr, adam=state, on_iter=on_iter)
+        user_w[todo] = W
+        for a, b in zip(adam, state):
+            a[todo] = b
+        fitted[todo] = True
+    user_w[~fitted] = global_w
+    stale[:] = False
+    checkpoint()
+
+    # 3. Reports: default vs fitted weights, per user and overall
+    final_w = np.where(fitted[:, None], user_w, global_w)
+    ll, rmse, n = evaluate(final_w, card_user, rows, cards)
+    ll0, rmse0, _ = evaluate(np.tile(np.asarray(DEFAULT_W), (len(user_ids), 1)), card_user, rows, cards)
+    llg, rmseg, _ = evaluate(np.tile(global_w, (len(user_ids), 1)), card_user, rows, cards)
+    print(f"{'weights':10} {'log-loss':>9} {'RMSE':>7}   ({int(n.sum()):,} scored reviews)")
+    for label, a, b in (("default", ll0, rmse0), ("global", llg, rmseg), ("per-user", ll, rmse)):
+        tl, tr = _total(a, b, n)
+        print(f"{label:10} {tl:9.4f} {tr:7.4f}")
+    if true_w is not None:
+        tl, tr = _total(*evaluate(true_w[user_ids], card_user, rows, cards))
+        print(f"{'true':10} {tl:9.4f} {tr:7.4f}")
+    ck = {"user_id": user_ids, "global_w": global_w, "user_w": user_w, "fitted": fitted, "reviews": reviews_per_user}
+    table = weight_rows(ck, {"log_loss": ll, "rmse": rmse, "log_loss_default": ll0, "rmse_default": rmse0})
+    if args.out:
+        write_csv(args.out, table)
+        print(f"Wrote {len(table)} users to {args.out}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"global": [float(x) for x in global_w], "users": table}, f, ensure_ascii=False)
+        print(f"Wrote {len(table)} users to {args.json}")
+    if args.apply:
+        n_rows = apply_postgres(args.dsn or fr.dsn_from_env(), table)
+        print(f"Upserted {n_rows} rows into user_fsrs_weights")
+
+
+if __name__ == "__main__":
+    main()
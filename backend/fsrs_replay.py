@@ -0,0 +1,644 @@
+"""
+Bulk FSRS replay over user_item_skill_reviews.
+
+server.js rebuilds FSRS state one card at a time through ts-fsrs (undo,
+seed-fsrs). That is fine for one answer but far too slow to recompute
+everybody after a parameter change. Here every (user_id, item_id, skill_code)
+history is replayed at once:
+  - reviews are sorted by card, then time, and cards are ordered by history
+    length (longest first), so at step k the cards still replaying are a
+    prefix of the state arrays;
+  - step k applies the k-th review of all of those cards with NumPy: one
+    vectorised FSRS-6 update for stability and difficulty, then the
+    learning-step / review state machine for state and due date.
+The arithmetic follows ts-fsrs 5.x with its defaults: FSRS-6 weights,
+request_retention 0.9, learning steps 1m 10m, relearning step 10m, short-term
+memory on, no fuzz, and elapsed time counted in UTC calendar days.
+replay_card() is a plain scalar port of the same scheduler. --verify checks a
+sample of cards against ts-fsrs when backend/node_modules has it; without it,
+the formulas are checked against py-fsrs (if installed) and the replay against
+data/fsrs_reference.json, histories with the final states ts-fsrs gave them
+(--record-reference N writes it).
+
+Input is the /api/reviews/export JSON or its CSV form (rating_value 1-4, or
+rating_label; timestamps in ISO or PostgreSQL text form).
+
+    python fsrs_replay.py reviews.json --out fsrs_state.csv
+    python fsrs_replay.py reviews.csv --apply          # UPDATE user_item_skill_progress (DATABASE_URL / DB_*)
+    python fsrs_replay.py reviews.json --verify 200
+    python fsrs_replay.py reviews.json --weights fsrs_weights.csv --apply   # after fsrs_optimizer.py
+    python fsrs_replay.py --bench 2000000 --verify 500
+    python fsrs_replay.py --record-reference 300       # needs ts-fsrs (npm install)
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'etl'))
+
+from load_stage_tables import dsn_from_env
+
+REFERENCE = os.path.join(HERE, "data", "fsrs_reference.json")
+
+# ts-fsrs 5.x default_w (FSRS-6)
+DEFAULT_W = (0.212, 1.2931, 2.3065, 8.2956, 6.4133, 0.8334, 3.0194, 0.001,
+             1.8722, 0.1666, 0.796, 1.4835, 0.0614, 0.2629, 1.6483, 0.6014,
+             1.8729, 0.5425, 0.0912, 0.0658, 0.1542)
+S_MIN, S_MAX = 0.001, 36500.0
+MAX_INTERVAL = 36500
+LEARNING_STEPS = (1, 10)      # minutes
+RELEARNING_STEPS = (10,)
+
+NEW, LEARNING, REVIEW, RELEARNING = 0, 1, 2, 3
+STATE_NAMES = ("New", "Learning", "Review", "Relearning")
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4
+# Same mapping as mapRating() in server.js, including the success/fail aliases
+RATINGS = {"again": AGAIN, "hard": HARD, "good": GOOD, "easy": EASY, "success": GOOD, "fail": AGAIN}
+
+MS_MIN = 60_000
+MS_DAY = 86_400_000
+
+Reviews = namedtuple("Reviews", "user_id item_id skill_code ts grade")
+Cards = namedtuple("Cards", "user_id item_id skill_code start count")
+State = namedtuple("State", "stability difficulty state step reps lapses last_review due")
+
+
+class Params:
+    def __init__(self, w=DEFAULT_W, retention=0.9, max_interval=MAX_INTERVAL,
+                 learning_steps=LEARNING_STEPS, relearning_steps=RELEARNING_STEPS):
+        self.w = np.asarray(w, dtype=np.float64)
+        self.retention = retention
+        self.max_interval = max_interval
+        self.learning_steps = tuple(learning_steps)
+        self.relearning_steps = tuple(relearning_steps)
+        self.decay = -self.w[20]
+        self.factor = 0.9 ** (1 / self.decay) - 1
+        self.interval_modifier = round((retention ** (1 / self.decay) - 1) / self.factor, 8)
+
+
+def _round_half_up(x):
+    # JS Math.round for the non-negative values used here
+    return np.floor(np.asarray(x) + 0.5).astype(np.int64)
+
+
+# -- FSRS-6 formulas (vectorised; ts-fsrs rounds to 8 places) ---------------
+
+def forgetting_curve(p, t, s):
+    return np.round((1 + p.factor * t / s) ** p.decay, 8)
+
+def init_difficulty(p, g):
+    return np.round(p.w[4] - np.exp((g - 1) * p.w[5]) + 1, 8)
+
+def init_stability(p, g):
+    return np.maximum(p.w[np.asarray(g) - 1], 0.1)
+
+def next_difficulty(p, d, g):
+    delta = -p.w[6] * (g - 3)
+    nd = d + np.round(delta * (10 - d) / 9, 8)
+    return np.clip(np.round(p.w[7] * init_difficulty(p, EASY) + (1 - p.w[7]) * nd, 8), 1, 10)
+
+def next_stability(p, d, s, t, g):
+    """Stability after grade g, t calendar days after the previous review."""
+    w = p.w
+    r = forgetting_curve(p, t, s)
+    hard = np.where(g == HARD, w[15], 1.0)
+    easy = np.where(g == EASY, w[16], 1.0)
+    recall = s * (1 + np.exp(w[8]) * (11 - d) * s ** -w[9] * (np.exp((1 - r) * w[10]) - 1) * hard * easy)
+    forget = np.round(np.clip(w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1) * np.exp((1 - r) * w[14]), S_MIN, S_MAX), 8)
+    forget = np.minimum(np.maximum(np.round(s / math.exp(w[17] * w[18]), 8), S_MIN), forget)
+    sinc = s ** -w[19] * np.exp(w[17] * (g - 3 + w[18]))
+    short = s * np.where(g >= HARD, np.maximum(sinc, 1.0), sinc)
+    out = np.where(g == AGAIN, forget, np.clip(recall, S_MIN, S_MAX))
+    return np.round(np.clip(np.where(t == 0, short, out), S_MIN, S_MAX), 8)
+
+def next_interval(p, s):
+    return np.minimum(np.maximum(1, _round_half_up(s * p.interval_modifier)), p.max_interval)
+
+def step_minutes(steps, g, step):
+    """
+    ts-fsrs BasicLearningStepsStrategy for Learning/Relearning cards:
+    (minutes until due, next step). 0 minutes means the card graduates.
+    """
+    zero = np.zeros(len(g), dtype=np.int64)
+    n = len(steps)
+    if n == 0:
+        return zero, zero
+    first = steps[0]
+    hard = int(_round_half_up((first + steps[1]) / 2 if n > 1 else first * 1.5))
+    good = np.asarray(steps + (0,), dtype=np.int64)[np.minimum(step + 1, n)]
+    conds = [g == AGAIN, g == HARD, g == GOOD]
+    minutes = np.select(conds, [first, hard, good], 0)
+    nxt = np.select(conds, [0, step, step + 1], 0)
+    past = step >= n
+    return np.where(past, 0, minutes), np.where(past, 0, nxt)
+
+
+# -- Lockstep replay ----------------------------------------------------------
+
+def replay(ts, grade, start, count, params=None):
+    """
+    Final FSRS state of every card. ts (ms since epoch) and grade are review
+    rows sorted by card, then time; card i owns rows start[i]:start[i]+count[i].
+    """
+    p = params or Params()
+    n = len(start)
+    order = np.argsort(-count, kind="stable")
+    first_row = start[order]
+    lengths = count[order]
+    # active[k]: number of cards (a prefix, since lengths descend) with a k-th review
+    max_len = int(lengths[0]) if n else 0
+    active = np.searchsorted(-lengths, -np.arange(max_len), side="left")
+
+    s = np.zeros(n)
+    d = np.zeros(n)
+    state = np.zeros(n, dtype=np.int8)
+    step = np.zeros(n, dtype=np.int64)
+    reps = np.zeros(n, dtype=np.int32)
+    lapses = np.zeros(n, dtype=np.int32)
+    last = np.zeros(n, dtype=np.int64)
+    due = np.zeros(n, dtype=np.int64)
+    learn_steps = tuple(p.learning_steps)
+    relearn_steps = tuple(p.relearning_steps)
+
+    for k in range(max_len):
+        m = int(active[k])
+        rows = first_row[:m] + k
+        g = grade[rows].astype(np.int64)
+        t = ts[rows]
+        st = state[:m]
+        cur_s, cur_d, cur_step = s[:m], d[:m], step[:m]
+
+        is_new = st == NEW
+        old = np.flatnonzero(~is_new)
+        new = np.flatnonzero(is_new)
+        elapsed = t // MS_DAY - last[:m] // MS_DAY
+
+        ns = np.empty(m)
+        nd = np.empty(m)
+        ns[new] = init_stability(p, g[new])
+        nd[new] = np.clip(init_difficulty(p, g[new]), 1, 10)
+        ns[old] = next_stability(p, cur_d[old], cur_s[old], elapsed[old], g[old])
+        nd[old] = next_difficulty(p, cur_d[old], g[old])
+
+        # Learning-phase cards follow their steps; 0 minutes = graduate
+        minutes = np.zeros(m, dtype=np.int64)
+        nxt = np.zeros(m, dtype=np.int64)
+        for states, steps in (((NEW, LEARNING), learn_steps), ((RELEARNING,), relearn_steps)):
+            sel = np.flatnonzero(np.isin(st, states))
+            if len(sel):
+                minutes[sel], nxt[sel] = step_minutes(steps, g[sel], cur_step[sel])
+        interval = next_interval(p, ns)
+
+        # Review cards: Again relearns; Hard/Good/Easy intervals are kept ordered
+        rev = np.flatnonzero(st == REVIEW)
+        if len(rev):
+            rg = g[rev]
+            if relearn_steps:
+                minutes[rev] = np.where(rg == AGAIN, relearn_steps[0], 0)
+            rs, rd, re = cur_s[rev], cur_d[rev], elapsed[rev]
+            ivl = [next_interval(p, next_stability(p, rd, rs, re, np.full(len(rev), q))) for q in (HARD, GOOD, EASY)]
+            hard = np.minimum(ivl[0], ivl[1])
+            good = np.maximum(ivl[1], hard + 1)
+            easy = np.maximum(ivl[2], good + 1)
+            interval[rev] = np.select([rg == HARD, rg == GOOD, rg == EASY], [hard, good, easy], interval[rev])
+            lapses[:m][rev] += (rg == AGAIN)
+
+        short = (minutes > 0) & (minutes < 1440)
+        relearning = (st == REVIEW) | (st == RELEARNING)
+        state[:m] = np.where(short, np.where(relearning, RELEARNING, LEARNING), REVIEW)
+        step[:m] = np.where(minutes > 0, nxt, 0)
+        due[:m] = np.where(minutes > 0, t + minutes * MS_MIN, t + interval * MS_DAY)
+        s[:m] = ns
+        d[:m] = nd
+        reps[:m] += 1
+        last[:m] = t
+
+    inv = np.empty(n, dtype=np.int64)
+    inv[order] = np.arange(n)
+    return State(s[inv], d[inv], state[inv], step[inv], reps[inv], lapses[inv], last[inv], due[inv])
+
+
+def load_weights(path):
+    """user_id -> weights from the fsrs_optimizer.py weights table (CSV or JSON)."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".json"):
+            users = json.load(f)["users"]
+        else:
+            users = [dict(r, weights=json.loads(r["weights"])) for r in csv.DictReader(f)]
+    return {int(u["user_id"]): tuple(float(x) for x in u["weights"]) for u in users}
+
+def replay_cards(rows, cards, params, weights=None):
+    """replay() with each user's fitted weights; one lockstep pass per distinct weight vector."""
+    if not weights:
+        return replay(rows.ts, rows.grade, cards.start, cards.count, params)
+    keys = [weights.get(int(u)) for u in cards.user_id]
+    groups = {}
+    for i, k in enumerate(keys):
+        groups.setdefault(k, []).append(i)
+    n = len(keys)
+    out = State(np.zeros(n), np.zeros(n), np.zeros(n, np.int8), np.zeros(n, np.int64),
+                np.zeros(n, np.int32), np.zeros(n, np.int32), np.zeros(n, np.int64), np.zeros(n, np.int64))
+    for k, idx in groups.items():
+        idx = np.asarray(idx)
+        p = params if k is None else Params(k, params.retention, params.max_interval,
+                                            params.learning_steps, params.relearning_steps)
+        part = replay(rows.ts, rows.grade, cards.start[idx], cards.count[idx], p)
+        for dst, col in zip(out, part):
+            dst[idx] = col
+    return out
+
+def replay_card(times, grades, params=None):
+    """
+    Scalar reference: one card's history through the same scheduler, written
+    the way ts-fsrs steps a card. Returns (stability, difficulty, state, due_ms).
+    """
+    p = params or Params()
+    w = [float(x) for x in p.w]
+    r8 = lambda x: round(x, 8)
+    clamp = lambda x, lo, hi: min(max(x, lo), hi)
+    init_d = lambda g: r8(w[4] - math.exp((g - 1) * w[5]) + 1)
+    ivl = lambda s: min(max(1, int(math.floor(s * p.interval_modifier + 0.5))), p.max_interval)
+
+    def next_s(d, s, t, g):
+        if t == 0:
+            sinc = s ** -w[19] * math.exp(w[17] * (g - 3 + w[18]))
+            return r8(clamp(s * (max(sinc, 1.0) if g >= HARD else sinc), S_MIN, S_MAX))
+        r = r8((1 + p.factor * t / s) ** p.decay)
+        if g == AGAIN:
+            fail = r8(clamp(w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1) * math.exp((1 - r) * w[14]), S_MIN, S_MAX))
+            return min(max(r8(s / math.exp(w[17] * w[18])), S_MIN), fail)
+        bonus = w[15] if g == HARD else w[16] if g == EASY else 1.0
+        return r8(clamp(s * (1 + math.exp(w[8]) * (11 - d) * s ** -w[9] * (math.exp((1 - r) * w[10]) - 1) * bonus), S_MIN, S_MAX))
+
+    def steps_for(state, g, step):
+        steps = p.relearning_steps if state == RELEARNING else p.learning_steps
+        if not steps or step >= len(steps):
+            return 0, 0
+        if g == AGAIN:
+            return steps[0], 0
+        if g == HARD:
+            return int(math.floor((steps[0] + steps[1]) / 2 + 0.5) if len(steps) > 1 else math.floor(steps[0] * 1.5 + 0.5)), step
+        if g == GOOD and step + 1 < len(steps):
+            return steps[step + 1], step + 1
+        return 0, 0
+
+    s = d = 0.0
+    state, step, last, due = NEW, 0, 0, 0
+    for t, g in zip(times, grades):
+        t, g = int(t), int(g)
+        elapsed = 0 if state == NEW else t // MS_DAY - last // MS_DAY
+        if state == NEW:
+            ns, nd = max(w[g - 1], 0.1), clamp(init_d(g), 1, 10)
+        else:
+            ns = next_s(d, s, elapsed, g)
+            nd = clamp(r8(w[7] * init_d(EASY) + (1 - w[7]) * (d + r8(-w[6] * (g - 3) * (10 - d) / 9))), 1, 10)
+        if state == REVIEW:
+            minutes, nxt = (p.relearning_steps[0], 0) if g == AGAIN and p.relearning_steps else (0, 0)
+            if g == AGAIN:
+                interval = ivl(ns)
+            else:
+                h, gd, e = (ivl(next_s(d, s, elapsed, q)) for q in (HARD, GOOD, EASY))
+                h = min(h, gd)
+                gd = max(gd, h + 1)
+                interval = {HARD: h, GOOD: gd, EASY: max(e, gd + 1)}[g]
+        else:
+            minutes, nxt = steps_for(state, g, step)
+            interval = ivl(ns)
+        if 0 < minutes < 1440:
+            state = RELEARNING if state in (REVIEW, RELEARNING) else LEARNING
+        else:
+            state = REVIEW
+        step = nxt if minutes > 0 else 0
+        due = t + minutes * MS_MIN if minutes > 0 else t + interval * MS_DAY
+        s, d, last = ns, nd, t
+    return s, d, state, due
+
+
+# -- Input / grouping -----------------------------------------------------------
+
+def parse_ts(value):
+    """ISO 8601 / PostgreSQL timestamptz text -> ms since epoch (naive = UTC)."""
+    dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(round(dt.timestamp() * 1000))
+
+def parse_grade(value, label):
+    try:
+        g = int(value)
+        if 1 <= g <= 4:
+            return g
+    except (TypeError, ValueError):
+        pass
+    return RATINGS.get(str(label or "").strip().lower(), GOOD)
+
+def read_reviews(path):
+    """/api/reviews/export output (JSON array, or CSV with the same columns)."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".json"):
+            records = json.load(f)
+        else:
+            records = list(csv.DictReader(f))
+    users = np.fromiter((int(r["user_id"]) for r in records), dtype=np.int64, count=len(records))
+    items = np.fromiter((int(r["item_id"]) for r in records), dtype=np.int64, count=len(records))
+    skills = np.array([r["skill_code"] for r in records], dtype=object)
+    ts = np.fromiter((parse_ts(r["reviewed_at"]) for r in records), dtype=np.int64, count=len(records))
+    grade = np.fromiter((parse_grade(r.get("rating_value"), r.get("rating_label")) for r in records),
+                        dtype=np.int8, count=len(records))
+    return Reviews(users, items, skills, ts, grade)
+
+def group_cards(reviews):
+    """Sort rows by (user, item, skill, time); returns (sorted Reviews, Cards)."""
+    # A dict beats np.unique on object arrays several times over; code order is irrelevant here
+    codes = {}
+    skill_ids = np.fromiter((codes.setdefault(s, len(codes)) for s in reviews.skill_code),
+                            dtype=np.int64, count=len(reviews.skill_code))
+    names = np.array(list(codes), dtype=object)
+    order = np.lexsort((reviews.ts, skill_ids, reviews.item_id, reviews.user_id))
+    user, item, skill = reviews.user_id[order], reviews.item_id[order], skill_ids[order]
+    rows = Reviews(user, item, names[skill], reviews.ts[order], reviews.grade[order])
+    if not len(order):
+        empty = np.zeros(0, dtype=np.int64)
+        return rows, Cards(empty, empty, names[empty], empty, empty)
+    boundary = np.ones(len(order), dtype=bool)
+    boundary[1:] = (user[1:] != user[:-1]) | (item[1:] != item[:-1]) | (skill[1:] != skill[:-1])
+    start = np.flatnonzero(boundary)
+    count = np.diff(np.append(start, len(order)))
+    return rows, Cards(user[start], item[start], names[skill[start]], start, count)
+
+
+# -- Output ---------------------------------------------------------------------
+
+def iso_ms(ms):
+    return np.datetime_as_string(ms.astype("datetime64[ms]"), unit="ms", timezone="UTC")
+
+def write_csv(path, cards, result):
+    due, last = iso_ms(result.due), iso_ms(result.last_review)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["user_id", "item_id", "skill_code", "stability", "difficulty", "due_at",
+                    "state", "reps", "lapses", "last_review_at"])
+        for i in range(len(cards.start)):
+            w.writerow([cards.user_id[i], cards.item_id[i], cards.skill_code[i],
+                        f"{result.stability[i]:.8g}", f"{result.difficulty[i]:.8g}", due[i],
+                        STATE_NAMES[result.state[i]], result.reps[i], result.lapses[i], last[i]])
+
+def apply_postgres(dsn, cards, result):
+    """COPY the new state into a temp table and UPDATE user_item_skill_progress from it in one pass."""
+    try:
+        import psycopg
+        con, v3 = psycopg.connect(dsn), True
+    except ImportError:
+        import psycopg2
+        con, v3 = psycopg2.connect(dsn), False
+    due = iso_ms(result.due)
+    buf = io.StringIO()
+    for i in range(len(cards.start)):
+        skill = str(cards.skill_code[i]).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+        buf.write(f"{cards.user_id[i]}\t{cards.item_id[i]}\t{skill}\t"
+                  f"{result.stability[i]!r}\t{result.difficulty[i]!r}\t{due[i]}\n")
+    try:
+        with con.cursor() as cur:
+            cur.execute("""CREATE TEMP TABLE _fsrs (user_id INTEGER, item_id INTEGER, skill_code TEXT,
+                           stability DOUBLE PRECISION, difficulty DOUBLE PRECISION, due_at TIMESTAMPTZ) ON COMMIT DROP""")
+            sql = "COPY _fsrs FROM STDIN"
+            if v3:
+                with cur.copy(sql) as cp:
+                    cp.write(buf.getvalue())
+            else:
+                buf.seek(0)
+                cur.copy_expert(sql, buf)
+            cur.execute("""
+                UPDATE user_item_skill_progress p
+                SET stability = f.stability, difficulty = f.difficulty, due_at = f.due_at
+                FROM _fsrs f
+                WHERE p.user_id = f.user_id AND p.item_id = f.item_id AND p.skill_code = f.skill_code""")
+            updated = cur.rowcount
+        con.commit()
+    finally:
+        con.close()
+    return updated
+
+
+# -- Verification / benchmark -----------------------------------------------------
+
+TS_FSRS_SCRIPT = r"""
+(async () => {
+  let lib;
+  try { lib = require('ts-fsrs'); } catch (e) { lib = await import('ts-fsrs'); lib = lib.default || lib; }
+  const input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+  const out = input.cards.map(([times, grades, w]) => {
+    const opts = { request_retention: input.retention, enable_fuzz: false };
+    const f = lib.fsrs(lib.generatorParameters(w ? { ...opts, w } : opts));
+    let card = lib.createEmptyCard(new Date(times[0]));
+    times.forEach((t, i) => { card = f.next(card, new Date(t), grades[i]).card; });
+    return [card.stability, card.difficulty, card.state, new Date(card.due).getTime()];
+  });
+  process.stdout.write(JSON.stringify(out));
+})().catch((e) => { process.stderr.write(String(e && e.message || e)); process.exit(2); });
+"""
+
+def ts_fsrs_reference(histories, params):
+    """Final [s, d, state, due_ms] per history from ts-fsrs, or None if it is not installed."""
+    payload = json.dumps({"retention": params.retention, "cards": histories})
+    try:
+        proc = subprocess.run(["node", "-e", TS_FSRS_SCRIPT], input=payload, capture_output=True,
+                              text=True, cwd=HERE, timeout=300)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode != 0:
+        return None
+    return json.loads(proc.stdout)
+
+def mismatches(result, picks, ref):
+    """Cards in picks whose replayed state differs from ref's [s, d, state, due_ms]; prints the first few."""
+    bad = 0
+    for i, (s, d, state, due) in zip(picks, ref):
+        ok = (math.isclose(result.stability[i], s, rel_tol=1e-6, abs_tol=1e-6)
+              and math.isclose(result.difficulty[i], d, rel_tol=1e-6, abs_tol=1e-6)
+              and result.state[i] == state and result.due[i] == due)
+        if not ok:
+            bad += 1
+            if bad <= 5:
+                print(f"  mismatch card {i}: got s={result.stability[i]:.6f} d={result.difficulty[i]:.6f} "
+                      f"state={result.state[i]} due={result.due[i]}, want s={s:.6f} d={d:.6f} state={state} due={due}")
+    return bad
+
+def record_reference(path, n_cards, params, seed=0):
+    """Run n_cards synthetic histories through ts-fsrs and store them with its final states."""
+    rows, cards = group_cards(synthetic_reviews(n_cards * 12, seed))
+    histories = [[rows.ts[a:a + c].tolist(), rows.grade[a:a + c].tolist(), None]
+                 for a, c in zip(cards.start[:n_cards], cards.count[:n_cards])]
+    ref = ts_fsrs_reference(histories, params)
+    if ref is None:
+        raise SystemExit("ts-fsrs is not installed; run npm install in backend/ first")
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump({"retention": params.retention, "cards": [h[:2] for h in histories], "expected": ref}, f)
+        f.write("\n")
+    print(f"Wrote {len(histories)} ts-fsrs reference cards to {path}", file=sys.stderr)
+
+def verify_reference(path):
+    """Replay the recorded reference histories and compare with ts-fsrs's states. Returns the mismatch count."""
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    lengths = [len(t) for t, _ in doc["cards"]]
+    n = sum(lengths)
+    reviews = Reviews(np.repeat(np.arange(len(lengths)), lengths), np.zeros(n, np.int64),
+                      np.full(n, "reference", dtype=object),
+                      np.fromiter((t for ts, _ in doc["cards"] for t in ts), np.int64, n),
+                      np.fromiter((g for _, gs in doc["cards"] for g in gs), np.int8, n))
+    rows, cards = group_cards(reviews)
+    result = replay(rows.ts, rows.grade, cards.start, cards.count, Params(retention=doc["retention"]))
+    bad = mismatches(result, range(len(lengths)), doc["expected"])
+    print(f"verify: {len(lengths) - bad}/{len(lengths)} reference cards match ts-fsrs "
+          f"({os.path.basename(path)}; ts-fsrs not installed)")
+    return bad
+
+def formula_mismatches(params, n=20000, seed=0):
+    """
+    The vectorised FSRS-6 formulas against py-fsrs (pip install fsrs), the
+    project's Python implementation, on random (s, d, t, grade). Only the
+    formulas are compared: py-fsrs schedules differently from ts-fsrs (24h
+    periods rather than calendar days, its own learning steps, no rounding to
+    8 places, no stability cap). Returns the mismatch count, or None if py-fsrs
+    is not installed.
+    """
+    try:
+        from fsrs import Rating, Scheduler
+    except ImportError:
+        return None
+    sch = Scheduler(parameters=tuple(params.w), desired_retention=params.retention,
+                    maximum_interval=params.max_interval, enable_fuzzing=False)
+    rng = np.random.default_rng(seed)
+    s = np.round(np.exp(rng.uniform(math.log(S_MIN), math.log(S_MAX), n)), 8)
+    d = np.round(rng.uniform(1, 10, n), 8)
+    t = np.where(rng.random(n) < 0.2, 0, rng.integers(1, 1000, n))
+    g = rng.integers(AGAIN, EASY + 1, n)
+    ours = {"init_stability": init_stability(params, g), "init_difficulty": np.clip(init_difficulty(params, g), 1, 10),
+            "next_difficulty": next_difficulty(params, d, g), "next_stability": next_stability(params, d, s, t, g),
+            "next_interval": next_interval(params, s)}
+    bad = {k: 0 for k in ours}
+    for i in range(n):
+        si, di, ti, gi = float(s[i]), float(d[i]), int(t[i]), Rating(int(g[i]))
+        r = (1 + sch._FACTOR * ti / si) ** sch._DECAY
+        want = {"init_stability": sch._initial_stability(rating=gi),
+                "init_difficulty": sch._initial_difficulty(rating=gi, clamp=True),
+                "next_difficulty": sch._next_difficulty(difficulty=di, rating=gi),
+                "next_stability": (sch._short_term_stability(stability=si, rating=gi) if ti == 0 else
+                                   sch._next_stability(difficulty=di, stability=si, retrievability=r, rating=gi)),
+                "next_interval": sch._next_interval(stability=si)}
+        # ts-fsrs caps stability at S_MAX; py-fsrs only clamps from below
+        want["next_stability"] = min(want["next_stability"], S_MAX)
+        for k, v in want.items():
+            got = float(ours[k][i])
+            ok = got == v if k == "next_interval" else math.isclose(got, v, rel_tol=1e-6, abs_tol=1e-6)
+            if not ok:
+                bad[k] += 1
+                if sum(bad.values()) <= 5:
+                    print(f"  mismatch {k}(s={si}, d={di}, t={ti}, g={int(gi)}): got {got}, py-fsrs {v}")
+    print(f"formulas: {n:,} random inputs against py-fsrs, mismatches "
+          + ", ".join(f"{k} {v}" for k, v in bad.items()))
+    return sum(bad.values())
+
+def verify(rows, cards, result, sample, params, weights=None, seed=0):
+    """
+    Compare a random sample of cards against ts-fsrs. When ts-fsrs is not
+    installed, check the formulas against py-fsrs and the replay of the
+    recorded reference against its ts-fsrs states. Returns the mismatch count;
+    without ts-fsrs or the reference, every card counts as failed.
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(cards.start), size=min(sample, len(cards.start)), replace=False)
+    histories = []
+    for i in picks:
+        a, b = cards.start[i], cards.start[i] + cards.count[i]
+        w = (weights or {}).get(int(cards.user_id[i]))
+        histories.append([rows.ts[a:b].tolist(), rows.grade[a:b].tolist(), list(w) if w else None])
+    ref = ts_fsrs_reference(histories, params)
+    if ref is None:
+        # The formulas can still be checked against py-fsrs; the scheduler around
+        # them (learning steps, calendar days, interval ordering) only against ts-fsrs
+        bad = formula_mismatches(params)
+        if bad is None:
+            print("formulas: py-fsrs is not installed (pip install fsrs); not checked")
+            bad = 0
+        if os.path.exists(REFERENCE):
+            return bad + verify_reference(REFERENCE)
+        print(f"verify: ts-fsrs is not installed and {REFERENCE} is missing; the scheduler is unchecked")
+        return bad + max(len(picks), 1)
+    bad = mismatches(result, picks, ref)
+    print(f"verify: {len(picks) - bad}/{len(picks)} cards match ts-fsrs")
+    return bad
+
+def synthetic_reviews(n_reviews, seed=0):
+    """Review log with geometric history lengths (mean 12) and minute-to-month gaps."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.geometric(1 / 12, n_reviews // 6 + 1)
+    card = np.repeat(np.arange(len(lengths)), lengths)[:n_reviews]
+    first = np.flatnonzero(np.r_[True, card[1:] != card[:-1]])
+    gaps = np.where(rng.random(n_reviews) < 0.3, rng.integers(1, 20, n_reviews) * MS_MIN,
+                    rng.exponential(6, n_reviews) * MS_DAY).astype(np.int64)
+    elapsed = np.cumsum(gaps)
+    ts = 1_700_000_000_000 + elapsed - np.repeat(elapsed[first], np.diff(np.r_[first, n_reviews]))
+    grade = rng.choice([AGAIN, HARD, GOOD, EASY], n_reviews, p=[0.12, 0.08, 0.7, 0.1]).astype(np.int8)
+    skills = np.array(["recognition", "meaning", "pinyin", "writing"], dtype=object)
+    return Reviews(card // 400, card // 4, skills[card % 4], ts, grade)
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay the FSRS review log for every card at once")
+    ap.add_argument("reviews", nargs="?", help="/api/reviews/export output (.json or .csv)")
+    ap.add_argument("--out", help="write user_id,item_id,skill_code,stability,difficulty,due_at,... CSV")
+    ap.add_argument("--apply", action="store_true", help="UPDATE user_item_skill_progress (DATABASE_URL / DB_* env)")
+    ap.add_argument("--dsn", help="PostgreSQL DSN for --apply")
+    ap.add_argument("--retention", type=float, default=0.9, help="request_retention (default 0.9, as ts-fsrs)")
+    ap.add_argument("--weights", help="per-user weights table from fsrs_optimizer.py (--out CSV or --json)")
+    ap.add_argument("--verify", type=int, metavar="N", help="check N random cards against ts-fsrs")
+    ap.add_argument("--bench", type=int, metavar="N", help="replay N synthetic reviews instead of a file")
+    ap.add_argument("--record-reference", type=int, metavar="N",
+                    help=f"write N synthetic cards and their ts-fsrs states to {os.path.relpath(REFERENCE)}")
+    args = ap.parse_args()
+    params = Params(retention=args.retention)
+    if args.record_reference:
+        record_reference(REFERENCE, args.record_reference, params)
+        return
+    if not args.reviews and not args.bench:
+        ap.error("a reviews file or --bench N is required")
+
+    weights = load_weights(args.weights) if args.weights else None
+    t0 = time.perf_counter()
+    reviews = synthetic_reviews(args.bench) if args.bench else read_reviews(args.reviews)
+    t1 = time.perf_counter()
+    rows, cards = group_cards(reviews)
+    t2 = time.perf_counter()
+    result = replay_cards(rows, cards, params, weights)
+    t3 = time.perf_counter()
+    n = len(rows.ts)
+    print(f"{n:,} reviews, {len(cards.start):,} cards (longest history {int(cards.count.max()) if n else 0}): "
+          f"{'generated' if args.bench else 'read'} {t1 - t0:.2f}s, grouped {t2 - t1:.2f}s, replayed {t3 - t2:.2f}s "
+          f"({n / (t3 - t1) * 60 / 1e6 if t3 > t1 else 0:,.1f}M reviews/min)", file=sys.stderr)
+
+    failed = 0
+    if args.verify:
+        failed = verify(rows, cards, result, args.verify, params, weights)
+    if args.out:
+        write_csv(args.out, cards, result)
+        print(f"Wrote {len(cards.start):,} cards to {args.out}", file=sys.stderr)
+    if args.apply:
+        updated = apply_postgres(args.dsn or dsn_from_env(), cards, result)
+        print(f"Updated {updated:,} rows of user_item_skill_progress", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+HSK level estimator for items that have none (custom words).
+
+A word's level is mostly a function of how its characters are used across
+the HSK list: 电脑 is easy to place because 电 and 脑 each turn up in words
+of known levels. So every character gets a level profile, the counts of
+HSK 3.0 words per level (HSK_all_merged.tsv, 7-9 folded into 7) that use
+it. Every component (character_parts.csv, any depth) gets one too, which is
+what places a word whose characters never occur in the list. Profiles are
+smoothed and log-scaled; a word is described by:
+  char profiles   mean / min / max over its characters, plus the highest
+                  "lowest level that uses this character" as a one-hot
+                  (8 = a character no HSK word uses)
+  comp profiles   mean / min / max over the components of its characters
+  support         log word counts behind those profiles, the share of
+                  unseen characters, and word length (1, 2, 3, 4+)
+A softmax regression over those features gives a distribution over the
+seven levels: "level" is its mode, "expected" its mean (what discovery
+orders custom items by).
+
+Training rows are featurised leave-one-out (each word's own level is taken
+back out of its characters' and components' profiles), so the regression
+learns from profiles that look like the ones an unseen word gets. Scoring is
+batched: feature extraction is one gather and a few np.*.reduceat calls over
+all (word, character) pairs, with no numpy work per item.
+
+The fitted model is saved as one .npz and rebuilt only when an input is
+newer. Startup is a single np.load. Refitting also runs the 80/20 holdout
+from --eval, and every result carries "usable": whether that holdout beat
+both constant baselines (the majority level's accuracy and the median
+level's MAE). Callers should ignore the estimate while it is false.
+
+    python hsk_estimator.py 电脑 熊猫 咖啡馆     # estimate
+    python hsk_estimator.py --eval               # holdout accuracy + throughput
+    python hsk_estimator.py --serve              # JSON-lines worker
+      {"id": 1, "texts": ["爸爸"]} -> {"id": 1, "results": [{"level": 1, "expected": 2.03, "usable": true}]}
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from jsonl_worker import serve_stdio
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HSK = os.path.join(HERE, 'data', '00_hsk', 'HSK_all_merged.tsv')
+DEFAULT_PARTS = os.path.join(HERE, 'data', 'processed', 'character_parts.csv')
+DEFAULT_MODEL = os.path.join(HERE, 'data', 'processed', 'hsk_estimator.npz')
+
+LEVELS = np.arange(1, 8)  # 1..6, 7 = 7-9
+UNSEEN = len(LEVELS) + 1
+ALPHA = 0.1  # add-alpha smoothing of level profiles
+EPOCHS = 500
+LEARNING_RATE = 0.5
+L2 = 1e-3
+MODEL_VERSION = 3
+
+
+def load_levels(path):
+    """-> [(word, level)] from the merged HSK list (first form of 'A|B' entries)."""
+    out = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            word = (row.get('Simplified') or '').split('|')[0].strip()
+            level = (row.get('Level') or '').split('-')[0]
+            if word and level.isdigit():
+                out.append((word, min(int(level), 7)))
+    return out
+
+
+def load_closure(parts_path):
+    """-> char -> set of components at any depth."""
+    parts = {}
+    with open(parts_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for rec in csv.DictReader(f):
+            if rec['hanzi'] != rec['part_symbol']:
+                parts.setdefault(rec['hanzi'], set()).add(rec['part_symbol'])
+
+    closure = {}
+    def components(ch, visiting=()):
+        if ch in closure:
+            return closure[ch]
+        out = set()
+        for p in parts.get(ch, ()):
+            if p not in visiting:
+                out.add(p)
+                out |= components(p, visiting + (ch,))
+        closure[ch] = out
+        return out
+    for ch in parts:
+        components(ch)
+    return closure
+
+
+def _segments(groups):
+    """[[id, ...] per word] -> (ids, start per word, word of each id, length per word); [] becomes [-1]."""
+    groups = [g or [-1] for g in groups]
+    lengths = np.fromiter(map(len, groups), dtype=np.int64, count=len(groups))
+    ids = np.fromiter((i for g in groups for i in g), dtype=np.int64, count=int(lengths.sum()))
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return ids, starts, np.repeat(np.arange(len(groups)), lengths), lengths
+
+
+def _profile_features(counts, groups, loo_levels=None):
+    """
+    Aggregate level profiles over each word's ids. counts: int32[K, 7];
+    groups: per word, the ids whose profiles to combine (-1 = unknown).
+    loo_levels: the words' own levels, taken back out of every profile.
+    -> (mean/min/max of log profiles [n, 21], lowest-level one-hot max [n],
+        log1p support min/mean [n, 2], unseen share [n])
+    """
+    ids, starts, rows, lengths = _segments(groups)
+    known = ids >= 0
+    c = np.zeros((len(ids), len(LEVELS)), dtype=np.float32)
+    c[known] = counts[ids[known]]
+    if loo_levels is not None:
+        c[np.flatnonzero(known), loo_levels[rows[known]] - 1] -= 1
+    n = c.sum(axis=1)
+    prof = np.log((c + ALPHA) / (n[:, None] + ALPHA * len(LEVELS)))
+    lowest = np.where(n > 0, (c > 0).argmax(axis=1) + 1, UNSEEN)
+    support = np.log1p(n)
+    stats = np.hstack([np.add.reduceat(prof, starts) / lengths[:, None],
+                       np.minimum.reduceat(prof, starts),
+                       np.maximum.reduceat(prof, starts)])
+    return (stats, np.maximum.reduceat(lowest, starts),
+            np.stack([np.minimum.reduceat(support, starts), np.add.reduceat(support, starts) / lengths], axis=1),
+            np.add.reduceat((n == 0).astype(np.float32), starts) / lengths)
+
+
+class Model:
+    """
+    Fitted estimator. Arrays (all saved in the .npz):
+      char_keys, char_counts     characters used by HSK words, int32[C, 7] words per level
+      comp_keys, comp_counts     components, int32[P, 7] words per level
+      comp_chars, comp_ptr/comp_ids  CSR: character (any, not just HSK ones) -> component ids
+      mean, scale                feature standardisation
+      weights                    float32[D + 1, 7] softmax regression (last row = bias)
+      usable                     whether the 80/20 holdout beat both constant baselines
+    """
+    def __init__(self, arrays):
+        for k, v in arrays.items():
+            setattr(self, k, v)
+        self.char_index = {c: i for i, c in enumerate(self.char_keys.tolist())}
+        ptr, ids = self.comp_ptr.tolist(), self.comp_ids.tolist()
+        self.comps_of = {c: ids[ptr[i]:ptr[i + 1]] for i, c in enumerate(self.comp_chars.tolist())}
+
+    # -- features --------------------------------------------------------
+
+    def _groups(self, texts):
+        chars, comps = [], []
+        for text in texts:
+            chars.append([self.char_index.get(ch, -1) for ch in text])
+            comps.append(sorted(set().union(*(self.comps_of.get(ch, ()) for ch in text))))
+        return chars, comps
+
+    def features(self, texts, loo_levels=None):
+        """-> float32[n, D] raw (unstandardised) features for texts."""
+        chars, comps = self._groups(texts)
+        c_stats, c_lowest, c_support, c_unseen = _profile_features(self.char_counts, chars, loo_levels)
+        p_stats, _, p_support, _ = _profile_features(self.comp_counts, comps, loo_levels)
+        lowest = np.eye(UNSEEN, dtype=np.float32)[c_lowest - 1]
+        length = np.eye(4, dtype=np.float32)[np.minimum([len(t) for t in texts], 4) - 1]
+        return np.hstack([c_stats, lowest, c_support, c_unseen[:, None],
+                          p_stats, p_support, length]).astype(np.float32)
+
+    def _design(self, x):
+        return np.hstack([(x - self.mean) / self.scale, np.ones((len(x), 1), dtype=np.float32)])
+
+    # -- fitting ---------------------------------------------------------
+
+    @classmethod
+    def fit(cls, labelled, closure):
+        words = [w for w, _ in labelled]
+        levels = np.array([lvl for _, lvl in labelled], dtype=np.int64)
+
+        # Each word counts once per distinct character / component it uses
+        char_keys = sorted({ch for w in words for ch in w})
+        char_index = {c: i for i, c in enumerate(char_keys)}
+        char_counts = np.zeros((len(char_keys), len(LEVELS)), dtype=np.int32)
+        comp_keys = sorted({p for ps in closure.values() for p in ps})
+        comp_index = {p: i for i, p in enumerate(comp_keys)}
+        comp_counts = np.zeros((len(comp_keys), len(LEVELS)), dtype=np.int32)
+        for w, lvl in zip(words, levels):
+            for ch in set(w):
+                char_counts[char_index[ch], lvl - 1] += 1
+            for p in set().union(*(closure.get(ch, ()) for ch in w)):
+                comp_counts[comp_index[p], lvl - 1] += 1
+
+        comp_chars = sorted(closure)
+        comp_ptr, comp_ids = [0], []
+        for ch in comp_chars:
+            comp_ids.extend(sorted(comp_index[p] for p in closure[ch]))
+            comp_ptr.append(len(comp_ids))
+
+        model = cls({
+            'version': np.array(MODEL_VERSION),
+            'char_keys': np.array(char_keys, dtype=str),
+            'char_counts': char_counts,
+            'comp_keys': np.array(comp_keys, dtype=str),
+            'comp_counts': comp_counts,
+            'comp_chars': np.array(comp_chars, dtype=str),
+            'comp_ptr': np.array(comp_ptr, dtype=np.int64),
+            'comp_ids': np.array(comp_ids, dtype=np.int64),
+            'usable': np.array(False),
+        })
+        x = model.features(words, loo_levels=levels)
+        model.mean = x.mean(axis=0)
+        model.scale = x.std(axis=0) + 1e-6
+        a = model._design(x)
+        y = np.eye(len(LEVELS), dtype=np.float32)[levels - 1]
+        w = np.zeros((a.shape[1], len(LEVELS)), dtype=np.float32)
+        for _ in range(EPOCHS):
+            p = _softmax(a @ w)
+            w -= LEARNING_RATE * (a.T @ (p - y) / len(a) + L2 * w)
+        model.weights = w
+        return model
+
+    def save(self, path):
+        keys = ('version', 'char_keys', 'char_counts', 'comp_keys', 'comp_counts', 'comp_chars',
+                'comp_ptr', 'comp_ids', 'mean', 'scale', 'weights', 'usable')
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, **{k: getattr(self, k) for k in keys})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            arrays = {k: z[k] for k in z.files}
+        if int(arrays['version']) != MODEL_VERSION:
+            raise ValueError(f'{path}: model version {int(arrays["version"])}, expected {MODEL_VERSION}')
+        return cls(arrays)
+
+    # -- scoring ---------------------------------------------------------
+
+    def estimate(self, texts):
+        """
+        -> dict of arrays over texts:
+          level     most likely level (0 = empty text)
+          expected  mean level under the predicted distribution
+        """
+        if not texts:
+            return {'level': np.zeros(0, dtype=np.int8), 'expected': np.zeros(0, dtype=np.float32)}
+        p = _softmax(self._design(self.features(texts)) @ self.weights)
+        has = np.array([bool(t) for t in texts])
+        return {'level': np.where(has, p.argmax(axis=1) + 1, 0).astype(np.int8),
+                'expected': np.where(has, p @ LEVELS, 0).astype(np.float32)}
+
+
+def _softmax(z):
+    z = np.exp(z - z.max(axis=1, keepdims=True))
+    return z / z.sum(axis=1, keepdims=True)
+
+
+def load_model(model_path=DEFAULT_MODEL, hsk=DEFAULT_HSK, parts=DEFAULT_PARTS, rebuild=False):
+    """Load the persisted model, refitting first if it is missing or older than its inputs."""
+    if not rebuild and os.path.exists(model_path):
+        built = os.path.getmtime(model_path)
+        if all(os.path.getmtime(p) <= built for p in (hsk, parts)):
+            try:
+                return Model.load(model_path)
+            except (ValueError, KeyError):
+                pass
+    closure = load_closure(parts)
+    labelled = load_levels(hsk)
+    model = Model.fit(labelled, closure)
+    model.usable = np.array(holdout_report(labelled, closure)['usable'])
+    model.save(model_path)
+    return model
+
+
+def results_for(model, texts):
+    est = model.estimate(texts)
+    usable = bool(model.usable)
+    return [{'level': int(l), 'expected': round(float(e), 2), 'usable': usable}
+            for l, e in zip(est['level'], est['expected'])]
+
+
+def handle_request(req, model):
+    resp = {}
+    if 'id' in req:
+        resp['id'] = req['id']
+    try:
+        if 'texts' in req:
+            resp['results'] = results_for(model, [str(t) for t in req['texts']])
+        elif 'text' in req:
+            resp.update(results_for(model, [str(req['text'])])[0])
+        else:
+            resp['error'] = 'No text provided'
+    except Exception as e:
+        resp['error'] = str(e)
+    return resp
+
+
+def holdout_report(labelled, closure):
+    """Fit on 80% of the labelled words, score the other 20% against constant baselines."""
+    rng = np.random.default_rng(0)
+    perm = rng.permutation(len(labelled))
+    cut = int(len(perm) * 0.8)
+    train = [labelled[i] for i in perm[:cut]]
+    test = [labelled[i] for i in perm[cut:]]
+
+    t0 = time.perf_counter()
+    model = Model.fit(train, closure)
+    fit_s = time.perf_counter() - t0
+
+    texts = [w for w, _ in test]
+    truth = np.array([lvl for _, lvl in test])
+    t0 = time.perf_counter()
+    est = model.estimate(texts)
+    score_s = time.perf_counter() - t0
+
+    pred = est['level'].astype(int)
+    report = {'train': len(train), 'test': len(test), 'fit_s': round(fit_s, 2),
+              'items_per_sec': round(len(texts) / score_s),
+              'level': {'accuracy': round(float((pred == truth).mean()), 3),
+                        'within_1': round(float((abs(pred - truth) <= 1).mean()), 3)}}
+    report['expected_mae'] = round(float(np.abs(est['expected'] - truth).mean()), 3)
+    report['expected_corr'] = round(float(np.corrcoef(est['expected'], truth)[0, 1]), 3)
+    report['majority_baseline'] = round(float((truth == np.bincount(truth).argmax()).mean()), 3)
+    report['median_baseline_mae'] = round(float(np.abs(truth - np.median(truth)).mean()), 3)
+    # Only worth acting on if it beats guessing the commonest level and the median level
+    report['usable'] = bool(report['level']['accuracy'] > report['majority_baseline']
+                            and report['expected_mae'] < report['median_baseline_mae'])
+    return report
+
+
+def run_eval(args):
+    print(json.dumps(holdout_report(load_levels(args.hsk), load_closure(args.parts)), indent=2))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Estimate HSK levels for words without one')
+    ap.add_argument('texts', nargs='*')
+    ap.add_argument('--model', default=DEFAULT_MODEL)
+    ap.add_argument('--hsk', default=DEFAULT_HSK)
+    ap.add_argument('--parts', default=DEFAULT_PARTS)
+    ap.add_argument('--rebuild', action='store_true', help='refit and save the model')
+    ap.add_argument('--eval', action='store_true', help='80/20 holdout accuracy and throughput')
+    ap.add_argument('--serve', action='store_true', help='JSON-lines worker over stdin/stdout')
+    args = ap.parse_args()
+
+    if args.eval:
+        run_eval(args)
+        return
+
+    t0 = time.perf_counter()
+    model = load_model(args.model, args.hsk, args.parts, rebuild=args.rebuild)
+    print(json.dumps({'model': args.model, 'characters': len(model.char_keys), 'components': len(model.comp_keys),
+                      'load_ms': round((time.perf_counter() - t0) * 1000, 1)}), file=sys.stderr, flush=True)
+    if args.serve:
+        serve_stdio(lambda req: handle_request(req, model))
+    elif args.texts:
+        for text, res in zip(args.texts, results_for(model, args.texts)):
+            print(json.dumps({'text': text, **res}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+JSON-lines worker plumbing shared by the --serve scripts (pinyin_util.py,
+search_service.py, hsk_estimator.py, etl/variants.py, etl/text_analyzer.py):
+one request object per line in, one response object per line out, over
+stdin/stdout or a local Unix socket. `handle` maps a decoded request dict to
+its response dict.
+"""
+import json
+import os
+import sys
+
+
+def serve_stream(fin, fout, handle):
+    for line in fin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError as e:
+            resp = {"error": f"Bad JSON: {e}"}
+        else:
+            resp = handle(req)
+        fout.write(json.dumps(resp, ensure_ascii=False) + "\n")
+        fout.flush()
+
+
+def serve_stdio(handle):
+    sys.stdin.reconfigure(encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    serve_stream(sys.stdin, sys.stdout, handle)
+
+
+def serve_socket(sock_path, handle):
+    import socketserver
+
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            fin = (raw.decode('utf-8') for raw in self.rfile)
+            fout = _SocketWriter(self.wfile)
+            serve_stream(fin, fout, handle)
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    with Server(sock_path, Handler) as srv:
+        print(json.dumps({"listening": sock_path}), file=sys.stderr, flush=True)
+        try:
+            srv.serve_forever()
+        finally:
+            os.unlink(sock_path)
+
+
+class _SocketWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+    def write(self, s):
+        self.wfile.write(s.encode('utf-8'))
+    def flush(self):
+        self.wfile.flush()
+
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
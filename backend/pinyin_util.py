@@ -1,28 +1,121 @@
 import sys
 import json
+import time
+import argparse
+import subprocess
+from functools import lru_cache
 from pypinyin import pinyin, Style
 
+from jsonl_worker import percentile, serve_socket, serve_stdio
+
+DEFAULT_CACHE_SIZE = 4096
+
 def generate_pinyin(text):
     # Use TONE style for pinyin with tone marks (e.g., zhōng)
     # pinyin returns a list of lists, e.g. [['zhōng'], ['xīn']]
     # We handle heteronyms by just taking the first one (default behavior of pypinyin without heteronym=True)
     result = pinyin(text, style=Style.TONE)
-    
+
     # Flatten and join with spaces
-    # Handle cases where result might be empty or have different structure? 
+    # Handle cases where result might be empty or have different structure?
     # pypinyin usually returns [[str], [str]] for each char.
-    
+
     flat_list = []
     for item in result:
         if item:
             flat_list.append(item[0])
         else:
             flat_list.append('')
-            
+
     return ' '.join(flat_list)
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
+def convert(text, heteronym=False, zhuyin=False):
+    """
+    Full conversion used by the worker. Returns a dict with 'pinyin' (same
+    string generate_pinyin gives) plus optional 'heteronyms' (all readings
+    per syllable) and 'zhuyin'.
+    """
+    out = {"pinyin": generate_pinyin(text)}
+    if heteronym:
+        out["heteronyms"] = pinyin(text, style=Style.TONE, heteronym=True)
+    if zhuyin:
+        out["zhuyin"] = ' '.join(item[0] if item else '' for item in pinyin(text, style=Style.BOPOMOFO))
+    return out
+
+def make_cached_convert(maxsize=DEFAULT_CACHE_SIZE):
+    # The cache holds JSON strings so callers can never mutate a cached result
+    @lru_cache(maxsize=maxsize)
+    def cached(text, heteronym, zhuyin):
+        return json.dumps(convert(text, heteronym, zhuyin), ensure_ascii=False)
+    return lambda text, heteronym=False, zhuyin=False: json.loads(cached(text, bool(heteronym), bool(zhuyin)))
+
+def handle_request(req, convert_fn):
+    """
+    One JSON-lines request -> one response dict.
+    Single:  {"id": 1, "text": "中心", "zhuyin": true}
+    Batch:   {"id": 2, "texts": ["中心", "行"], "heteronym": true}
+    The 'id' is echoed back so clients can pipeline requests.
+    """
+    resp = {}
+    if "id" in req:
+        resp["id"] = req["id"]
+    heteronym = req.get("heteronym", False)
+    zhuyin = req.get("zhuyin", False)
+    try:
+        if "texts" in req:
+            resp["results"] = [convert_fn(t, heteronym, zhuyin) for t in req["texts"]]
+        elif "text" in req:
+            resp.update(convert_fn(req["text"], heteronym, zhuyin))
+        else:
+            resp["error"] = "No text provided"
+    except Exception as e:
+        resp["error"] = str(e)
+    return resp
+
+def run_bench(n, text):
+    """
+    Latency comparison: spawn-per-call (what server.js used to do) vs one
+    persistent --serve worker. Prints median / p95 in milliseconds.
+    """
+    script = __file__
+    spawn = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, script, text], capture_output=True, check=True)
+        spawn.append((time.perf_counter() - t0) * 1000)
+
+    proc = subprocess.Popen([sys.executable, script, "--serve"], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, text=True, encoding='utf-8')
+    t0 = time.perf_counter()
+    proc.stdin.write(json.dumps({"id": 0, "text": text}, ensure_ascii=False) + "\n")
+    proc.stdin.flush()
+    proc.stdout.readline()
+    startup = (time.perf_counter() - t0) * 1000
+
+    worker = []
+    for i in range(n):
+        # Vary the text so the LRU cache doesn't make every call a hit
+        t = text + str(i % 10) if i % 2 else text
+        t0 = time.perf_counter()
+        proc.stdin.write(json.dumps({"id": i + 1, "text": t}, ensure_ascii=False) + "\n")
+        proc.stdin.flush()
+        proc.stdout.readline()
+        worker.append((time.perf_counter() - t0) * 1000)
+    proc.stdin.close()
+    proc.wait()
+
+    spawn.sort()
+    worker.sort()
+    print(json.dumps({
+        "calls": n,
+        "spawn_per_call_ms": {"p50": round(percentile(spawn, 0.5), 3), "p95": round(percentile(spawn, 0.95), 3)},
+        "worker_startup_ms": round(startup, 3),
+        "worker_ms": {"p50": round(percentile(worker, 0.5), 3), "p95": round(percentile(worker, 0.95), 3)},
+    }, indent=2))
+
+def main():
+    # No flags: keep the original one-shot CLI contract ({"pinyin": ...})
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("--"):
         # Join all arguments in case of spaces, though usually passed as one quoted string
         text = " ".join(sys.argv[1:])
         try:
@@ -31,5 +124,26 @@ if __name__ == "__main__":
             print(json.dumps({"pinyin": py}))
         except Exception as e:
             print(json.dumps({"error": str(e)}))
+        return
+
+    ap = argparse.ArgumentParser(description="Pinyin generation: one-shot CLI or long-running worker")
+    ap.add_argument("--serve", action="store_true", help="JSON-lines worker over stdin/stdout")
+    ap.add_argument("--socket", help="JSON-lines worker on a local Unix socket at this path")
+    ap.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="LRU cache entries")
+    ap.add_argument("--bench", type=int, metavar="N", help="Compare spawn-per-call vs worker latency over N calls")
+    ap.add_argument("--bench-text", default="中华人民共和国")
+    args = ap.parse_args()
+
+    if args.bench:
+        run_bench(args.bench, args.bench_text)
+    elif args.socket:
+        convert_fn = make_cached_convert(args.cache_size)
+        serve_socket(args.socket, lambda req: handle_request(req, convert_fn))
+    elif args.serve:
+        convert_fn = make_cached_convert(args.cache_size)
+        serve_stdio(lambda req: handle_request(req, convert_fn))
     else:
         print(json.dumps({"error": "No text provided"}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+In-memory search index for /api/search-items.
+
+Items come from the merged HSK list (words, pinyin, English) and from
+readings_slim.csv (every other character with a Mandarin reading). Custom
+words exist only in Postgres; server.js matches those in SQL and merges them
+with this index's ranking. Retrieval
+follows the usual tolerant-retrieval recipe:
+
+  * a term dictionary per field: tone-stripped pinyin ("hao", "nihao"),
+    tone-numbered pinyin ("hao3", "ni3hao3") and English words, each kept
+    sorted so a typed prefix is one bisect;
+  * a character index over the hanzi, so a substring query only verifies
+    the items containing every character;
+  * a k-gram (bigram, '$'-anchored) index over the pinyin and English
+    vocabulary. It answers wildcard queries ("ha*", "*tion") and supplies
+    candidates for edit-distance spelling correction when nothing matches.
+
+Items are numbered by their static rank (HSK level, then length, then source
+order), so within a tier "lowest id" is "best". Ranking follows the order the
+SQL query used: exact value/pinyin match, whole-word English match, hanzi
+prefix, then static rank.
+
+Runs as a JSON-lines worker like pinyin_util.py:
+    {"id": 1, "q": "hao", "limit": 50}
+ -> {"id": 1, "results": [{"value": "好", "pinyin": "hǎo", ...}], "corrected": null}
+"""
+import argparse
+import csv
+import fnmatch
+import heapq
+import json
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+from jsonl_worker import percentile, serve_socket, serve_stdio
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HSK = os.path.join(HERE, 'data', '00_hsk', 'HSK_all_merged.tsv')
+DEFAULT_READINGS = os.path.join(HERE, 'data', 'processed', 'readings_slim.csv')
+DEFAULT_LIMIT = 50
+
+HANZI_RE = re.compile(r'[㐀-鿿豈-﫿\U00020000-\U0003134f〇]')
+WORD_RE = re.compile(r'[a-z0-9]+')
+TONE_MARKS = {'̄': '1', '́': '2', '̌': '3', '̀': '4'}
+SEPARATORS_RE = re.compile(r"[\s'\-·]+")
+# Prefix expansion needs at least this many characters; one letter would
+# pull in a large slice of the vocabulary for no useful ranking.
+MIN_PREFIX = 2
+MAX_EDIT = 2
+
+
+def fold(s):
+    """Tone-stripped, lowercase pinyin letters (ü -> v)."""
+    out = []
+    for ch in unicodedata.normalize('NFD', s.lower()):
+        if 'a' <= ch <= 'z' or '0' <= ch <= '9':
+            out.append(ch)
+        elif ch == '̈' and out and out[-1] == 'u':
+            out[-1] = 'v'
+    return ''.join(out)
+
+
+def numbered(syllable):
+    """Tone-marked syllable -> numbered ('hǎo' -> 'hao3', 'ma' -> 'ma5')."""
+    tone = '5'
+    for ch in unicodedata.normalize('NFD', syllable):
+        tone = TONE_MARKS.get(ch, tone)
+    return fold(syllable) + tone
+
+
+def squash(s):
+    return SEPARATORS_RE.sub('', unicodedata.normalize('NFC', s.lower()))
+
+
+def kgrams(term):
+    t = f'${term}$'
+    return {t[i:i + 2] for i in range(len(t) - 1)}
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein with early exit once every cell in a row exceeds limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class Item:
+    __slots__ = ('value', 'pinyin', 'english', 'hsk_level', 'order', 'readings')
+
+    def __init__(self, value, pinyin, english, hsk_level, order):
+        self.value = value
+        self.pinyin = pinyin
+        self.english = english
+        self.hsk_level = hsk_level
+        self.order = order
+        self.readings = []  # (marked, numbered syllables) per reading
+
+    def as_dict(self):
+        return {'value': self.value, 'pinyin': self.pinyin,
+                'english': self.english, 'hsk_level': self.hsk_level}
+
+
+def load_items(hsk_path=DEFAULT_HSK, readings_path=DEFAULT_READINGS):
+    """value -> Item. HSK rows first; readings add characters not in the list."""
+    items = {}
+
+    def add(value, marked, num_sylls, english, level):
+        item = items.get(value)
+        if item is None:
+            item = items[value] = Item(value, marked, english, level, len(items))
+        elif level is not None and (item.hsk_level is None or level < item.hsk_level):
+            item.hsk_level = level
+        if english and english not in item.english:
+            item.english = f'{item.english}; {english}' if item.english else english
+        for i, alt in enumerate(marked.split('|')):
+            sylls = num_sylls[i] if i < len(num_sylls) else [numbered(s) for s in alt.split()]
+            item.readings.append((alt, sylls))
+
+    if hsk_path and os.path.exists(hsk_path):
+        with open(hsk_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                value = (row.get('Simplified') or '').strip()
+                if not value:
+                    continue
+                level = (row.get('Level') or '').split('-')[0]
+                nums = [alt.split() for alt in (row.get('PinyinNumbered') or '').split('|')] \
+                    if row.get('PinyinNumbered') else []
+                add(value, (row.get('Pinyin') or '').strip(), nums, (row.get('English') or '').strip(),
+                    int(level) if level.isdigit() else None)
+
+    if readings_path and os.path.exists(readings_path):
+        with open(readings_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                value, py = row['hanzi'], row['pinyin']
+                # Jyutping rows (tone digits) carry no Mandarin reading
+                mandarin = [] if re.search(r'\d', py) else [p.strip() for p in py.split(',') if p.strip()]
+                if value in items and not mandarin:
+                    continue
+                add(value, '|'.join(mandarin), [[numbered(p)] for p in mandarin],
+                    row.get('english_definition') or '', None)
+    return items
+
+
+class SearchIndex:
+    def __init__(self, items):
+        # Renumber by static rank so smaller id == better within a tier
+        ranked = sorted(items.values(), key=lambda it: (it.hsk_level or 99, len(it.value), it.order))
+        self.items = ranked
+        self.chars = {}      # hanzi -> [ids]
+        self.exact = {}      # value / pinyin spellings -> {ids}
+        self.fields = {'py': {}, 'pn': {}, 'en': {}}  # term -> [ids]
+        self.marked = []     # id -> squashed tone-marked pinyin (for tone-mark queries)
+        self.english = []    # id -> lowercase English
+
+        for i, it in enumerate(ranked):
+            for ch in set(HANZI_RE.findall(it.value)):
+                self.chars.setdefault(ch, []).append(i)
+            keys = {it.value, *it.value.split('|')}
+            py_terms, pn_terms = set(), set()
+            for marked, sylls in it.readings:
+                toneless = [s.rstrip('012345') for s in sylls]
+                py_terms.update(toneless)
+                py_terms.add(''.join(toneless))
+                pn_terms.update(sylls)
+                pn_terms.add(''.join(sylls))
+                keys.update((squash(marked), ''.join(toneless), ''.join(sylls)))
+            for k in keys:
+                if k:
+                    self.exact.setdefault(k, set()).add(i)
+            for t in py_terms:
+                if t:
+                    self.fields['py'].setdefault(t, []).append(i)
+            for t in pn_terms:
+                if t:
+                    self.fields['pn'].setdefault(t, []).append(i)
+            english = it.english.lower()
+            for t in set(WORD_RE.findall(english)):
+                self.fields['en'].setdefault(t, []).append(i)
+            self.marked.append('|'.join(squash(m) for m, _ in it.readings))
+            self.english.append(english)
+
+        self.vocab = {f: sorted(d) for f, d in self.fields.items()}
+        # k-gram index over pinyin + English terms (term ids into self.lexicon)
+        self.lexicon = sorted(set(self.fields['py']) | set(self.fields['en']))
+        self.kgram = {}
+        for tid, term in enumerate(self.lexicon):
+            for g in kgrams(term):
+                self.kgram.setdefault(g, []).append(tid)
+
+    # -- retrieval -------------------------------------------------------
+
+    def _postings(self, field, term, prefix):
+        d = self.fields[field]
+        if not prefix or len(term) < MIN_PREFIX:
+            return set(d.get(term, ()))
+        vocab = self.vocab[field]
+        out = set()
+        i = bisect_left(vocab, term)
+        while i < len(vocab) and vocab[i].startswith(term):
+            out.update(d[vocab[i]])
+            i += 1
+        return out
+
+    def _term_postings(self, term):
+        out = set()
+        for field in ('py', 'en'):
+            out.update(self.fields[field].get(term, ()))
+        return out
+
+    def _hanzi(self, q):
+        chars = sorted(set(HANZI_RE.findall(q)), key=lambda c: len(self.chars.get(c, ())))
+        if not chars:
+            return set()
+        cands = set(self.chars.get(chars[0], ()))
+        for c in chars[1:]:
+            cands.intersection_update(self.chars.get(c, ()))
+        if '*' in q:
+            pat = re.compile(fnmatch.translate(q))
+            return {i for i in cands if pat.match(self.items[i].value)}
+        return {i for i in cands if q in self.items[i].value}
+
+    def wildcard_terms(self, pattern):
+        """Lexicon terms matching a '*' pattern, via the k-gram index."""
+        pieces = f'${pattern}$'.split('*')
+        grams = set()
+        for p in pieces:
+            grams.update(p[i:i + 2] for i in range(len(p) - 1))
+        if not grams:
+            return []
+        tids = None
+        for g in sorted(grams, key=lambda g: len(self.kgram.get(g, ()))):
+            post = self.kgram.get(g, ())
+            tids = set(post) if tids is None else tids.intersection(post)
+            if not tids:
+                return []
+        pat = re.compile(fnmatch.translate(pattern))
+        return [self.lexicon[t] for t in sorted(tids) if pat.match(self.lexicon[t])]
+
+    def correct(self, term):
+        """Closest lexicon term by edit distance (k-gram overlap prefilter), or None."""
+        if len(term) < 3:
+            return None
+        limit = 1 if len(term) <= 4 else MAX_EDIT
+        grams = kgrams(term)
+        overlap = Counter()
+        for g in grams:
+            overlap.update(self.kgram.get(g, ()))
+        cands = []
+        for tid, n in overlap.items():
+            cand = self.lexicon[tid]
+            # Jaccard on bigram sets; len + 1 bigrams per '$'-padded term
+            if n / (len(grams) + len(cand) + 1 - n) >= 0.3:
+                cands.append(cand)
+        best = None
+        for cand in cands:
+            d = edit_distance(term, cand, limit)
+            if d <= limit:
+                key = (d, -len(self._term_postings(cand)), cand)
+                if best is None or key < best:
+                    best = key
+        return best[2] if best else None
+
+    def _match(self, q):
+        """-> (candidates, exact, whole_word, hanzi_prefix) id sets for a normalized query."""
+        exact = set(self.exact.get(q, ()))
+        if HANZI_RE.search(q):
+            cands = self._hanzi(q)
+            prefix = {i for i in cands if self.items[i].value.startswith(q)}
+            return cands | exact, exact, set(), prefix
+
+        if '*' in q:
+            cands = set()
+            for term in self.wildcard_terms(squash(q)):
+                cands |= self._term_postings(term)
+            return cands, set(), set(), set()
+
+        sq = squash(q)
+        exact |= self.exact.get(sq, set())
+        cands = set()
+        if sq:
+            if re.search(r'\d', sq):
+                cands |= self._postings('pn', sq, prefix=True)
+            else:
+                cands |= self._postings('py', fold(sq), prefix=True)
+                if fold(sq) != sq:
+                    # Tone marks typed: keep only items whose marked pinyin has them
+                    cands = {i for i in cands if sq in self.marked[i]}
+
+        tokens = WORD_RE.findall(q) if q.isascii() else []
+        whole = set()
+        if tokens:
+            words = None
+            for k, t in enumerate(tokens):
+                post = self._postings('en', t, prefix=k == len(tokens) - 1)
+                words = post if words is None else words & post
+            cands |= words
+            whole = set(self.fields['en'].get(tokens[0], ()))
+            for t in tokens[1:]:
+                whole &= set(self.fields['en'].get(t, ()))
+            if len(tokens) > 1:
+                pat = re.compile(r'\b' + r'\s+'.join(map(re.escape, tokens)) + r'\b')
+                whole = {i for i in whole if pat.search(self.english[i])}
+        return cands | exact, exact, whole, set()
+
+    @staticmethod
+    def _rank(cands, exact, whole, prefix, limit):
+        # Tiers in the old ORDER BY order; ids are already static rank
+        out = sorted(exact, key=lambda i: (i not in whole, i not in prefix, i))
+        seen = set(exact)
+        for tier in (whole & prefix, whole, prefix, cands):
+            if len(out) >= limit:
+                break
+            rest = tier - seen
+            out.extend(heapq.nsmallest(limit - len(out), rest))
+            seen |= rest
+        return out[:limit]
+
+    def search(self, q, limit=DEFAULT_LIMIT, correct=True):
+        """-> (list of item dicts, corrected query or None)."""
+        q = unicodedata.normalize('NFC', q.strip().lower())
+        if not q:
+            return [], None
+        cands, exact, whole, prefix = self._match(q)
+        corrected = None
+        if not cands and correct and not HANZI_RE.search(q) and '*' not in q:
+            fixed = [self.correct(t) or t for t in q.split()]
+            if ' '.join(fixed) != q:
+                corrected = ' '.join(fixed)
+                cands, exact, whole, prefix = self._match(corrected)
+        ids = self._rank(cands, exact, whole, prefix, limit)
+        return [self.items[i].as_dict() for i in ids], corrected
+
+
+def handle_request(req, index):
+    resp = {}
+    if 'id' in req:
+        resp['id'] = req['id']
+    try:
+        limit = req.get('limit', DEFAULT_LIMIT)
+        if 'q' not in req:
+            resp['error'] = 'No query provided'
+        elif not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            resp['error'] = f'limit must be a positive integer, got {limit!r}'
+        else:
+            results, corrected = index.search(req['q'], limit)
+            resp['results'] = results
+            resp['corrected'] = corrected
+    except Exception as e:
+        resp['error'] = str(e)
+    return resp
+
+
+def synthetic_items(items, n, seed=0):
+    """Pad the real items up to n with two-word compounds built from them."""
+    rng = random.Random(seed)
+    base = [it for it in items.values() if it.readings]
+    out = dict(items)
+    while len(out) < n:
+        a, b = rng.choice(base), rng.choice(base)
+        value = a.value.split('|')[0] + b.value.split('|')[0]
+        if value in out:
+            continue
+        item = Item(value, f'{a.readings[0][0]} {b.readings[0][0]}',
+                    '; '.join(e for e in (a.english, b.english) if e)[:200], None, len(out))
+        item.readings.append((item.pinyin, a.readings[0][1] + b.readings[0][1]))
+        out[value] = item
+    return out
+
+
+def run_bench(items, n_items, n_queries):
+    """Build over n_items and time a mixed query load: p50 / p95 / p99 in ms."""
+    t0 = time.perf_counter()
+    items = synthetic_items(items, n_items)
+    index = SearchIndex(items)
+    build_s = time.perf_counter() - t0
+
+    rng = random.Random(1)
+    sample = [it for it in index.items[:20000] if it.readings]
+    queries = []
+    for _ in range(n_queries):
+        it = rng.choice(sample)
+        kind = rng.randrange(6)
+        toneless = ''.join(s.rstrip('012345') for s in it.readings[0][1])
+        words = WORD_RE.findall(it.english.lower()) or [toneless]
+        if kind == 0:
+            queries.append(it.value[:2])
+        elif kind == 1:
+            queries.append(toneless[:rng.randint(2, max(2, len(toneless)))])
+        elif kind == 2:
+            queries.append(it.readings[0][0])
+        elif kind == 3:
+            queries.append(' '.join(words[:rng.randint(1, 2)]))
+        elif kind == 4:
+            w = rng.choice(words)
+            queries.append(w[:len(w) // 2] + w[len(w) // 2 + 1:] if len(w) > 4 else w)  # typo
+        else:
+            queries.append(toneless[:2] + '*')
+
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    print(json.dumps({
+        'items': len(index.items),
+        'build_s': round(build_s, 2),
+        'queries': len(queries),
+        'ms': {'p50': round(percentile(times, 0.5), 3), 'p95': round(percentile(times, 0.95), 3),
+               'p99': round(percentile(times, 0.99), 3), 'max': round(times[-1], 3)},
+    }, indent=2))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Tolerant-retrieval search over HSK items and characters')
+    ap.add_argument('--hsk', default=DEFAULT_HSK, help='HSK_all_merged.tsv')
+    ap.add_argument('--readings', default=DEFAULT_READINGS, help='readings_slim.csv')
+    ap.add_argument('--serve', action='store_true', help='JSON-lines worker over stdin/stdout')
+    ap.add_argument('--socket', help='JSON-lines worker on a local Unix socket at this path')
+    ap.add_argument('--bench', type=int, metavar='N', help='Time queries over an index padded to N items')
+    ap.add_argument('--bench-queries', type=int, default=5000)
+    ap.add_argument('query', nargs='*', help='one-shot query')
+    args = ap.parse_args()
+
+    items = load_items(args.hsk, args.readings)
+    if args.bench:
+        run_bench(items, args.bench, args.bench_queries)
+        return
+
+    t0 = time.perf_counter()
+    index = SearchIndex(items)
+    print(json.dumps({'items': len(index.items), 'terms': len(index.lexicon),
+                      'build_ms': round((time.perf_counter() - t0) * 1000, 1)}), file=sys.stderr, flush=True)
+    if args.socket:
+        serve_socket(args.socket, lambda req: handle_request(req, index))
+    elif args.serve:
+        serve_stdio(lambda req: handle_request(req, index))
+    elif args.query:
+        results, corrected = index.search(' '.join(args.query))
+        print(json.dumps({'results': results[:10], 'corrected': corrected}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -20,10 +20,144 @@ const cors = require('cors');
 const bcrypt = require('bcrypt');
 const jwt = require('jsonwebtoken');
 const path = require('path');
-const { GoogleGenerativeAI } = require("@google/generative-ai");
-const { exec } = require('child_process');
+const fs = require('fs');
 const util = require('util');
-const execPromise = util.promisify(exec);
+const zlib = require('zlib');
+const { GoogleGenerativeAI } = require("@google/generative-ai");
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+// Long-running Python workers speaking JSON lines over stdin/stdout. Spawning
+// python per request paid interpreter startup + data load every time.
+//   pinyin_util.py --serve      pinyin / zhuyin generation
+//   search_service.py --serve   tolerant-retrieval index behind /api/search-items
+//   hsk_estimator.py --serve    estimated HSK level for custom items
+//   ../etl/variants.py --serve  traditional form of custom items
+//   ../etl/text_analyzer.py --serve  HSK level breakdown of example sentences / arbitrary text
+// A call that gets no answer within WORKER_TIMEOUT_MS is rejected; a worker that
+// fails to spawn or dies rejects everything still waiting on it.
+const WORKER_TIMEOUT_MS = Number(process.env.WORKER_TIMEOUT_MS) || 15000;
+
+function createWorker(label, scriptName, args) {
+    const worker = {
+        proc: null,
+        nextId: 1,
+        pending: new Map(),
+    };
+
+    // Forget `proc` (only if it is still the current one) and fail its pending calls
+    const fail = (proc, reason) => {
+        if (worker.proc !== proc) return;
+        worker.proc = null;
+        for (const waiter of worker.pending.values()) {
+            waiter.reject(new Error(`${label} worker ${reason}`));
+        }
+        worker.pending.clear();
+    };
+
+    worker.start = () => {
+        const scriptPath = path.join(__dirname, scriptName);
+        const python = process.env.PYTHON || 'python';
+        const proc = spawn(python, [scriptPath, ...args], { stdio: ['pipe', 'pipe', 'pipe'] });
+        worker.proc = proc;
+
+        readline.createInterface({ input: proc.stdout }).on('line', (line) => {
+            let msg;
+            try {
+                msg = JSON.parse(line);
+            } catch (e) {
+                console.error(`${label} worker sent bad JSON:`, line);
+                return;
+            }
+            const waiter = worker.pending.get(msg.id);
+            if (!waiter) return;
+            worker.pending.delete(msg.id);
+            if (msg.error) waiter.reject(new Error(msg.error));
+            else waiter.resolve(msg);
+        });
+        proc.stderr.on('data', (d) => console.error(`${label} worker stderr:`, d.toString()));
+        proc.on('exit', (code) => {
+            console.error(`${label} worker exited (code ${code})`);
+            fail(proc, 'exited');
+        });
+        // A failed spawn (e.g. ENOENT for a bad PYTHON) emits 'error' and 'close' but never 'exit'
+        proc.on('error', (err) => {
+            console.error(`Failed to start ${label.toLowerCase()} worker:`, err);
+            fail(proc, 'unavailable');
+        });
+        proc.on('close', () => fail(proc, 'closed'));
+        proc.stdin.on('error', (err) => {
+            console.error(`${label} worker stdin:`, err.message);
+            fail(proc, 'unavailable');
+        });
+        return proc;
+    };
+
+    // Resolves to the worker's response; restarts the worker if it died.
+    worker.call = (payload) => {
+        if (!worker.proc) worker.start();
+        const id = worker.nextId++;
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                if (worker.pending.delete(id)) reject(new Error(`${label} worker timed out`));
+            }, WORKER_TIMEOUT_MS);
+            worker.pending.set(id, {
+                resolve: (msg) => { clearTimeout(timer); resolve(msg); },
+                reject: (err) => { clearTimeout(timer); reject(err); },
+            });
+            worker.proc.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+        });
+    };
+
+    return worker;
+}
+
+const pinyinWorker = createWorker('Pinyin', 'pinyin_util.py', ['--serve']);
+const searchWorker = createWorker('Search', 'search_service.py', ['--serve']);
+const estimatorWorker = createWorker('Estimator', 'hsk_estimator.py', ['--serve']);
+const scriptWorker = createWorker('Script', '../etl/variants.py', ['--serve']);
+const analyzerWorker = createWorker('Analyzer', '../etl/text_analyzer.py', ['--serve']);
+
+// Estimated HSK level (mean of the predicted level distribution) for a custom
+// item, or null if the estimator is unavailable or its model didn't beat the
+// holdout baselines. It only affects discovery ordering, so failures are logged
+// and otherwise ignored.
+async function estimateHskLevel(text) {
+    try {
+        const est = await estimatorWorker.call({ text });
+        return est.level && est.usable ? est.expected : null;
+    } catch (err) {
+        console.error('HSK level estimation failed:', err.message);
+        return null;
+    }
+}
+
+// Traditional form of `text` (phrase-aware), or null if the converter is unavailable
+async function toTraditional(text) {
+    try {
+        return (await scriptWorker.call({ text, to: 'trad' })).text;
+    } catch (err) {
+        console.error('Traditional conversion failed:', err.message);
+        return null;
+    }
+}
+
+// Per-text HSK breakdown (coverage by level, unknown characters, word positions),
+// or null if the analyzer is unavailable
+async function analyzeTexts(texts) {
+    if (texts.length === 0) return [];
+    try {
+        return (await analyzerWorker.call({ texts })).results;
+    } catch (err) {
+        console.error('Text analysis failed:', err.message);
+        return null;
+    }
+}
+
+// Resolves to { pinyin, zhuyin?, heteronyms? }
+function generatePinyin(text, opts = {}) {
+    return pinyinWorker.call({ text, ...opts });
+}
 
 let fsrsLib = null;
 async function initFsrs() {
@@ -76,6 +210,114 @@ app.use(cors({
 // Serve stroke/data files under /data
 app.use('/data', express.static(path.join(__dirname, 'data')));
 
+// Packed stroke bundle (etl/03c_pack_strokes.py): sorted code-point index +
+// zlib records. The index is loaded on first use; each lookup is one positioned
+// read. Every lookup stats the file, and a rebuilt bundle (03c swaps in a new
+// file, so a new inode) is reopened; the old handle is closed once the reads
+// still using it finish. A missing bundle is re-checked at most once a minute,
+// so building it doesn't need a restart.
+const STROKE_BUNDLE_PATH = path.join(__dirname, '..', 'data', 'processed', 'strokes.bin');
+const STROKE_BUNDLE_RETRY_MS = 60 * 1000;
+const inflateAsync = util.promisify(zlib.inflate);
+let strokeBundle = null;
+let strokeBundleCheckedAt = 0;
+let strokeBundleOpening = null;
+
+async function loadStrokeBundle() {
+    const fh = await fs.promises.open(STROKE_BUNDLE_PATH, 'r');
+    try {
+        const st = await fh.stat();
+        const header = Buffer.alloc(12);
+        await fh.read(header, 0, 12, 0);
+        if (header.toString('latin1', 0, 4) !== 'HZSB') throw new Error('bad stroke bundle magic');
+        const count = header.readUInt32LE(8);
+        const align8 = (n) => Math.ceil(n / 8) * 8;
+        const cpsOff = 12;
+        const offsOff = align8(cpsOff + 4 * count);
+        const lensOff = offsOff + 8 * count;
+        const index = Buffer.alloc(lensOff + 4 * count - cpsOff);
+        await fh.read(index, 0, index.length, cpsOff);
+        return {
+            fh,
+            ino: st.ino,
+            mtimeMs: st.mtimeMs,
+            count,
+            readers: 0,
+            retired: false,
+            cps: (i) => index.readUInt32LE(4 * i),
+            offset: (i) => Number(index.readBigUInt64LE(offsOff - cpsOff + 8 * i)),
+            length: (i) => index.readUInt32LE(lensOff - cpsOff + 4 * i),
+        };
+    } catch (err) {
+        await fh.close();
+        throw err;
+    }
+}
+
+function releaseStrokeBundle(bundle) {
+    if (bundle.readers === 0 && bundle.retired) bundle.fh.close().catch(() => {});
+}
+
+async function openStrokeBundle() {
+    if (strokeBundle === false && Date.now() - strokeBundleCheckedAt < STROKE_BUNDLE_RETRY_MS) return false;
+    const st = await fs.promises.stat(STROKE_BUNDLE_PATH).catch(() => null);
+    const current = strokeBundle;
+    if (current && st && st.ino === current.ino && st.mtimeMs === current.mtimeMs) return current;
+    // Missing, never opened, or rebuilt; concurrent requests share one reopen
+    if (!strokeBundleOpening) {
+        strokeBundleOpening = (async () => {
+            strokeBundleCheckedAt = Date.now();
+            let next = false;
+            try {
+                next = await loadStrokeBundle();
+            } catch (err) {
+                console.warn('Stroke bundle unavailable, falling back to loose JSON files:', err.message);
+            }
+            if (strokeBundle) {
+                strokeBundle.retired = true;
+                releaseStrokeBundle(strokeBundle);
+            }
+            strokeBundle = next;
+            strokeBundleOpening = null;
+            return next;
+        })();
+    }
+    return strokeBundleOpening;
+}
+
+// Lets the client skip /api/strokes/:char (and its 404) when there is no bundle
+app.get('/api/strokes', async (req, res) => {
+    res.json({ available: Boolean(await openStrokeBundle()) });
+});
+
+app.get('/api/strokes/:char', async (req, res) => {
+    const bundle = await openStrokeBundle();
+    const cp = req.params.char.codePointAt(0);
+    if (!bundle || cp === undefined) return res.status(404).json({ message: 'Not found' });
+    let lo = 0;
+    let hi = bundle.count;
+    while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (bundle.cps(mid) < cp) lo = mid + 1;
+        else hi = mid;
+    }
+    if (lo >= bundle.count || bundle.cps(lo) !== cp) return res.status(404).json({ message: 'Not found' });
+    bundle.readers += 1;
+    try {
+        const buf = Buffer.alloc(bundle.length(lo));
+        await bundle.fh.read(buf, 0, buf.length, bundle.offset(lo));
+        const json = await inflateAsync(buf);
+        res.set('Cache-Control', 'public, max-age=86400');
+        res.type('application/json').send(json);
+    } catch (err) {
+        console.error('Error reading stroke bundle:', err.message);
+        res.status(500).json({ message: 'Server Error reading stroke data' });
+    } finally {
+        bundle.readers -= 1;
+        releaseStrokeBundle(bundle);
+    }
+});
+
 // Request logger
 app.use((req, res, next) => {
   console.log(`${req.method} ${req.originalUrl}`);
@@ -161,6 +403,11 @@ async function ensureSkillsSchema() {
         await client.query(`ALTER TABLE user_item_skill_progress ADD COLUMN IF NOT EXISTS difficulty DOUBLE PRECISION`);
         await client.query(`ALTER TABLE user_item_skill_progress ADD COLUMN IF NOT EXISTS suspended BOOLEAN NOT NULL DEFAULT FALSE`);
 
+        // Estimated HSK level for custom items (hsk_level stays 0 to mark them custom)
+        await client.query(`ALTER TABLE items ADD COLUMN IF NOT EXISTS estimated_hsk_level REAL`);
+        // Traditional form of custom items (etl/variants.py)
+        await client.query(`ALTER TABLE items ADD COLUMN IF NOT EXISTS traditional TEXT`);
+
         // Reviews log for FSRS history
         await client.query(`
             CREATE TABLE IF NOT EXISTS user_item_skill_reviews (
@@ -204,6 +451,18 @@ async function ensureSkillsSchema() {
                 updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
             );
         `);
+        // Per-user FSRS weights fitted offline (backend/fsrs_optimizer.py --apply)
+        await client.query(`
+            CREATE TABLE IF NOT EXISTS user_fsrs_weights (
+                user_id INTEGER PRIMARY KEY,
+                weights DOUBLE PRECISION[] NOT NULL,
+                source TEXT NOT NULL DEFAULT 'user',   -- user | global
+                review_count INTEGER,
+                log_loss DOUBLE PRECISION,
+                rmse DOUBLE PRECISION,
+                fitted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        `);
         // Add new columns if missing
         await client.query(`ALTER TABLE user_options ADD COLUMN IF NOT EXISTS reminders_enabled BOOLEAN NOT NULL DEFAULT FALSE`);
         await client.query(`ALTER TABLE user_options ADD COLUMN IF NOT EXISTS reminder_time TIME`);
@@ -345,10 +604,21 @@ async function getUserDesiredRetention(userId) {
     }
 }
 
+async function getUserFsrsWeights(userId) {
+    try {
+        const r = await pool.query('SELECT weights FROM user_fsrs_weights WHERE user_id = $1', [userId]);
+        const w = (r.rows[0]?.weights || []).map(Number);
+        return (w.length === 21 && w.every(Number.isFinite)) ? w : null;
+    } catch {
+        return null;
+    }
+}
+
 async function scheduleWithFsrsOrFallback({ userId, itemId, skillCode, ratingLabel, now }) {
     // Attempt to use ts-fsrs to compute new stability/difficulty and due date.
     // If unavailable or any error occurs, fall back to the simple rating-based scheduler.
     const desiredRetention = await getUserDesiredRetention(userId);
+    const fsrsWeights = await getUserFsrsWeights(userId);
     const client = await pool.connect();
     try {
         // Load history
@@ -383,7 +653,7 @@ async function scheduleWithFsrsOrFallback({ userId, itemId, skillCode, ratingLab
             throw new Error('FSRS API mismatch');
         }
 
-        const params = generatorParameters({ desiredRetention });
+        const params = generatorParameters({ desiredRetention, ...(fsrsWeights ? { w: fsrsWeights } : {}) });
         const scheduler = typeof schedulerFactory === 'function' ? schedulerFactory(params) : new schedulerFactory(params);
 
         // Reconstruct state by replaying history
@@ -1018,11 +1288,12 @@ app.post('/api/items/:itemId/skills/:skillCode/undo', authenticateToken, async (
         if (fsrsLib && hist.rows.length > 0) {
             // Replay with FSRS
             const desiredRetention = await getUserDesiredRetention(userId);
+            const fsrsWeights = await getUserFsrsWeights(userId);
             const generatorParameters = fsrsLib.generatorParameters || fsrsLib.GeneratorParameters || null;
             const schedulerFactory = fsrsLib.scheduler || fsrsLib.FSRS || null;
             const createEmptyCard = fsrsLib.createEmptyCard || fsrsLib.EmptyCard || null;
             if (generatorParameters && schedulerFactory && createEmptyCard) {
-                const params = generatorParameters({ desiredRetention });
+                const params = generatorParameters({ desiredRetention, ...(fsrsWeights ? { w: fsrsWeights } : {}) });
                 const scheduler = typeof schedulerFactory === 'function' ? schedulerFactory(params) : new schedulerFactory(params);
                 const RatingEnum = fsrsLib.Rating || fsrsLib.RATINGS || null;
                 const toRating = (lab) => {
@@ -1487,6 +1758,8 @@ app.get('/api/discoverable-items', authenticateToken, async (req, res) => {
                     WHEN 'word'      = ANY(i.kinds) THEN 3
                     ELSE 4
                 END, 
+                -- Custom items (hsk_level 0) slot in at their estimated level
+                COALESCE(NULLIF(i.hsk_level, 0), i.estimated_hsk_level, 99),
                 i.id;
         `, [userId]);
         res.json(result.rows);
@@ -1693,14 +1966,60 @@ app.get('/api/search-items', authenticateToken, async (req, res) => {
     }
 
     const query = q.trim();
-    // Simple fuzzy search on value, pinyin, or english
-    // We limit to 20 results
-    try {
-        const result = await pool.query(`
-            SELECT i.id, i.value, i.pinyin, i.english_definition, i.hsk_level,
+    const columns = `i.id, i.value, i.pinyin, i.english_definition, i.hsk_level,
                    i.components, i.radicals_contained, i.kinds, i.stroke_count, i.display_pinyin,
                    CASE WHEN uip.status = 'DISCOVERED' THEN true ELSE false END as is_discovered,
-                   uip.status as discovery_status
+                   uip.status as discovery_status`;
+
+    // Ranked values come from the search worker (k-gram index, tone-insensitive
+    // pinyin, typo correction); Postgres only fetches those rows by value.
+    let ranked = null;
+    try {
+        const { results } = await searchWorker.call({ q: query, limit: 50 });
+        ranked = results.map((r) => r.value);
+    } catch (err) {
+        console.error('Search worker unavailable, falling back to SQL scan:', err.message);
+    }
+
+    try {
+        if (ranked) {
+            // Custom words (hsk_level 0) aren't in the worker's index, which is
+            // built from the HSK list; match them here and merge: exact custom
+            // hits first, then the worker's ranking, then the other custom hits.
+            const custom = await pool.query(`
+            SELECT ${columns}
+            FROM items i
+            LEFT JOIN user_item_progress uip ON i.id = uip.item_id AND uip.user_id = $1
+            WHERE i.hsk_level = 0
+              AND (i.value ILIKE '%' || $2 || '%'
+                   OR i.pinyin ILIKE '%' || $2 || '%'
+                   OR i.english_definition ILIKE '%' || $2 || '%')
+            ORDER BY CASE WHEN i.value = $2 OR i.pinyin ILIKE $2 THEN 0 ELSE 1 END, LENGTH(i.value), i.id
+            LIMIT 50
+            `, [userId, query]);
+            const indexed = ranked.length === 0 ? [] : (await pool.query(`
+            SELECT ${columns}
+            FROM unnest($2::text[]) WITH ORDINALITY AS s(value, rank)
+            JOIN items i ON i.value = s.value
+            LEFT JOIN user_item_progress uip ON i.id = uip.item_id AND uip.user_id = $1
+            ORDER BY s.rank, i.id
+            `, [userId, ranked])).rows;
+            const lowered = query.toLowerCase();
+            const isExact = (r) => r.value === query || (r.pinyin || '').toLowerCase() === lowered;
+            const seen = new Set();
+            const merged = [];
+            for (const row of [...custom.rows.filter(isExact), ...indexed, ...custom.rows]) {
+                if (seen.has(row.id)) continue;
+                seen.add(row.id);
+                merged.push(row);
+            }
+            return res.json(merged.slice(0, 50));
+        }
+
+        // Fallback: simple fuzzy search on value, pinyin, or english
+        // We limit to 50 results
+        const result = await pool.query(`
+            SELECT ${columns}
             FROM items i
             LEFT JOIN user_item_progress uip ON i.id = uip.item_id AND uip.user_id = $1
             WHERE i.value ILIKE '%' || $2 || '%'
@@ -1741,6 +2060,23 @@ app.get('/api/search-items', authenticateToken, async (req, res) => {
 // Examples System
 // ------------------------------
 
+// HSK breakdown of arbitrary text ({ text } or { texts: [...] }): coverage per
+// level, characters outside the HSK list, and each word's position and level
+app.post('/api/text/analyze', authenticateToken, async (req, res) => {
+    const { text, texts } = req.body;
+    const batch = Array.isArray(texts);
+    if (batch ? !texts.every((t) => typeof t === 'string') : typeof text !== 'string') {
+        return res.status(400).json({ message: 'text (string) or texts (array of strings) is required' });
+    }
+    try {
+        const out = await analyzerWorker.call(batch ? { texts } : { text });
+        res.json(batch ? out.results : out.report);
+    } catch (err) {
+        console.error('Text analysis failed:', err.message);
+        res.status(503).json({ message: 'Text analyzer unavailable' });
+    }
+});
+
 // Get examples for an item
 app.get('/api/items/:itemId/examples', authenticateToken, async (req, res) => {
     const userId = req.user.id;
@@ -1757,7 +2093,8 @@ app.get('/api/items/:itemId/examples', authenticateToken, async (req, res) => {
             WHERE e.user_id = $1 AND e.item_id = $2
             ORDER BY e.created_at DESC
         `, [userId, itemId]);
-        res.json(result.rows);
+        const analyses = await analyzeTexts(result.rows.map((r) => r.sentence || ''));
+        res.json(result.rows.map((r, i) => ({ ...r, analysis: analyses ? analyses[i] : null })));
     } catch (err) {
         console.error('Error fetching examples:', err);
         res.status(500).json({ message: 'Server Error fetching examples' });
@@ -1867,10 +2204,13 @@ app.post('/api/items/:itemId/examples/generate', authenticateToken, async (req,
             };
         }
 
+        const [analysis] = (await analyzeTexts([saved.sentence || ''])) || [null];
+
         res.json({
             ...saved,
             new_word_value: result.new_word,
-            new_word_status: newWordDetails ? newWordDetails.status : null
+            new_word_status: newWordDetails ? newWordDetails.status : null,
+            analysis
         });
 
     } catch (err) {
@@ -2000,20 +2340,8 @@ app.post('/api/items/custom', authenticateToken, async (req, res) => {
 
             let pinyinStr = '';
             try {
-                // Call python script
-                // Escape the value to prevent command injection (basic)
-                const safeValue = value.replace(/"/g, '\\"');
-                const scriptPath = path.join(__dirname, 'pinyin_util.py');
-                const { stdout, stderr } = await execPromise(`python "${scriptPath}" "${safeValue}"`);
-                
-                if (stderr) {
-                    console.error('Python stderr:', stderr);
-                }
-                
-                const pyResult = JSON.parse(stdout);
-                if (pyResult.error) {
-                    throw new Error(pyResult.error);
-                }
+                // Ask the persistent python worker (no shell, so no escaping needed)
+                const pyResult = await generatePinyin(value);
                 pinyinStr = pyResult.pinyin;
                 
             } catch (pyErr) {
@@ -2022,12 +2350,15 @@ app.post('/api/items/custom', authenticateToken, async (req, res) => {
                 return res.status(500).json({ message: 'Failed to generate pinyin' });
             }
 
+            const estimatedLevel = await estimateHskLevel(value);
+            const traditional = await toTraditional(value);
+
             // Insert Item
             const insertRes = await client.query(`
-                INSERT INTO items (value, type, kinds, pinyin, display_pinyin, english_definition, components, constituent_items, stroke_count, hsk_level)
-                VALUES ($1, 'word', $2, $3, $3, $4, $5, $5, $6, 0)
+                INSERT INTO items (value, type, kinds, pinyin, display_pinyin, english_definition, components, constituent_items, stroke_count, hsk_level, estimated_hsk_level, traditional)
+                VALUES ($1, 'word', $2, $3, $3, $4, $5, $5, $6, 0, $7, $8)
                 RETURNING id
-            `, [value, ['word'], pinyinStr, english_definition, chars, totalStrokes || null]);
+            `, [value, ['word'], pinyinStr, english_definition, chars, totalStrokes || null, estimatedLevel, traditional]);
             
             itemId = insertRes.rows[0].id;
             itemKinds = ['word'];
@@ -2086,6 +2417,8 @@ app.put('/api/items/:itemId', authenticateToken, async (req, res) => {
         let pinyinStr = currentItem.pinyin;
         let totalStrokes = currentItem.stroke_count;
         let chars = currentItem.constituent_items;
+        let traditional = currentItem.traditional;
+        let estimatedLevel = currentItem.estimated_hsk_level;
 
         if (value !== currentItem.value) {
              // Check if new value already exists (conflict)
@@ -2096,13 +2429,10 @@ app.put('/api/items/:itemId', authenticateToken, async (req, res) => {
              }
 
              // Regenerate Pinyin
-             const safeValue = value.replace(/"/g, '\\"');
-             const scriptPath = path.join(__dirname, 'pinyin_util.py');
-             const { stdout, stderr } = await execPromise(`python "${scriptPath}" "${safeValue}"`);
-             if (stderr) console.error('Python stderr:', stderr);
-             const pyResult = JSON.parse(stdout);
-             if (pyResult.error) throw new Error(pyResult.error);
+             const pyResult = await generatePinyin(value);
              pinyinStr = pyResult.pinyin;
+             traditional = await toTraditional(value);
+             estimatedLevel = null;
 
              // Recalculate strokes
              chars = Array.from(value);
@@ -2115,12 +2445,19 @@ app.put('/api/items/:itemId', authenticateToken, async (req, res) => {
             }
         }
 
+        // A changed word is re-estimated; custom items saved while the estimator was
+        // unavailable (or its model unusable) pick one up on their next edit
+        if (estimatedLevel === null && currentItem.hsk_level === 0) {
+            estimatedLevel = await estimateHskLevel(value);
+        }
+
         await client.query(`
             UPDATE items 
             SET value = $1, english_definition = $2, pinyin = $3, display_pinyin = $3, 
-                constituent_items = $4, components = $4, stroke_count = $5
-            WHERE id = $6
-        `, [value, english_definition, pinyinStr, chars, totalStrokes || null, itemId]);
+                constituent_items = $4, components = $4, stroke_count = $5, traditional = $6,
+                estimated_hsk_level = $7
+            WHERE id = $8
+        `, [value, english_definition, pinyinStr, chars, totalStrokes || null, traditional, estimatedLevel, itemId]);
 
         await client.query('COMMIT');
         
@@ -2194,4 +2531,9 @@ app.listen(port, async () => {
     console.log(`Server running on port ${port}`);
     await initFsrs();
     await ensureSkillsSchema();
+    pinyinWorker.start();
+    searchWorker.start();
+    estimatorWorker.start();
+    scriptWorker.start();
+    analyzerWorker.start();
 });
\ No newline at end of file
@@ -1,164 +1,240 @@
-import csv, re, sys, pathlib
+# etl/01_unihan_to_csv.py
+# Streaming Unihan ingester: one tokenizer over every Unihan_*.txt file and a
+# field -> handler registry. Readings and variants are written as they are
+# parsed; only the small per-code-point radical/stroke ints are held until the
+# end (characters.csv has to be sorted and merged from two fields).
+#
+# With --workers N each file is parsed in its own process into partial
+# tables that are merged back in file order, so the output is byte-identical
+# to the serial run.
+import argparse, csv, os, pathlib, shutil, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+
+from manifest import Stage
+from metrics import Metrics
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 UNI = ROOT / "data" / "10_unihan"
 OUT = ROOT / "data" / "processed"
-OUT.mkdir(parents=True, exist_ok=True)
+STAGE_VERSION = 4
 
-# Input files (from your progress listing)
-f_irg   = UNI / "extracted" / "Unihan_IRGSources.txt"
-f_read  = UNI / "extracted" / "Unihan_Readings.txt"
-f_vars  = UNI / "extracted" / "Unihan_Variants.txt"
+CHAR_FIELDS = ["hanzi","trad","radical_no","stroke_count","hsk_char_level","hsk_write_lvl","freq_rank"]
+READING_FIELDS = ["entity_kind","key","script","pinyin","zhuyin","is_canonical"]
+VARIANT_FIELDS = ["hanzi","other_hanzi","relation"]
 
-# Fallback if 'extracted' not present (you copied the .txt files too)
-if not f_irg.exists():  f_irg  = UNI / "Unihan_IRGSources.txt"
-if not f_read.exists(): f_read = UNI / "Unihan_Readings.txt"
-if not f_vars.exists(): f_vars = UNI / "Unihan_Variants.txt"
+def unihan_files():
+    # Prefer the 'extracted' folder, fall back to the copies next to it
+    src = UNI / "extracted"
+    if not any(src.glob("Unihan_*.txt")):
+        src = UNI
+    return sorted(src.glob("Unihan_*.txt"))
 
-hex_re = re.compile(r"^U\+([0-9A-F]{4,6})$")
-def cp_to_char(cp_hex):
+def cp_to_char(cp):
+    # "U+4E00" -> "一"; None for anything malformed
     try:
-        return chr(int(cp_hex, 16))
-    except:
+        return chr(int(cp[2:], 16))
+    except ValueError:
         return None
 
-# --- Parse IRGSources for kRSUnicode (radical.residual) and kTotalStrokes ---
-radical_no = {}
-stroke_count = {}
-
-with f_irg.open("r", encoding="utf-8") as f:
-    for line in f:
-        if not line or line.startswith("#"): continue
-        parts = line.strip().split("\t")
-        if len(parts) < 3: continue
-        cp, field, value = parts[0], parts[1], parts[2]
-        m = hex_re.match(cp)
-        if not m: continue
-        ch = cp_to_char(m.group(1))
-        if not ch: continue
-        if field == "kRSUnicode":
-            # value like "1.4" or multiple separated by ' ' -> take first
-            first = value.split()[0]
-            if "." in first:
-                rad = first.split(".")[0]
-                try: radical_no[ch] = int(rad)
-                except: pass
-        elif field == "kTotalStrokes":
-            try:
-                stroke_count[ch] = int(value)
-            except:
-                pass
-
-# --- Readings: kMandarin, kCantonese, kJapaneseOn, kJapaneseKun, kKorean, kHanyuPinyin (extract pinyin after ':') ---
-readings = []  # list of dicts rows
-def add_reading(ch, script, pinyin, is_canonical=False, zhuyin=None):
-    readings.append({
-        "entity_kind": "character",
-        "key": ch,
-        "script": script,
-        "pinyin": pinyin,
-        "zhuyin": zhuyin or "",
-        "is_canonical": "true" if is_canonical else "false"
-    })
-
-with f_read.open("r", encoding="utf-8") as f:
-    last_script_seen = {}
-    for line in f:
-        if not line or line.startswith("#"): continue
-        parts = line.strip().split("\t")
-        if len(parts) < 3: continue
-        cp, field, value = parts[0], parts[1], parts[2]
-        m = hex_re.match(cp)
-        if not m: continue
-        ch = cp_to_char(m.group(1))
-        if not ch: continue
-
-        if field == "kMandarin":
-            # Space-separated pinyins; first is canonical
-            vals = value.split()
-            if vals:
-                add_reading(ch, "mandarin", vals[0], is_canonical=True)
-                for v in vals[1:]:
-                    add_reading(ch, "mandarin", v, is_canonical=False)
-        elif field == "kCantonese":
-            # Jyutping-like entries separated by spaces
-            for v in value.split():
-                add_reading(ch, "cantonese", v)
-        elif field == "kJapaneseOn":
-            for v in value.split():
-                add_reading(ch, "japanese_on", v)
-        elif field == "kJapaneseKun":
-            for v in value.split():
-                add_reading(ch, "japanese_kun", v)
-        elif field == "kKorean":
-            for v in value.split():
-                add_reading(ch, "korean", v)
-        elif field == "kHanyuPinyin":
-            # Format like "10019.020:tiàn 10019.030:..." → pull the pinyin after ':'
-            items = value.split()
-            for it in items:
-                if ":" in it:
-                    p = it.split(":")[1]
-                    add_reading(ch, "mandarin", p)
-
-# --- Variants: simplified/traditional/semantic/z-variant/spoofing ---
-variants = []  # rows: hanzi, other_hanzi, relation
-def add_variant(a, b, rel):
-    variants.append({"hanzi": a, "other_hanzi": b, "relation": rel})
-
-def parse_variant_targets(s):
-    # values like "U+4E18" or multiple separated by spaces; sometimes suffixed with "<kMatthews"
-    out = []
-    for tok in s.split():
-        tok = tok.split("<")[0]
-        m = hex_re.match(tok)
-        if m:
-            ch = cp_to_char(m.group(1))
-            if ch: out.append(ch)
-    return out
-
-with f_vars.open("r", encoding="utf-8") as f:
-    for line in f:
-        if not line or line.startswith("#"): continue
-        parts = line.strip().split("\t")
-        if len(parts) < 3: continue
-        cp, field, value = parts[0], parts[1], parts[2]
-        m = hex_re.match(cp)
-        if not m: continue
-        a = cp_to_char(m.group(1))
-        if not a: continue
-
-        rel_map = {
-            "kSimplifiedVariant": "simplified",
-            "kTraditionalVariant": "traditional",
-            "kSemanticVariant": "semantic",
-            "kZVariant": "z-variant",
-            "kSpoofingVariant": "spoofing"
-        }
-        rel = rel_map.get(field)
-        if not rel: continue
-        for b in parse_variant_targets(value):
-            add_variant(a, b, rel)
-
-# --- Write outputs ---
-# characters.csv: hanzi,trad,radical_no,stroke_count
-chars = sorted(set(list(radical_no.keys()) + list(stroke_count.keys())))
-with (OUT / "characters.csv").open("w", newline="", encoding="utf-8") as w:
-    cw = csv.writer(w)
-    cw.writerow(["hanzi","trad","radical_no","stroke_count","hsk_char_level","hsk_write_lvl","freq_rank"])
-    for ch in chars:
-        cw.writerow([ch,"", radical_no.get(ch,""), stroke_count.get(ch,""), "", "", ""])
-
-with (OUT / "readings.csv").open("w", newline="", encoding="utf-8") as w:
-    cw = csv.DictWriter(w, fieldnames=["entity_kind","key","script","pinyin","zhuyin","is_canonical"])
-    cw.writeheader()
-    for r in readings:
-        cw.writerow(r)
-
-with (OUT / "character_variants.csv").open("w", newline="", encoding="utf-8") as w:
-    cw = csv.DictWriter(w, fieldnames=["hanzi","other_hanzi","relation"])
-    cw.writeheader()
-    for v in variants:
-        cw.writerow(v)
-
-print("Wrote:", OUT / "characters.csv", OUT / "readings.csv", OUT / "character_variants.csv")
+class Outputs:
+    """
+    Sinks the handlers write into. Readings/variants go straight to a csv
+    writer; radical and stroke numbers are kept per character for the final
+    characters.csv.
+    """
+    def __init__(self, readings_writer, variants_writer):
+        self.readings = readings_writer
+        self.variants = variants_writer
+        self.radical_no = {}
+        self.stroke_count = {}
+        self.rows = 0
+
+    def reading(self, ch, script, value, is_canonical=False):
+        self.readings.writerow(["character", ch, script, value, "", "true" if is_canonical else "false"])
+        self.rows += 1
+
+    def variant(self, a, b, rel):
+        self.variants.writerow([a, b, rel])
+        self.rows += 1
+
+# --- Field handlers: (out, ch, value) ---
+
+def h_rs_unicode(out, ch, value):
+    # value like "1.4" or multiple separated by ' ' -> take first
+    rad = value.split(" ", 1)[0].split(".", 1)[0].rstrip("'")
+    if rad.isdigit():
+        out.radical_no[ch] = int(rad)
+
+def h_total_strokes(out, ch, value):
+    first = value.split(" ", 1)[0]
+    if first.isdigit():
+        out.stroke_count[ch] = int(first)
+
+def h_mandarin(out, ch, value):
+    # Space-separated pinyins; first is canonical
+    for i, v in enumerate(value.split()):
+        out.reading(ch, "mandarin", v, is_canonical=(i == 0))
+
+def h_hanyu_pinyin(out, ch, value):
+    # Format like "10019.020:tiàn,tiān 10019.030:yī" -> each pinyin after ':'
+    for it in value.split():
+        if ":" in it:
+            for v in it.split(":", 1)[1].split(","):
+                out.reading(ch, "mandarin", v)
+
+def reading_handler(script):
+    def handle(out, ch, value):
+        for v in value.split():
+            out.reading(ch, script, v)
+    return handle
+
+def variant_handler(rel):
+    def handle(out, ch, value):
+        # values like "U+4E18" or several separated by spaces; sometimes suffixed with "<kMatthews"
+        for tok in value.split():
+            b = cp_to_char(tok.split("<", 1)[0])
+            if b:
+                out.variant(ch, b, rel)
+    return handle
+
+HANDLERS = {
+    "kRSUnicode": h_rs_unicode,
+    "kTotalStrokes": h_total_strokes,
+    "kMandarin": h_mandarin,
+    "kHanyuPinyin": h_hanyu_pinyin,
+    "kCantonese": reading_handler("cantonese"),
+    "kJapaneseOn": reading_handler("japanese_on"),
+    "kJapaneseKun": reading_handler("japanese_kun"),
+    "kKorean": reading_handler("korean"),
+    "kSimplifiedVariant": variant_handler("simplified"),
+    "kTraditionalVariant": variant_handler("traditional"),
+    "kSemanticVariant": variant_handler("semantic"),
+    "kZVariant": variant_handler("z-variant"),
+    "kSpoofingVariant": variant_handler("spoofing"),
+}
+
+def ingest_file(path, out, handlers=HANDLERS):
+    """Stream one Unihan file through the handler table. Returns lines read."""
+    lines = 0
+    last_cp, last_ch = None, None
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            lines += 1
+            if line[0] != "U":  # comments / blank lines
+                continue
+            parts = line.rstrip("\n").split("\t", 2)
+            if len(parts) < 3:
+                continue
+            cp, field, value = parts
+            handler = handlers.get(field)
+            if handler is None:
+                continue
+            # Unihan is grouped by code point, so consecutive lines usually share it
+            if cp != last_cp:
+                last_cp, last_ch = cp, cp_to_char(cp)
+            if last_ch:
+                handler(out, last_ch, value)
+    return lines
+
+def write_characters(path, radical_no, stroke_count):
+    # characters.csv: hanzi,trad,radical_no,stroke_count (+ empty HSK/freq columns)
+    chars = sorted(radical_no.keys() | stroke_count.keys())
+    with path.open("w", newline="", encoding="utf-8") as w:
+        cw = csv.writer(w, lineterminator="\n")
+        cw.writerow(CHAR_FIELDS)
+        for ch in chars:
+            cw.writerow([ch, "", radical_no.get(ch, ""), stroke_count.get(ch, ""), "", "", ""])
+
+def ingest_to_parts(path, part_dir):
+    """
+    Worker entry point: parse one file into headerless partial CSVs under
+    part_dir and return the per-character ints plus counters.
+    """
+    stem = pathlib.Path(part_dir) / path.stem
+    r_path, v_path = stem.with_suffix(".readings.csv"), stem.with_suffix(".variants.csv")
+    with r_path.open("w", newline="", encoding="utf-8") as rf, \
+         v_path.open("w", newline="", encoding="utf-8") as vf:
+        out = Outputs(csv.writer(rf, lineterminator="\n"), csv.writer(vf, lineterminator="\n"))
+        lines = ingest_file(path, out)
+    return {
+        "readings": r_path, "variants": v_path,
+        "radical_no": out.radical_no, "stroke_count": out.stroke_count,
+        "lines": lines, "rows": out.rows,
+    }
+
+def run_serial(files, rf, vf):
+    out = Outputs(csv.writer(rf, lineterminator="\n"), csv.writer(vf, lineterminator="\n"))
+    lines = sum(ingest_file(path, out) for path in files)
+    return out.radical_no, out.stroke_count, lines, out.rows
+
+def run_parallel(files, rf, vf, workers):
+    radical_no, stroke_count = {}, {}
+    lines = rows = 0
+    with tempfile.TemporaryDirectory(dir=OUT) as part_dir, \
+         ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(ingest_to_parts, path, part_dir) for path in files]
+        # Merge in file order (not completion order): same row order and the
+        # same last-file-wins rule for radical/stroke as the serial run.
+        for fut in futures:
+            part = fut.result()
+            for src, dst in ((part["readings"], rf), (part["variants"], vf)):
+                with src.open("r", newline="", encoding="utf-8") as f:
+                    shutil.copyfileobj(f, dst)
+            radical_no.update(part["radical_no"])
+            stroke_count.update(part["stroke_count"])
+            lines += part["lines"]
+            rows += part["rows"]
+    return radical_no, stroke_count, lines, rows
+
+def main():
+    ap = argparse.ArgumentParser(description="Unihan -> characters.csv, readings.csv, character_variants.csv")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="parse files in N processes (0 = one per CPU); output is identical to --workers 1")
+    ap.add_argument("--force", action="store_true", help="rebuild even if the manifest says nothing changed")
+    ap.add_argument("--profile", action="store_true", help="write cProfile stats to data/processed/.metrics/")
+    args = ap.parse_args()
+
+    files = unihan_files()
+    if not files:
+        print(f"ERROR: no Unihan_*.txt files under {UNI}")
+        sys.exit(1)
+    outputs = [OUT / "characters.csv", OUT / "readings.csv", OUT / "character_variants.csv"]
+    stage = Stage("01_unihan_to_csv", STAGE_VERSION, inputs=files, outputs=outputs)
+    if stage.skip(args.force):
+        return
+    metrics = Metrics(stage.name, files, outputs, args.profile)
+    OUT.mkdir(parents=True, exist_ok=True)
+    workers = min(args.workers or os.cpu_count() or 1, len(files))
+
+    t0 = time.perf_counter()
+    # Readings and variants are written as the files are parsed
+    with metrics.phase("parse"), \
+         (OUT / "readings.csv").open("w", newline="", encoding="utf-8") as rf, \
+         (OUT / "character_variants.csv").open("w", newline="", encoding="utf-8") as vf:
+        csv.writer(rf, lineterminator="\n").writerow(READING_FIELDS)
+        csv.writer(vf, lineterminator="\n").writerow(VARIANT_FIELDS)
+        rf.flush()
+        vf.flush()
+        if workers > 1:
+            radical_no, stroke_count, lines, rows = run_parallel(files, rf, vf, workers)
+        else:
+            radical_no, stroke_count, lines, rows = run_serial(files, rf, vf)
+
+    if radical_no or stroke_count:
+        with metrics.phase("write"):
+            write_characters(OUT / "characters.csv", radical_no, stroke_count)
+    else:
+        # kRSUnicode/kTotalStrokes live in Unihan_IRGSources.txt; don't clobber a good table without it
+        print("WARNING: no kRSUnicode/kTotalStrokes found; leaving characters.csv untouched")
+    elapsed = time.perf_counter() - t0
+
+    n_chars = len(radical_no.keys() | stroke_count.keys())
+    print(f"Parsed {len(files)} files with {workers} worker(s), {lines:,} lines in {elapsed:.2f}s "
+          f"= {lines / elapsed:,.0f} lines/sec, {(rows + n_chars) / elapsed:,.0f} rows/sec")
+    stage.record()
+    metrics.rows_in, metrics.rows_out = lines, rows + n_chars
+    metrics.write()
+    print("Wrote:", *outputs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# etl/01a_variant_classes.py
+# Compile variant classes + the simplified <-> traditional converter
+# (variants.py) and fill the trad column of characters.csv from it.
+import csv, os, pathlib, sys, time
+
+from cedict_index import CEDICT_GZ
+from manifest import Stage
+from metrics import Metrics
+from variants import VARIANTS_BIN, VARIANTS_CSV, Variants, compile_variants
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+CHARS_CSV = ROOT / "data" / "processed" / "characters.csv"
+STAGE_VERSION = 1
+
+def fill_trad(path, v):
+    """Rewrite characters.csv (atomically, row by row) with trad = the character's traditional form."""
+    to_trad = v.converter("trad")
+    n = changed = 0
+    tmp = path.with_suffix(".tmp")
+    with path.open("r", encoding="utf-8-sig", newline="") as f, \
+            tmp.open("w", encoding="utf-8", newline="") as w:
+        reader = csv.DictReader(f)
+        writer = csv.DictWriter(w, fieldnames=reader.fieldnames, lineterminator="\n")
+        writer.writeheader()
+        for row in reader:
+            ch = row["hanzi"]
+            trad = to_trad(ch) if len(ch) == 1 else row["trad"]
+            if trad != row["trad"]:
+                row["trad"] = trad
+                changed += 1
+            writer.writerow(row)
+            n += 1
+    os.replace(tmp, path)
+    return n, changed
+
+def main():
+    for p in (VARIANTS_CSV, CEDICT_GZ, CHARS_CSV):
+        if not p.exists():
+            print(f"Error: {p} not found.")
+            sys.exit(1)
+    stage = Stage("01a_variant_classes", STAGE_VERSION, inputs=[VARIANTS_CSV, CEDICT_GZ, CHARS_CSV],
+                  outputs=[VARIANTS_BIN, CHARS_CSV])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    with metrics.phase("compile"):
+        counts = compile_variants(VARIANTS_CSV, CEDICT_GZ, VARIANTS_BIN)
+    t0 = time.perf_counter()
+    with metrics.phase("fill_trad"), Variants(VARIANTS_BIN) as v:
+        load_ms = (time.perf_counter() - t0) * 1000
+        n, changed = fill_trad(CHARS_CSV, v)
+    stage.record()
+
+    print(f"{counts['class_chars']} characters in {counts['classes']} variant classes; "
+          f"{counts['s2t_chars']}/{counts['t2s_chars']} s2t/t2s characters, "
+          f"{counts['s2t_phrases']}/{counts['t2s_phrases']} phrases; {VARIANTS_BIN.stat().st_size:,} bytes, "
+          f"open in {load_ms:.2f} ms")
+    print(f"Filled trad for {n} characters ({changed} changed)")
+    metrics.rows_in, metrics.rows_out = counts["edges"], n
+    metrics.write()
+    print(f"Wrote: {VARIANTS_BIN} {CHARS_CSV}")
+
+if __name__ == "__main__":
+    main()
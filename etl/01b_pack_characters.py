@@ -0,0 +1,51 @@
+# etl/01b_pack_characters.py
+# Pack characters.csv into the mmap-able binary table read by char_table.CharTable.
+import csv, pathlib, sys, time
+
+from char_table import COLUMNS, CharTable, write_table
+from manifest import Stage
+from metrics import Metrics
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+IN = ROOT / "data" / "processed" / "characters.csv"
+OUT = ROOT / "data" / "processed" / "characters.bin"
+STAGE_VERSION = 1
+
+def to_int(s):
+    # Empty -> 0 (missing); HSK "7-9" -> 7
+    s = (s or "").strip().split("-")[0]
+    return int(s) if s.isdigit() else 0
+
+def main():
+    if not IN.exists():
+        print(f"Error: {IN} not found.")
+        sys.exit(1)
+    stage = Stage("01b_pack_characters", STAGE_VERSION, inputs=[IN], outputs=[OUT])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    rows = {}
+    with metrics.phase("parse"), IN.open("r", encoding="utf-8-sig", newline="") as f:
+        for rec in csv.DictReader(f):
+            metrics.rows_in += 1
+            ch = rec["hanzi"]
+            if len(ch) == 1:
+                rows[ch] = tuple(to_int(rec.get(name)) for name, _ in COLUMNS)
+
+    with metrics.phase("write"):
+        write_table(OUT, rows)
+    stage.record()
+
+    t0 = time.perf_counter()
+    with metrics.phase("verify"), CharTable(OUT) as t:
+        load_ms = (time.perf_counter() - t0) * 1000
+        packed = sum(1 for ch in rows if t.lookup(ch) or not any(rows[ch]))
+    metrics.rows_out = len(rows)
+    metrics.write()
+    print(f"Packed {packed}/{len(rows)} characters, {OUT.stat().st_size:,} bytes "
+          f"(csv {IN.stat().st_size:,}), open in {load_ms:.2f} ms")
+    print(f"Wrote: {OUT}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,34 @@
 # etl/02_ccd_to_csv.py
-import csv, pathlib, re, sys
+# CCD (Chinese Characters Decomposition) -> character_parts.csv (one row per
+# left/right component) and character_shapes.csv (strokes, composition type
+# and stroke signature per character, for shape_index.py).
+#
+# ccd_clean.tsv and the raw wiki dump share one parser: the header line gives
+# the column positions, and after that any line with the full set of tab
+# separated fields and a CJK first field is a data row. That holds inside the
+# raw file's <pre> blocks and is false for the wiki text around them, so the
+# file can be cut into byte ranges at line boundaries and parsed with
+# --workers N; ranges are merged in file order, so the output is identical
+# to --workers 1.
+import argparse, csv, os, pathlib, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from manifest import Stage
+from metrics import Metrics
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 RAW  = ROOT / "data" / "20_decomposition" / "ChineseCharactersDecomposition.tsv"
 CLEAN= ROOT / "data" / "20_decomposition" / "ccd_clean.tsv"  # <-- use this if it exists
-SRC  = CLEAN if CLEAN.exists() else RAW
-
 OUT  = ROOT / "data" / "processed"
-OUT.mkdir(parents=True, exist_ok=True)
+PARTS_CSV = OUT / "character_parts.csv"
+SHAPES_CSV = OUT / "character_shapes.csv"
+STAGE_VERSION = 2
+CHUNK_BYTES = 1 << 20  # rows are written range by range, so memory stays flat as the file grows
 
-NEEDED = ["Component","LeftComponent","RightComponent"]
+NEEDED = ["Component","Strokes","CompositionType","LeftComponent","RightComponent","Signature"]
+PART_FIELDS = ["hanzi","part_symbol","relation","position"]
+SHAPE_FIELDS = ["hanzi","strokes","composition_type","signature"]
 
 def looks_cjk(ch: str) -> bool:
     return len(ch) == 1 and (
@@ -17,113 +36,128 @@ def looks_cjk(ch: str) -> bool:
         0xF900 <= ord(ch) <= 0xFAFF
     )
 
-rows = []
-
-# If we're reading the cleaned file, treat it as a true TSV with a real header
-if SRC == CLEAN:
-    with SRC.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f, delimiter="\t")
-        if not reader.fieldnames:
-            print("ERROR: no header found in ccd_clean.tsv")
-            sys.exit(1)
-
-        # Some editors write a BOM on the first fieldname; strip it
-        reader.fieldnames = [fn.lstrip("\ufeff") for fn in reader.fieldnames]
-
-        missing = [c for c in NEEDED if c not in reader.fieldnames]
-        if missing:
-            print("ERROR: missing expected columns:", missing)
-            print("Found headers:", reader.fieldnames)
-            sys.exit(1)
-
-        for rec in reader:
-            ch = (rec.get("Component") or "").strip()
-            if not looks_cjk(ch):
-                continue
-
-            comps = []
-            for col in ("LeftComponent","RightComponent"):
-                cell = (rec.get(col) or "").strip("[](){}<>").strip()
-                if not cell or cell in ("*", "-"):
-                    continue
-                for tok in re.split(r"\s+", cell):
-                    tok = tok.strip("[](){}<>")
-                    if looks_cjk(tok) and tok != ch:
-                        comps.append(tok)
-
-            for pos, part in enumerate(comps, start=1):
-                rows.append({
-                    "hanzi": ch,
-                    "part_symbol": part,
-                    "relation": "component",
-                    "position": pos
-                })
-
-# Otherwise, parse the raw wiki file: walk ALL <pre> blocks (first = header-only, second = data)
-else:
-    in_pre = False
-    have_header = False
-    col_index = {}
-    HEADER = ["Component","Strokes","CompositionType","LeftComponent","LeftStrokes",
-              "RightComponent","RightStrokes","Signature","Notes","Section"]
-
-    with SRC.open("r", encoding="utf-8", newline="") as f:
-        for raw in f:
-            line = raw.rstrip("\n")
-
-            if "<pre>" in line:
-                in_pre = True
-                have_header = False
-                col_index = {}
-                continue
-            if "</pre>" in line:
-                in_pre = False
-                continue
-            if not in_pre or not line.strip():
-                continue
-
-            if not have_header:
-                cols = [c.lstrip("\ufeff").strip() for c in line.split("\t")]
-                if cols[:len(HEADER)] == HEADER:
-                    col_index = {name: i for i, name in enumerate(cols)}
-                    have_header = True
-                continue
-
-            parts = line.split("\t")
-            if len(parts) < len(col_index):
-                continue
-
-            def get(name: str) -> str:
-                i = col_index.get(name, -1)
-                return parts[i].strip() if 0 <= i < len(parts) else ""
-
-            ch = get("Component")
-            if not looks_cjk(ch):
+def find_header(path):
+    """Column name -> index from the first line that carries the CCD column names."""
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for line in f:
+            cols = [c.lstrip("\ufeff").strip() for c in line.rstrip("\r\n").split("\t")]
+            if all(c in cols for c in NEEDED):
+                return {name: i for i, name in enumerate(cols)}
+    return None
+
+def byte_ranges(path, n):
+    """Split a file into about n (start, end) byte ranges that begin and end at line starts."""
+    size = path.stat().st_size
+    if n <= 1 or size == 0:
+        return [(0, size)]
+    bounds = [0]
+    with path.open("rb") as f:
+        for i in range(1, n):
+            f.seek(max(size * i // n, bounds[-1]))
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def parse_range(path, start, end, col_index):
+    """Parse one byte range -> (rows_in, part rows, shape rows), in file order."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    n_cols = len(col_index)
+    c, s, t, g = (col_index[k] for k in ("Component", "Strokes", "CompositionType", "Signature"))
+    sides = (col_index["LeftComponent"], col_index["RightComponent"])
+    rows_in = 0
+    parts, shapes = [], []
+    for line in text.split("\n"):
+        cells = line.rstrip("\r").split("\t")
+        if len(cells) < n_cols:
+            continue
+        ch = cells[c].lstrip("\ufeff").strip()
+        if ch == "Component":
+            continue  # the header itself
+        rows_in += 1
+        if not looks_cjk(ch):
+            continue
+
+        pos = 0
+        for i in sides:
+            cell = cells[i].strip("[](){}<>").strip()
+            if not cell or cell in ("*", "-"):
                 continue
-
-            comps = []
-            for col in ("LeftComponent","RightComponent"):
-                cell = get(col).strip("[](){}<>")
-                if not cell or cell in ("*", "-"):
-                    continue
-                for tok in re.split(r"\s+", cell):
-                    tok = tok.strip("[](){}<>")
-                    if looks_cjk(tok) and tok != ch:
-                        comps.append(tok)
-
-            for pos, part in enumerate(comps, start=1):
-                rows.append({
-                    "hanzi": ch,
-                    "part_symbol": part,
-                    "relation": "component",
-                    "position": pos
-                })
-
-out_path = OUT / "character_parts.csv"
-with out_path.open("w", encoding="utf-8", newline="") as w:
-    writer = csv.DictWriter(w, fieldnames=["hanzi","part_symbol","relation","position"])
-    writer.writeheader()
-    writer.writerows(rows)
-
-print(f"Source: {SRC}")
-print(f"Wrote: {out_path} rows: {len(rows)}")
+            for tok in cell.split():
+                tok = tok.strip("[](){}<>")
+                if looks_cjk(tok) and tok != ch:
+                    pos += 1
+                    parts.append((ch, tok, "component", pos))
+        shapes.append((ch, cells[s].strip(), cells[t].strip(), cells[g].strip()))
+    return rows_in, parts, shapes
+
+def parse_all(src, col_index, workers):
+    """Yield parse_range results for the whole file, in file order."""
+    n = max(workers * 4 if workers > 1 else 1, src.stat().st_size // CHUNK_BYTES)
+    ranges = byte_ranges(src, n)
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            starts, ends = zip(*ranges)
+            yield from pool.map(parse_range, repeat(src), starts, ends, repeat(col_index))
+    else:
+        for a, b in ranges:
+            yield parse_range(src, a, b, col_index)
+
+def main():
+    ap = argparse.ArgumentParser(description="CCD decomposition -> character_parts.csv, character_shapes.csv")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="parse in N processes (0 = one per CPU); output is identical to --workers 1")
+    ap.add_argument("--force", action="store_true", help="rebuild even if the manifest says nothing changed")
+    ap.add_argument("--profile", action="store_true", help="write cProfile stats to data/processed/.metrics/")
+    args = ap.parse_args()
+
+    src = CLEAN if CLEAN.exists() else RAW
+    if not src.exists():
+        print(f"ERROR: {src} not found.")
+        sys.exit(1)
+    stage = Stage("02_ccd_to_csv", STAGE_VERSION, inputs=[src], outputs=[PARTS_CSV, SHAPES_CSV])
+    if stage.skip(args.force):
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs, args.profile)
+    OUT.mkdir(parents=True, exist_ok=True)
+    col_index = find_header(src)
+    if col_index is None:
+        print(f"ERROR: no CCD header with columns {NEEDED} in {src}")
+        sys.exit(1)
+    workers = max(1, args.workers or os.cpu_count() or 1)
+
+    t0 = time.perf_counter()
+    n_parts = n_shapes = 0
+    parts_tmp, shapes_tmp = PARTS_CSV.with_suffix(".tmp"), SHAPES_CSV.with_suffix(".tmp")
+    with metrics.phase("parse"), \
+         parts_tmp.open("w", encoding="utf-8", newline="") as pf, \
+         shapes_tmp.open("w", encoding="utf-8", newline="") as sf:
+        parts_w, shapes_w = csv.writer(pf), csv.writer(sf)
+        parts_w.writerow(PART_FIELDS)
+        shapes_w.writerow(SHAPE_FIELDS)
+        for rows_in, parts, shapes in parse_all(src, col_index, workers):
+            metrics.rows_in += rows_in
+            parts_w.writerows(parts)
+            shapes_w.writerows(shapes)
+            n_parts += len(parts)
+            n_shapes += len(shapes)
+    os.replace(parts_tmp, PARTS_CSV)
+    os.replace(shapes_tmp, SHAPES_CSV)
+    elapsed = time.perf_counter() - t0
+
+    print(f"Source: {src}")
+    print(f"Parsed {metrics.rows_in:,} rows with {workers} worker(s) in {elapsed:.2f}s")
+    stage.record()
+    metrics.rows_out = n_parts + n_shapes
+    metrics.write()
+    print(f"Wrote: {PARTS_CSV} rows: {n_parts}")
+    print(f"Wrote: {SHAPES_CSV} rows: {n_shapes}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# etl/02b_component_bitmaps.py
+# Transitive closure of character_parts.csv as per-component bitmaps, queried
+# through component_query.ComponentIndex.
+import sys, time
+
+from component_query import BITMAPS, CHARS_CSV, PARTS_CSV, ComponentIndex, build_bitmaps, \
+    load_part_graph, load_stroke_counts, write_bitmaps
+from manifest import Stage
+from metrics import Metrics
+
+STAGE_VERSION = 1
+
+def main():
+    if not PARTS_CSV.exists():
+        print(f"Error: {PARTS_CSV} not found.")
+        sys.exit(1)
+    stage = Stage("02b_component_bitmaps", STAGE_VERSION, inputs=[PARTS_CSV, CHARS_CSV], outputs=[BITMAPS])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    t0 = time.perf_counter()
+    with metrics.phase("read"):
+        parts = load_part_graph()
+        strokes = load_stroke_counts() if CHARS_CSV.exists() else {}
+    with metrics.phase("transform"):
+        chars, stroke_list, bitmaps = build_bitmaps(parts, strokes)
+    with metrics.phase("write"):
+        write_bitmaps(BITMAPS, chars, stroke_list, bitmaps)
+    build_s = time.perf_counter() - t0
+    stage.record()
+
+    t0 = time.perf_counter()
+    with ComponentIndex(BITMAPS) as idx:
+        open_ms = (time.perf_counter() - t0) * 1000
+    members = sum(m.bit_count() for m in bitmaps.values())
+    metrics.rows_in = sum(len(v) for v in parts.values())
+    metrics.rows_out = len(bitmaps)
+    metrics.write()
+    print(f"{len(chars)} characters, {len(bitmaps)} components, {members:,} containment pairs; "
+          f"built in {build_s:.2f}s, {BITMAPS.stat().st_size:,} bytes, open in {open_ms:.2f} ms")
+    print(f"Wrote: {BITMAPS}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,28 @@
-import csv, pathlib, re
+import csv, pathlib, re, sys
+
+from manifest import Stage
+from metrics import Metrics
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
-HW_ROOT = ROOT / "data" / "30_strokes" / "hanzi_writer_data"
+HW_ROOTS = [
+    ROOT / "data" / "30_strokes" / "hanzi_writer_data",
+    ROOT / "backend" / "data" / "30_strokes" / "hanzi_writer_data",
+]
+HW_ROOT = next((p for p in HW_ROOTS if p.exists()), HW_ROOTS[0])
 DATA_DIR = HW_ROOT / "data"  # hanzi-writer-data/data/
 OUT = ROOT / "data" / "processed"
 OUT.mkdir(parents=True, exist_ok=True)
+out_path = OUT / "entity_assets.csv"
+
+STAGE_VERSION = 1
+if not HW_ROOT.exists():
+    print(f"Error: hanzi-writer data not found in {' or '.join(map(str, HW_ROOTS))}.")
+    sys.exit(1)
+stage = Stage("03_assets_hanziwriter", STAGE_VERSION,
+              inputs=[DATA_DIR if DATA_DIR.exists() else HW_ROOT], outputs=[out_path])
+if stage.skip():
+    sys.exit(0)
+metrics = Metrics(stage.name, stage.inputs, stage.outputs)
 
 HEX_RE = re.compile(r"^[0-9a-fA-F]{4,6}$")
 
@@ -45,6 +63,7 @@ if DATA_DIR.exists():
 else:
     # fallback: whole repo
     candidates = list(HW_ROOT.rglob("*.json"))
+metrics.mark("scan")
 
 for p in candidates:
     scanned += 1
@@ -75,11 +94,21 @@ for p in candidates:
         "license": "APL"
     })
 
-out_path = OUT / "entity_assets.csv"
+metrics.mark("transform")
+
+# Don't replace a good table with an empty one (and record that as done)
+if not rows:
+    print(f"Error: no character JSON files among {scanned} scanned under {HW_ROOT}.")
+    sys.exit(1)
+
 with out_path.open("w", encoding="utf-8", newline="") as w:
     writer = csv.DictWriter(w, fieldnames=["entity_kind","key","kind","url","source","license"])
     writer.writeheader()
     writer.writerows(rows)
+metrics.mark("write")
 
+stage.record()
+metrics.rows_in, metrics.rows_out = scanned, len(rows)
+metrics.write()
 print(f"Scanned JSON files: {scanned}")
 print(f"Wrote: {out_path} rows: {len(rows)}")
@@ -1,26 +1,50 @@
 # etl/03b_rewrite_asset_urls.py
-import csv, pathlib
+import csv, pathlib, sys
+
+from manifest import Stage
+from metrics import Metrics
 
 # Project root is one level up from the "etl" folder
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 IN   = ROOT / "data" / "processed" / "entity_assets.csv"
 OUT  = ROOT / "data" / "processed" / "entity_assets.csv"  # overwrite in place
 
+STAGE_VERSION = 1
+stage = Stage("03b_rewrite_asset_urls", STAGE_VERSION, inputs=[IN], outputs=[OUT])
+if stage.skip():
+    sys.exit(0)
+metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
 rows = []
 with IN.open("r", encoding="utf-8", newline="") as f:
     r = csv.DictReader(f)
     for rec in r:
         p = pathlib.Path(rec["url"])
         try:
-            rel = p.relative_to(ROOT).as_posix()   # relative to project root
+            # backend/ serves its data/ tree at /data, so strip that prefix too
+            rel = p.relative_to(ROOT / "backend").as_posix()
         except ValueError:
-            rel = p.as_posix().split("/HanziDex/")[-1]
+            try:
+                rel = p.relative_to(ROOT).as_posix()   # relative to project root
+            except ValueError:
+                # Already project-relative ("/data/...") rows pass through unchanged
+                rel = p.as_posix().split("/HanziDex/")[-1].lstrip("/")
         rec["url"] = "/" + rel                    # /data/30_strokes/hanzi_writer_data/data/一.json
         rows.append(rec)
 
+metrics.mark("transform")
+
+if not rows:
+    print(f"Error: {IN} has no rows; run etl/03_assets_hanziwriter.py first.")
+    sys.exit(1)
+
 with OUT.open("w", encoding="utf-8", newline="") as f:
     w = csv.DictWriter(f, fieldnames=r.fieldnames)
     w.writeheader()
     w.writerows(rows)
+metrics.mark("write")
 
+stage.record()
+metrics.rows_in = metrics.rows_out = len(rows)
+metrics.write()
 print("Rewrote URLs to project-relative paths.")
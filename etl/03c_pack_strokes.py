@@ -0,0 +1,102 @@
+# etl/03c_pack_strokes.py
+# Pack every hanzi-writer <char>.json into one indexed bundle (see stroke_bundle.py)
+# so deploys ship one file and lookups don't touch the filesystem per character.
+#   python etl/03c_pack_strokes.py            # data/processed/strokes.bin
+#   python etl/03c_pack_strokes.py --by-hsk   # + strokes.hsk<level>.bin for prefetching
+import argparse, csv, os, pathlib, re, sys, time
+
+from manifest import Stage
+from metrics import Metrics
+from stroke_bundle import StrokeBundle, write_bundle
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DATA_DIRS = [
+    ROOT / "data" / "30_strokes" / "hanzi_writer_data" / "data",
+    ROOT / "backend" / "data" / "30_strokes" / "hanzi_writer_data" / "data",
+]
+DATA_DIR = next((p for p in DATA_DIRS if p.exists()), DATA_DIRS[0])
+HSK_TSV = ROOT / "data" / "00_hsk" / "HSK_all_merged.tsv"
+OUT = ROOT / "data" / "processed"
+BUNDLE = OUT / "strokes.bin"
+STAGE_VERSION = 1
+
+HEX_RE = re.compile(r"^[0-9a-fA-F]{4,6}$")
+
+def char_for(stem):
+    # <char>.json, or the hex fallback (4e00.json)
+    if len(stem) == 1:
+        return stem
+    if HEX_RE.match(stem):
+        return chr(int(stem, 16))
+    return None
+
+def scan(data_dir):
+    for entry in os.scandir(data_dir):
+        name = entry.name
+        if not name.endswith(".json") or name.lower() == "all.json":
+            continue
+        ch = char_for(name[:-5])
+        if ch:
+            yield ch, entry.path
+
+def hsk_levels(tsv_path):
+    """char -> level label of the first HSK level whose words use it."""
+    order = {}
+    with tsv_path.open("r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            level = (row.get("Level") or "").strip()
+            rank = int(level.split("-")[0]) if level.split("-")[0].isdigit() else 99
+            for ch in row.get("Simplified", ""):
+                if ch != "|" and (ch not in order or rank < order[ch][0]):
+                    order[ch] = (rank, level)
+    return {ch: level for ch, (_, level) in order.items()}
+
+def main():
+    ap = argparse.ArgumentParser(description="Pack hanzi-writer stroke JSON into an indexed bundle")
+    ap.add_argument("--by-hsk", action="store_true", help="also write one sub-bundle per HSK level")
+    ap.add_argument("--force", action="store_true", help="rebuild even if the manifest says nothing changed")
+    ap.add_argument("--profile", action="store_true", help="write cProfile stats to data/processed/.metrics/")
+    args = ap.parse_args()
+
+    if not DATA_DIR.exists():
+        print(f"Error: hanzi-writer data not found in {' or '.join(map(str, DATA_DIRS))}.")
+        sys.exit(1)
+
+    levels = hsk_levels(HSK_TSV) if args.by_hsk else {}
+    sub_paths = {lvl: OUT / f"strokes.hsk{lvl}.bin" for lvl in sorted(set(levels.values())) if lvl}
+    inputs = [DATA_DIR] + ([HSK_TSV] if args.by_hsk else [])
+    stage = Stage("03c_pack_strokes", STAGE_VERSION, inputs=inputs, outputs=[BUNDLE, *sub_paths.values()])
+    if stage.skip(args.force):
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs, args.profile)
+
+    t0 = time.perf_counter()
+    records = []
+    with metrics.phase("read"):
+        for ch, path in scan(DATA_DIR):
+            with open(path, "rb") as f:
+                records.append((ch, f.read()))
+    raw_bytes = sum(len(r) for _, r in records)
+
+    OUT.mkdir(parents=True, exist_ok=True)
+    # write_bundle compresses as it writes, so this phase is mostly zlib
+    with metrics.phase("write"):
+        n = write_bundle(BUNDLE, records)
+        for lvl, path in sub_paths.items():
+            write_bundle(path, [(ch, raw) for ch, raw in records if levels.get(ch) == lvl])
+    stage.record()
+
+    with metrics.phase("verify"), StrokeBundle(BUNDLE) as b:
+        t1 = time.perf_counter()
+        for ch, _ in records:
+            b.get_raw(ch)
+        per_lookup_us = (time.perf_counter() - t1) / max(1, n) * 1e6
+
+    print(f"Packed {n} characters from {len(records)} files: {raw_bytes:,} -> {BUNDLE.stat().st_size:,} bytes "
+          f"in {time.perf_counter() - t0:.2f}s; {per_lookup_us:.1f} us/lookup")
+    metrics.rows_in, metrics.rows_out = len(records), n
+    metrics.write()
+    print(f"Wrote: {BUNDLE}" + "".join(f", {p.name}" for p in sub_paths.values()))
+
+if __name__ == "__main__":
+    main()
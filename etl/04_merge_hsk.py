@@ -1,63 +1,57 @@
 import csv
-import gzip
 import pathlib
-import re
+
+from cedict_index import CEDICT_DB, CEDICT_GZ, CedictIndex, compile_index
+from manifest import Stage
+from metrics import Metrics
 
 # Paths
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 HSK_CSV = ROOT / "_cleanup" / "hsk30.csv"
-CEDICT_GZ = ROOT / "_cleanup" / "cedict_1_0_ts_utf-8_mdbg.txt.gz"
 OUTPUT_TSV = ROOT / "data" / "00_hsk" / "HSK_all_merged.tsv"
+STAGE_VERSION = 2
 
-def load_cedict(path):
+def lookup_english(cedict, simp, trad, pinyin):
     """
-    Parses CEDICT and returns a dict: { Simplified: [definitions...] }
-    CEDICT format: Traditional Simplified [pinyin] /English/English/.../
+    English for one HSK row. Alternative forms ("爸爸|爸", "bàba|bà") are tried
+    pairwise and the first one CEDICT knows wins; parenthesised hints such as
+    "dì (dì-èr)" and "shéi/shuí" spellings are reduced to the main reading.
     """
-    cedict = {}
-    print(f"Loading CEDICT from {path}...")
-    with gzip.open(path, 'rt', encoding='utf-8') as f:
-        for line in f:
-            if line.startswith('#') or not line.strip():
-                continue
-            # Match: Trad Simp [pinyin] /def/def/
-            # Note: Pinyin can contain spaces.
-            # We'll split by first space (Trad), second space (Simp), then find '[' and ']' and '/'
-            parts = line.split(' ', 2)
-            if len(parts) < 3:
-                continue
-            trad, simp, rest = parts
-            
-            # rest looks like: [pinyin] /def1/def2/
-            m = re.search(r'\[(.*?)\] /(.*)/', rest)
-            if m:
-                pinyin = m.group(1)
-                defs = m.group(2)
-                # Clean definitions
-                def_list = defs.split('/')
-                english = ", ".join(def_list)
-                
-                if simp not in cedict:
-                    cedict[simp] = []
-                cedict[simp].append(english)
-    print(f"Loaded {len(cedict)} entries from CEDICT.")
-    return cedict
+    simps, trads, pinyins = simp.split('|'), trad.split('|'), pinyin.split('|')
+    for i, s in enumerate(simps):
+        t = trads[i] if i < len(trads) else ''
+        p = pinyins[i] if i < len(pinyins) else pinyins[0]
+        p = p.split('(')[0].split('/')[0].strip() or p
+        english = cedict.definition(s, p, t)
+        if english:
+            return english
+    return ""
 
 def main():
-    # 1. Load CEDICT
-    cedict = load_cedict(CEDICT_GZ)
+    stage = Stage("04_merge_hsk", STAGE_VERSION, inputs=[HSK_CSV, CEDICT_DB], outputs=[OUTPUT_TSV])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    # 1. Open the compiled CEDICT index (built by 04a; compiled here if missing)
+    if not CEDICT_DB.exists():
+        print(f"Compiling {CEDICT_GZ} -> {CEDICT_DB}...")
+        compile_index(CEDICT_GZ, CEDICT_DB)
+    cedict = CedictIndex(CEDICT_DB)
 
     # 2. Read HSK CSV
     print(f"Reading HSK data from {HSK_CSV}...")
     items = []
-    with open(HSK_CSV, 'r', encoding='utf-8') as f:
+    with metrics.phase("read"), open(HSK_CSV, 'r', encoding='utf-8') as f:
         # Skip BOM if present
         content = f.read()
         if content.startswith('\ufeff'):
             content = content[1:]
-        
+
+    with metrics.phase("transform"):
         reader = csv.DictReader(content.splitlines())
         for row in reader:
+            metrics.rows_in += 1
             # ID,Simplified,Traditional,Pinyin,POS,Level,...
             simp = row.get('Simplified', '').strip()
             trad = row.get('Traditional', '').strip()
@@ -67,15 +61,9 @@ def main():
             if not simp:
                 continue
 
-            # Lookup English
-            english = ""
-            if simp in cedict:
-                # Join multiple definitions if they exist, or just take the first one that matches pinyin?
-                # For simplicity, take the first one or join all unique ones.
-                # CEDICT might have multiple entries for same char with different pinyin.
-                # We are not matching pinyin strictly here, just char.
-                english = "; ".join(cedict[simp][:3]) # Limit to 3 entries to avoid huge text
-            
+            # Lookup English for the entry whose reading matches this row
+            english = lookup_english(cedict, simp, trad, pinyin)
+
             items.append({
                 'Traditional': trad,
                 'Simplified': simp,
@@ -85,6 +73,7 @@ def main():
                 'Level': level # Keep level for DB seeding later if needed, though TSV format doesn't have it in HSK1_merged.tsv
             })
 
+    cedict.close()
     print(f"Processed {len(items)} HSK items.")
 
     # 3. Write to TSV
@@ -94,7 +83,7 @@ def main():
     # I will stick to that format.
     
     print(f"Writing to {OUTPUT_TSV}...")
-    with open(OUTPUT_TSV, 'w', encoding='utf-8', newline='') as f:
+    with metrics.phase("write"), open(OUTPUT_TSV, 'w', encoding='utf-8', newline='') as f:
         writer = csv.writer(f, delimiter='\t')
         writer.writerow(['Traditional', 'Simplified', 'Pinyin', 'English', 'Zhuyin', 'Level'])
         for item in items:
@@ -106,7 +95,10 @@ def main():
                 item['Zhuyin'],
                 item['Level']
             ])
-    
+
+    stage.record()
+    metrics.rows_out = len(items)
+    metrics.write()
     print("Done.")
 
 if __name__ == "__main__":
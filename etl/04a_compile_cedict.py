@@ -0,0 +1,38 @@
+# etl/04a_compile_cedict.py
+# Compile CC-CEDICT into the SQLite index read by 04_merge_hsk.py (see cedict_index.py).
+import sys, time
+
+from cedict_index import CEDICT_DB, CEDICT_GZ, CedictIndex, compile_index
+from manifest import Stage
+from metrics import Metrics
+
+STAGE_VERSION = 1
+
+def main():
+    if not CEDICT_GZ.exists():
+        print(f"Error: {CEDICT_GZ} not found.")
+        sys.exit(1)
+    stage = Stage("04a_compile_cedict", STAGE_VERSION, inputs=[CEDICT_GZ], outputs=[CEDICT_DB])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    t0 = time.perf_counter()
+    # Parse and insert are one streaming pass
+    with metrics.phase("compile"):
+        n = compile_index(CEDICT_GZ, CEDICT_DB)
+    build_s = time.perf_counter() - t0
+    stage.record()
+
+    t0 = time.perf_counter()
+    with metrics.phase("verify"), CedictIndex(CEDICT_DB) as cd:
+        cd.lookup("行", "háng")
+        lookup_ms = (time.perf_counter() - t0) * 1000
+    print(f"Indexed {n} entries in {build_s:.2f}s, {CEDICT_DB.stat().st_size:,} bytes; "
+          f"open + first lookup {lookup_ms:.2f} ms")
+    metrics.rows_in = metrics.rows_out = n
+    metrics.write()
+    print(f"Wrote: {CEDICT_DB}")
+
+if __name__ == "__main__":
+    main()
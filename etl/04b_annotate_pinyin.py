@@ -0,0 +1,181 @@
+# etl/04b_annotate_pinyin.py
+# Bulk pinyin / numbered pinyin / zhuyin annotation for the HSK word list.
+# Runs once over the whole file in one process so seeding never has to call
+# pinyin_util.py per word.
+#
+# pypinyin is imported inside the functions that use it: loading its phrase
+# dictionary takes ~0.2s, which a no-op run (manifest says up to date) skips.
+import argparse, csv, pathlib, re, sys, time
+
+from manifest import Stage
+from metrics import Metrics
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DEFAULT_IN = ROOT / "data" / "00_hsk" / "HSK_all_merged.tsv"
+STAGE_VERSION = 2
+
+HANZI_RE = re.compile(r"[㐀-鿿豈-﫿〇]")
+# Letters that can appear in tone-marked pinyin; everything else (spaces, apostrophes,
+# hyphens, brackets) is ignored when lining syllables up against the curated string.
+PINYIN_LETTER_RE = re.compile(r"[^a-zāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜü]")
+
+def squash(py: str) -> str:
+    return PINYIN_LETTER_RE.sub("", py.lower())
+
+def align(chars, candidates, target):
+    """
+    Pick one reading per hanzi so the concatenation spells `target` (the curated
+    pinyin with separators removed). Candidates come phrase-first from pypinyin,
+    so heteronyms resolve in context; the neutral-tone form of each candidate is
+    also allowed (爸爸 -> bà + ba). Returns the syllables or None.
+    """
+    from pypinyin.contrib.tone_convert import tone_to_normal
+
+    def walk(i, pos):
+        if i == len(chars):
+            return [] if pos == len(target) else None
+        for cand in candidates[i]:
+            for form in (cand, tone_to_normal(cand, v_to_u=True)):
+                if target.startswith(form, pos):
+                    rest = walk(i + 1, pos + len(form))
+                    if rest is not None:
+                        return [form] + rest
+        return None
+    return walk(0, 0)
+
+def align_toneless(chars, candidates, target):
+    """
+    Like align(), but matching letters only and cutting the syllables out of
+    `target`, so the curated tones win where pypinyin disagrees: tone sandhi
+    written in the base tone (不对 bùduì, 一半 yībàn) or the other way round.
+    儿 may also be an erhua "r" (玩儿 wánr). Returns the syllables or None.
+    """
+    from pypinyin.contrib.tone_convert import tone_to_normal
+
+    plain = tone_to_normal(target, v_to_u=True)
+    if len(plain) != len(target):
+        return None
+    forms = [list(dict.fromkeys(tone_to_normal(c, v_to_u=True) for c in cands)) + (["r"] if ch == "儿" else [])
+             for ch, cands in zip(chars, candidates)]
+    def walk(i, pos):
+        if i == len(chars):
+            return [] if pos == len(plain) else None
+        for form in forms[i]:
+            if plain.startswith(form, pos):
+                rest = walk(i + 1, pos + len(form))
+                if rest is not None:
+                    return [target[pos:pos + len(form)]] + rest
+        return None
+    return walk(0, 0)
+
+def numbered_syllable(s: str) -> str:
+    from pypinyin.contrib.tone_convert import to_tone3
+    return "er5" if s == "r" else to_tone3(s, neutral_tone_with_five=True, v_to_u=True)
+
+def zhuyin_syllable(s: str) -> str:
+    from pypinyin import Style
+    from pypinyin.style import convert
+    return convert("er" if s == "r" else s, Style.BOPOMOFO, strict=True)
+
+def annotate_one(text: str, curated: str):
+    """
+    -> (tone-mark pinyin, numbered pinyin, zhuyin) for a single (non-|) form.
+    Curated pinyin wins when it can be aligned, exactly or letters-only;
+    numbered pinyin and zhuyin then follow its tones. Curated pinyin that can't
+    be aligned is kept, with numbered pinyin and zhuyin left empty rather than
+    disagreeing with it. Without curated pinyin, pypinyin's phrase segmentation
+    is used as-is.
+    """
+    from pypinyin import pinyin, Style
+
+    chars = [c for c in text if HANZI_RE.match(c)]
+    if not chars:
+        return curated, "", ""
+
+    if "/" in curated:
+        # 谁 shéi/shuí: one reading per alternative, "/"-joined like the pinyin
+        alts = [annotate_one(text, alt) for alt in curated.split("/")]
+        if all(num for _, num, _ in alts):
+            return curated, "/".join(a[1] for a in alts), "/".join(a[2] for a in alts)
+        return curated, "", ""
+
+    hanzi_only = "".join(chars)
+    phrase = [p[0] for p in pinyin(hanzi_only, style=Style.TONE)]
+    if curated:
+        hetero = pinyin(hanzi_only, style=Style.TONE, heteronym=True)
+        # Phrase lookups return only the phrase's reading; add each character's own
+        cands = [list(dict.fromkeys([phrase[i], *hetero[i], *pinyin(ch, style=Style.TONE, heteronym=True)[0]]))
+                 for i, ch in enumerate(chars)]
+        target = squash(curated)
+        sylls = align(chars, cands, target) or align_toneless(chars, cands, target)
+        if sylls is None:
+            return curated, "", ""
+    else:
+        sylls = phrase
+
+    tone = curated or "".join(sylls)
+    numbered = " ".join(numbered_syllable(s) for s in sylls)
+    zhuyin = " ".join(zhuyin_syllable(s) for s in sylls)
+    return tone, numbered, zhuyin
+
+def annotate(text: str, curated: str):
+    # HSK rows list alternatives as 爸爸|爸 with pinyin bàba|bà; annotate pairwise
+    forms = text.split("|")
+    pys = curated.split("|") if curated else [""] * len(forms)
+    if len(pys) != len(forms):
+        pys = (pys + [""] * len(forms))[:len(forms)]
+    parts = [annotate_one(f, p) for f, p in zip(forms, pys)]
+    return tuple("|".join(col) for col in zip(*parts))
+
+def main():
+    ap = argparse.ArgumentParser(description="Fill Pinyin / PinyinNumbered / Zhuyin for a TSV or CSV word list")
+    ap.add_argument("--in", dest="src", type=pathlib.Path, default=DEFAULT_IN)
+    ap.add_argument("--out", type=pathlib.Path, default=None, help="defaults to overwriting --in")
+    ap.add_argument("--text-col", default="Simplified")
+    ap.add_argument("--force", action="store_true", help="rebuild even if the manifest says nothing changed")
+    ap.add_argument("--profile", action="store_true", help="write cProfile stats to data/processed/.metrics/")
+    args = ap.parse_args()
+    out_path = args.out or args.src
+
+    stage = Stage("04b_annotate_pinyin", STAGE_VERSION, inputs=[args.src], outputs=[out_path])
+    if stage.skip(args.force):
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs, args.profile)
+
+    delim = "," if args.src.suffix.lower() == ".csv" else "\t"
+    t0 = time.perf_counter()
+    with metrics.phase("read"), args.src.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f, delimiter=delim)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+    if args.text_col not in fieldnames:
+        print(f"ERROR: column {args.text_col!r} not in {fieldnames}")
+        sys.exit(1)
+    for col in ("Pinyin", "PinyinNumbered", "Zhuyin"):
+        if col not in fieldnames:
+            fieldnames.append(col)
+
+    # Deduplicate before converting: many rows repeat the same (text, pinyin) pair
+    cache = {}
+    with metrics.phase("transform"):
+        for row in rows:
+            key = (row[args.text_col].strip(), (row.get("Pinyin") or "").strip())
+            if key not in cache:
+                cache[key] = annotate(*key)
+            row["Pinyin"], row["PinyinNumbered"], row["Zhuyin"] = cache[key]
+
+    with metrics.phase("write"), out_path.open("w", encoding="utf-8", newline="") as w:
+        writer = csv.DictWriter(w, fieldnames=fieldnames, delimiter=delim, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    stage.record()
+    elapsed = time.perf_counter() - t0
+    print(f"Annotated {len(rows)} rows ({len(cache)} unique) in {elapsed:.2f}s "
+          f"= {len(rows) / elapsed:,.0f} rows/sec")
+    metrics.rows_in = metrics.rows_out = len(rows)
+    metrics.write()
+    print(f"Wrote: {out_path}")
+
+if __name__ == "__main__":
+    main()
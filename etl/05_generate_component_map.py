@@ -1,118 +1,196 @@
+import csv
 import json
 import pathlib
+import sys
+from functools import lru_cache
+
+from manifest import Stage
+from metrics import Metrics
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
-DICT_PATH = ROOT / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt"
+DICT_PATHS = [
+    ROOT / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt",
+    ROOT / "backend" / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt",
+]
+DICT_PATH = next((p for p in DICT_PATHS if p.exists()), DICT_PATHS[0])
 OUT_PATH = ROOT / "data" / "processed" / "character_component_map.json"
+INDEX_PATH = ROOT / "data" / "processed" / "component_index.csv"
+STAGE_VERSION = 2
+
+# IDS operators -> names of their child positions. Binary operators take two
+# children, ⿲/⿳ take three.
+POSITIONS = {
+    '⿰': ('left', 'right'),
+    '⿱': ('top', 'bottom'),
+    '⿲': ('left', 'middle', 'right'),
+    '⿳': ('top', 'middle', 'bottom'),
+    '⿴': ('outer', 'inner'),
+    '⿵': ('outer', 'inner'),
+    '⿶': ('outer', 'inner'),
+    '⿷': ('outer', 'inner'),
+    '⿸': ('outer', 'inner'),
+    '⿹': ('outer', 'inner'),
+    '⿺': ('outer', 'inner'),
+    '⿻': ('first', 'second'),
+}
+MISSING = '？'
+
+# Identical subtrees are interned so characters that share a part (e.g. every
+# ⿰氵X) share one node, and the per-node caches below are hit across characters.
+_interned = {}
 
+def _intern(node):
+    return _interned.setdefault(node, node)
+
+def _parse_at(s, i):
+    """
+    Parse one IDS node starting at s[i]. Returns (node, next_i) where a node
+    is a leaf component (str), None for a '？' placeholder, or a tuple
+    (op, child, child[, child]). Truncated strings yield None children.
+    """
+    if i >= len(s):
+        return None, i
+    ch = s[i]
+    if ch in POSITIONS:
+        children = []
+        i += 1
+        for _ in POSITIONS[ch]:
+            child, i = _parse_at(s, i)
+            children.append(child)
+        return _intern((ch, *children)), i
+    return (None if ch == MISSING else ch), i + 1
+
+@lru_cache(maxsize=None)
 def parse_decomposition(decomp_str):
-    # Simple parser for IDS (Ideographic Description Characters)
-    # Returns a list of components if possible
-    # This is tricky because IDS is a tree string e.g. ⿰亻尔
-    # We only care about the top-level children for now because 'matches' maps to them.
-    
-    # Common IDS operators: ⿰ (Left-Right), ⿱ (Top-Bottom), ⿲ (L-M-R), ⿳ (T-M-B), ⿴, ⿵, ⿶, ⿷, ⿸, ⿹, ⿺, ⿻
-    # If it starts with a binary operator (⿰, ⿱, ⿴, ⿵, ⿶, ⿷, ⿸, ⿹, ⿺, ⿻), it has 2 children.
-    # If it starts with a ternary operator (⿲, ⿳), it has 3 children.
-    
+    """
+    Full recursive IDS parse, e.g. '⿰亻⿱⺈小' -> ('⿰', '亻', ('⿱', '⺈', '小')).
+    Returns None for an empty string or a bare '？'.
+    """
     if not decomp_str:
-        return []
-    
-    op = decomp_str[0]
-    rest = decomp_str[1:]
-    
-    # We need to split 'rest' into parts. This requires a full parser because parts can be IDS strings themselves.
-    # But 'matches' in dictionary.txt corresponds to the *indices* of the children in the decomposition string?
-    # Actually, let's look at 'matches' again.
-    # "matches": [[0], [0], [1], [1], [1], [1], [1]]
-    # This maps stroke index -> child index.
-    # Child index 0 corresponds to the first component in the decomposition.
-    # Child index 1 corresponds to the second component.
-    
-    # So we just need to extract the component characters.
-    # But extracting them from the string is hard without parsing.
-    # e.g. ⿰亻尔 -> ['亻', '尔']
-    # e.g. ⿱TopBottom -> ['Top', 'Bottom']
-    # e.g. ⿰Complex1Complex2 -> ['Complex1', 'Complex2']
-    
-    # Fortunately, we don't strictly need the *names* of the components to color them.
-    # We just need to know there are N components, and which strokes belong to which.
-    # But having the names is nice for debugging.
-    
-    return []
+        return None
+    node, _ = _parse_at(decomp_str, 0)
+    return node
+
+def node_name(node):
+    # Leaf -> the component itself; subtree -> its IDS string; placeholder -> None
+    if node is None or isinstance(node, str):
+        return node
+    return node[0] + ''.join(node_name(c) or MISSING for c in node[1:])
+
+def top_children(tree):
+    if isinstance(tree, tuple):
+        return list(tree[1:])
+    return [tree] if tree is not None else []
+
+@lru_cache(maxsize=None)
+def contained(node):
+    """
+    Every named component inside node, at any depth, as (component, path,
+    position, depth) with the path relative to node. Cached per interned
+    subtree.
+    """
+    if not isinstance(node, tuple):
+        return ()
+    out = []
+    op = node[0]
+    for k, child in enumerate(node[1:]):
+        if child is None:
+            continue
+        pos = POSITIONS[op][k]
+        out.append((node_name(child), (k,), pos, 1))
+        for comp, path, cpos, depth in contained(child):
+            out.append((comp, (k,) + path, cpos, depth + 1))
+    return tuple(out)
+
+def find_path(node, target):
+    # Path of the first leaf equal to target, or None
+    if node == target:
+        return ()
+    if isinstance(node, tuple):
+        for k, child in enumerate(node[1:]):
+            sub = find_path(child, target)
+            if sub is not None:
+                return (k,) + sub
+    return None
 
 def process():
     if not DICT_PATH.exists():
-        print(f"Error: {DICT_PATH} not found.")
+        print(f"Error: dictionary.txt not found in {' or '.join(map(str, DICT_PATHS))}.")
+        sys.exit(1)
+    stage = Stage("05_generate_component_map", STAGE_VERSION, inputs=[DICT_PATH], outputs=[OUT_PATH, INDEX_PATH])
+    if stage.skip():
         return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
 
     mapping = {}
+    index_rows = 0
+
+    # component_index.csv rows are written while parsing
+    with metrics.phase("parse"), \
+         open(DICT_PATH, 'r', encoding='utf-8') as f, \
+         open(INDEX_PATH, 'w', encoding='utf-8', newline='') as idx_f:
+        index = csv.writer(idx_f)
+        index.writerow(['component', 'hanzi', 'path', 'position', 'depth'])
 
-    with open(DICT_PATH, 'r', encoding='utf-8') as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
+            metrics.rows_in += 1
             try:
                 entry = json.loads(line)
-                char = entry.get('character')
-                matches = entry.get('matches')
-                radical = entry.get('radical')
-                
-                if not char or not matches:
-                    continue
-                
-                # matches is a list of lists/nulls.
-                # e.g. [[0], [0], [1], [1]]
-                # We want to group stroke indices by component index.
-                
-                components = {} # index -> { strokes: [], isRadical: bool }
-                
-                # First pass: collect strokes for each component index
-                for stroke_idx, match in enumerate(matches):
-                    if match is None:
-                        # Stroke doesn't map to a component? Or maps to root?
-                        # Usually null means it's not assigned or ambiguous.
-                        continue
-                    
-                    # match is a list of indices, e.g. [0] or [1, 0]
-                    # We only care about the top-level index (match[0]) for coloring top-level components.
-                    if len(match) > 0:
-                        comp_idx = match[0]
-                        if comp_idx not in components:
-                            components[comp_idx] = {'strokes': [], 'isRadical': False}
-                        components[comp_idx]['strokes'].append(stroke_idx)
-                
-                # Determine which component is the radical
-                # This is hard because we don't know which component index corresponds to the radical character
-                # unless we parse the decomposition string.
-                # BUT, we can try to guess.
-                # Or we can just store the groups and let the frontend decide colors.
-                # The frontend can color group 0, group 1, etc.
-                
-                # If we want to identify the radical specifically:
-                # We can check if the strokes in a group match the 'radStrokes' from HanziWriter data?
-                # Or we can just export the groups.
-                
-                # Let's just export the groups for now.
-                # Format: list of lists of stroke indices.
-                
-                comp_list = []
-                for idx in sorted(components.keys()):
-                    comp_list.append(components[idx]['strokes'])
-                
-                mapping[char] = {
-                    'radical': radical,
-                    'components': comp_list
-                }
-                
             except json.JSONDecodeError:
                 continue
 
-    with open(OUT_PATH, 'w', encoding='utf-8') as f:
+            char = entry.get('character')
+            matches = entry.get('matches')
+            radical = entry.get('radical')
+            if not char:
+                continue
+
+            tree = parse_decomposition(entry.get('decomposition', ''))
+
+            # Reverse containment index: component -> characters containing it
+            for comp, path, pos, depth in contained(tree):
+                index.writerow([comp, char, '.'.join(map(str, path)), pos, depth])
+                index_rows += 1
+
+            if not matches:
+                continue
+
+            # matches maps stroke index -> path into the decomposition tree, e.g.
+            # [[0], [0], [1], [1, 0]]. Group strokes by the top-level child (match[0]).
+            components = {}
+            for stroke_idx, match in enumerate(matches):
+                if match:
+                    components.setdefault(match[0], []).append(stroke_idx)
+
+            children = top_children(tree)
+            rad_path = find_path(tree, radical) if radical != char else None
+            rad_top = rad_path[0] if rad_path else None
+
+            comp_list, names, radical_index = [], [], None
+            for i, idx in enumerate(sorted(components.keys())):
+                comp_list.append(components[idx])
+                names.append(node_name(children[idx]) if idx < len(children) else None)
+                if idx == rad_top:
+                    radical_index = i
+
+            mapping[char] = {
+                'radical': radical,
+                'components': comp_list,
+                'names': names,
+                'radicalIndex': radical_index,
+            }
+
+    with metrics.phase("write"), open(OUT_PATH, 'w', encoding='utf-8') as f:
         json.dump(mapping, f, ensure_ascii=False, separators=(',', ':'))
-    
+
+    stage.record()
+    metrics.rows_out = len(mapping) + index_rows
+    metrics.write()
     print(f"Generated map for {len(mapping)} characters at {OUT_PATH}")
+    print(f"Wrote: {INDEX_PATH} rows: {index_rows} ({len(_interned)} distinct subtrees)")
 
 if __name__ == "__main__":
     process()
@@ -0,0 +1,54 @@
+# etl/06_normalize_readings.py
+# Normalize every character reading (deduplicated, one script per row,
+# numbered + tone-marked) into char_readings.csv and compile the
+# syllable -> tone -> characters index (reading_index.py).
+import sys, time
+
+from cedict_index import CEDICT_DB, CEDICT_GZ
+from manifest import Stage
+from metrics import Metrics
+from reading_index import (CHAR_READINGS, READING_INDEX, READINGS_CSV, READINGS_SLIM, ReadingIndex,
+                           build_index, frequency_order, iter_raw, normalize, write_rows)
+from text_analyzer import HSK_TSV, load_cedict_words, load_hsk
+
+STAGE_VERSION = 1
+
+def main():
+    if not (READINGS_CSV.exists() or READINGS_SLIM.exists()):
+        print(f"Error: neither {READINGS_CSV} nor {READINGS_SLIM} found.")
+        sys.exit(1)
+    stage = Stage("06_normalize_readings", STAGE_VERSION,
+                  inputs=[READINGS_SLIM, READINGS_CSV, HSK_TSV, CEDICT_DB, CEDICT_GZ],
+                  outputs=[CHAR_READINGS, READING_INDEX])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    with metrics.phase("normalize"):
+        rows, metrics.rows_in = normalize(iter_raw())
+    with metrics.phase("rank"):
+        hsk = load_hsk(HSK_TSV) if HSK_TSV.exists() else {}
+        order = frequency_order({r[0] for r in rows}, hsk, load_cedict_words(CEDICT_DB, CEDICT_GZ))
+    with metrics.phase("write"):
+        write_rows(CHAR_READINGS, rows)
+        counts = build_index(READING_INDEX, rows, order)
+    stage.record()
+
+    t0 = time.perf_counter()
+    with metrics.phase("verify"), ReadingIndex(READING_INDEX) as ix:
+        load_ms = (time.perf_counter() - t0) * 1000
+        sample = ix.chars("shi4", limit=10)
+    by_script = {}
+    for r in rows:
+        by_script[r[1]] = by_script.get(r[1], 0) + 1
+    print(f"{metrics.rows_in:,} raw readings -> {len(rows):,} "
+          f"({', '.join(f'{s} {n:,}' for s, n in by_script.items())}) for {counts['chars']:,} characters")
+    print("Index: " + ", ".join(f"{s} {c['syllables']} syllables / {c['postings']:,} postings"
+                                for s, c in counts["scripts"].items())
+          + f"; {READING_INDEX.stat().st_size:,} bytes, open in {load_ms:.2f} ms; shi4: {sample}")
+    metrics.rows_out = len(rows)
+    metrics.write()
+    print(f"Wrote: {CHAR_READINGS} {READING_INDEX}")
+
+if __name__ == "__main__":
+    main()
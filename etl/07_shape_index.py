@@ -0,0 +1,53 @@
+# etl/07_shape_index.py
+# Compile the stroke-signature prefix index (shape_index.py) from stage 02's
+# character_shapes.csv, ranked by the same frequency order as the reading index.
+import sys, time
+
+from cedict_index import CEDICT_DB, CEDICT_GZ
+from manifest import Stage
+from metrics import Metrics
+from reading_index import frequency_order
+from shape_index import SHAPE_INDEX, SHAPES_CSV, ShapeIndex, build_index, load_shapes
+from text_analyzer import HSK_TSV, load_cedict_words, load_hsk
+
+STAGE_VERSION = 2
+
+def main():
+    if not SHAPES_CSV.exists():
+        print(f"Error: {SHAPES_CSV} not found (run etl/02_ccd_to_csv.py).")
+        sys.exit(1)
+    stage = Stage("07_shape_index", STAGE_VERSION, inputs=[SHAPES_CSV, HSK_TSV, CEDICT_DB, CEDICT_GZ],
+                  outputs=[SHAPE_INDEX])
+    if stage.skip():
+        return
+    metrics = Metrics(stage.name, stage.inputs, stage.outputs)
+
+    with metrics.phase("read"):
+        shapes = load_shapes(SHAPES_CSV)
+    with metrics.phase("rank"):
+        hsk = load_hsk(HSK_TSV) if HSK_TSV.exists() else {}
+        order = frequency_order({s[0] for s in shapes}, hsk, load_cedict_words(CEDICT_DB, CEDICT_GZ))
+    with metrics.phase("write"):
+        counts = build_index(SHAPE_INDEX, shapes, order)
+    stage.record()
+
+    t0 = time.perf_counter()
+    with metrics.phase("verify"), ShapeIndex(SHAPE_INDEX) as ix:
+        load_ms = (time.perf_counter() - t0) * 1000
+        # Every one- and two-letter prefix, with and without a composition type
+        queries = [(a + b, kind) for a in "ABCDEFGHIJKLMNOPQRSTUVWXY" for b in " ABCDEFGHIJKLMNOPQRSTUVWXY"
+                   for kind in (None, *ix.types)]
+        t0 = time.perf_counter()
+        hits = sum(1 for q, kind in queries if ix.candidates(q.strip(), kind))
+        lookup_us = (time.perf_counter() - t0) / len(queries) * 1e6
+        sample = ix.candidates("VN", limit=10)
+    print(f"{counts['chars']:,} characters with a signature in {counts['types']} composition types -> "
+          f"{counts['keys']:,} prefix keys, {counts['candidates']:,} candidates")
+    print(f"Index: {SHAPE_INDEX.stat().st_size:,} bytes, open in {load_ms:.2f} ms; {len(queries):,} lookups "
+          f"({hits:,} hits) at {lookup_us:.1f} us each; VN: {sample}")
+    metrics.rows_in, metrics.rows_out = len(shapes), counts["keys"]
+    metrics.write()
+    print(f"Wrote: {SHAPE_INDEX}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+# etl/bench.py
+# Benchmarks the ETL stages and the hot lookup paths against synthetic
+# corpora at 1x / 10x / 100x the size of the real inputs, and compares the
+# numbers with a stored baseline.
+#
+# A corpus at scale N lives in its own scratch root (--work, default
+# /tmp/hanzidex-bench/xN) laid out like the project: a copy of etl/*.py plus
+# data/ and _cleanup/ with every source repeated N times. Copy k maps each
+# CJK code point in char_table.BLOCKS to the one k * STRIDE places further
+# round the same list, in every file alike, so HSK words still find their
+# CEDICT entries and components still resolve within a copy. There are only
+# ~99k such code points, so at 10x and above the *keys* repeat (later copies
+# overwrite earlier ones in keyed outputs) while input rows grow N-fold; the
+# stroke-file corpus is capped at one file per code point.
+#
+# Every stage runs as in pipeline.py (same script, --force, cwd = scratch
+# root) and every lookup runs in a child process of this script, so each
+# measurement gets its own peak RSS from wait4(). Per benchmark we record
+# wall seconds, input rows, rows/sec and peak RSS; a result is a regression
+# when wall time or RSS exceeds the baseline by more than --threshold and by
+# more than an absolute floor. A single sub-second run swings by a third from
+# one try to the next, so anything that finishes within REPEAT_BELOW seconds
+# is run --repeat times and keeps its best (lowest) wall time and RSS.
+#
+#   python etl/bench.py                          # 1x, 10x and 100x, compare with etl/bench_baseline.json
+#   python etl/bench.py --scales 1,10 --threshold 0.5
+#   python etl/bench.py --only 01,04a,pinyin     # a subset (stage prefixes / lookup names)
+#   python etl/bench.py --only analyzer          # text segmentation (etl/text_analyzer.py)
+#   python etl/bench.py --save-baseline          # record this machine's numbers as the baseline
+import argparse, gzip, json, os, pathlib, re, shutil, subprocess, sys, tempfile, time
+
+ETL = pathlib.Path(__file__).resolve().parent
+ROOT = ETL.parent
+sys.path.insert(0, str(ETL))
+
+from char_table import BLOCKS
+from pipeline import STAGES
+
+BASELINE = ETL / "bench_baseline.json"
+WORK = pathlib.Path(tempfile.gettempdir()) / "hanzidex-bench"
+CORPUS_VERSION = 2
+STRIDE = 7919
+# Below these, a slowdown is noise rather than a regression
+MIN_WALL_DELTA = 0.5    # seconds
+MIN_RSS_DELTA = 8.0     # MB
+REPEAT_BELOW = 10.0     # seconds; longer benchmarks are measured once
+
+def _first(*paths):
+    for p in paths:
+        if p.exists():
+            return p
+    return paths[0]
+
+def _unihan_dir():
+    ext = ROOT / "data" / "10_unihan" / "extracted"
+    return ext if any(ext.glob("Unihan_*.txt")) else ROOT / "data" / "10_unihan"
+
+# name -> (source, destination relative to the scratch root, kind)
+#   kind: "unihan" (U+XXXX keys), "tsv"/"csv" (one header line), "lines", "gz" (# comments), "files"
+CORPORA = {
+    "unihan": (_unihan_dir(), "data/10_unihan", "unihan"),
+    "ccd": (ROOT / "data" / "20_decomposition" / "ccd_clean.tsv", "data/20_decomposition/ccd_clean.tsv", "tsv"),
+    "strokes": (_first(ROOT / "data" / "30_strokes" / "hanzi_writer_data" / "data",
+                       ROOT / "backend" / "data" / "30_strokes" / "hanzi_writer_data" / "data"),
+                "data/30_strokes/hanzi_writer_data/data", "files"),
+    "dictionary": (_first(ROOT / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt",
+                          ROOT / "backend" / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt"),
+                   "data/30_strokes/makemeahanzi/dictionary.txt", "lines"),
+    "cedict": (ROOT / "_cleanup" / "cedict_1_0_ts_utf-8_mdbg.txt.gz", "_cleanup/cedict_1_0_ts_utf-8_mdbg.txt.gz", "gz"),
+    "hsk": (ROOT / "_cleanup" / "hsk30.csv", "_cleanup/hsk30.csv", "csv"),
+    "readings": (ROOT / "data" / "processed" / "readings_slim.csv", "data/processed/readings_slim.csv", "csv"),
+    # Stage 01 only rewrites this when the Unihan dump has kRSUnicode / kTotalStrokes
+    "characters": (ROOT / "data" / "processed" / "characters.csv", "data/processed/characters.csv", "csv"),
+}
+
+# -- Synthetic corpora ---------------------------------------------------------
+
+_CPS = [cp for lo, hi in BLOCKS for cp in range(lo, hi + 1)]
+_CJK = "".join(map(chr, _CPS))
+_UPLUS = re.compile(r"U\+([0-9A-F]{4,5})")
+
+class Rotation:
+    """Copy k's code point map: str.translate table plus the U+XXXX spelling."""
+    def __init__(self, k):
+        off = (k * STRIDE) % len(_CPS)
+        self.identity = off == 0
+        self.table = str.maketrans(_CJK, _CJK[off:] + _CJK[:off])
+        self.hex = {} if self.identity else {
+            f"{cp:04X}": f"{_CPS[(i + off) % len(_CPS)]:04X}" for i, cp in enumerate(_CPS)}
+
+    def text(self, s):
+        return s if self.identity else s.translate(self.table)
+
+    def uplus(self, s):
+        if self.identity:
+            return s
+        s = _UPLUS.sub(lambda m: "U+" + self.hex.get(m.group(1), m.group(1)), s)
+        return s.translate(self.table)
+
+def _split(text, kind):
+    # -> (header, body) for line-oriented sources
+    if kind in ("tsv", "csv"):
+        head, _, body = text.partition("\n")
+        return head + "\n", body
+    if kind in ("unihan", "gz"):
+        lines = text.splitlines(keepends=True)
+        n = next((i for i, line in enumerate(lines) if not line.startswith("#")), len(lines))
+        return "".join(lines[:n]), "".join(l for l in lines[n:] if not l.startswith("#"))
+    return "", text
+
+def _scale_text(text, kind, copies, write):
+    head, body = _split(text, kind)
+    if body and not body.endswith("\n"):
+        body += "\n"
+    write(head)
+    for k in range(copies):
+        rot = Rotation(k)
+        write(rot.uplus(body) if kind == "unihan" else rot.text(body))
+    return body.count("\n") * copies
+
+def _scale_files(src, dst, copies):
+    names = sorted(p.name for p in src.iterdir() if p.is_file())
+    blobs = {n: (src / n).read_bytes() for n in names}
+    seen = set()
+    for k in range(copies):
+        rot = Rotation(k)
+        for n in names:
+            new = rot.text(n)
+            if new in seen:
+                continue
+            seen.add(new)
+            (dst / new).write_bytes(blobs[n])
+    return len(seen)
+
+def build_corpus(root, scale, log=print):
+    """Write the scale-N corpus under root (reused if already built); -> {corpus: rows}."""
+    marker = root / "corpus.json"
+    if marker.exists():
+        meta = json.loads(marker.read_text(encoding="utf-8"))
+        if meta.get("version") == CORPUS_VERSION and meta.get("scale") == scale:
+            return meta["rows"]
+    rows = {}
+    for name, (src, rel, kind) in CORPORA.items():
+        if not src.exists():
+            log(f"  {name}: {src.relative_to(ROOT)} missing, not generated")
+            continue
+        t0 = time.perf_counter()
+        dst = root / rel
+        if kind == "files":
+            shutil.rmtree(dst, ignore_errors=True)
+            dst.mkdir(parents=True)
+            rows[name] = _scale_files(src, dst, scale)
+        elif kind == "unihan":
+            dst.mkdir(parents=True, exist_ok=True)
+            rows[name] = 0
+            for f in sorted(src.glob("Unihan_*.txt")):
+                with open(dst / f.name, "w", encoding="utf-8", newline="") as w:
+                    rows[name] += _scale_text(f.read_text(encoding="utf-8"), kind, scale, w.write)
+        else:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if kind == "gz":
+                with gzip.open(src, "rt", encoding="utf-8", newline="") as f:
+                    text = f.read()
+                with gzip.open(dst, "wt", encoding="utf-8", newline="", compresslevel=1) as w:
+                    rows[name] = _scale_text(text, kind, scale, w.write)
+            else:
+                with open(dst, "w", encoding="utf-8", newline="") as w:
+                    rows[name] = _scale_text(src.read_text(encoding="utf-8"), kind, scale, w.write)
+        log(f"  {name}: {rows[name]:,} rows in {time.perf_counter() - t0:.1f}s")
+    marker.write_text(json.dumps({"version": CORPUS_VERSION, "scale": scale, "rows": rows}, indent=2),
+                      encoding="utf-8")
+    return rows
+
+def prepare_root(root):
+    # Fresh copy of the scripts, so the numbers are for the code in this checkout
+    (root / "etl").mkdir(parents=True, exist_ok=True)
+    for f in ETL.glob("*.py"):
+        shutil.copy2(f, root / "etl" / f.name)
+    for d in ("data/processed", "data/00_hsk"):
+        (root / d).mkdir(parents=True, exist_ok=True)
+
+# -- Measuring -----------------------------------------------------------------
+
+def run_measured(cmd, cwd):
+    """Run cmd to completion -> (returncode, wall seconds, peak RSS MB, output)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = proc.stdout.read()
+    proc.stdout.close()
+    # wait4 rather than proc.wait(): it hands back the child's rusage
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return proc.returncode, wall, rss, out.decode("utf-8", "replace")
+
+def _files(path):
+    # Streaming walk: a list of every stroke file would raise this process's
+    # high-water mark, and with it every later child's ru_maxrss
+    for e in os.scandir(path):
+        if e.is_dir():
+            yield from _files(e.path)
+        elif e.is_file():
+            yield e
+
+def count_rows(path):
+    """Rows in a stage input: files in a stroke directory, else newline count; None for binaries."""
+    if path.is_dir():
+        files = rows = 0
+        for e in _files(path):
+            files += 1
+            if not e.name.endswith(".json"):
+                rows += count_rows(pathlib.Path(e.path)) or 0
+        return rows or files
+    if path.suffix in (".bin", ".sqlite"):
+        return None
+    opener = gzip.open if path.suffix == ".gz" else open
+    n = 0
+    with opener(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            n += chunk.count(b"\n")
+    return n
+
+def best_of(run, repeat):
+    """Call run() (-> result dict) up to `repeat` times while it stays quick; keep the best sample."""
+    best = run()
+    samples = 1
+    while samples < repeat and best["status"] == "ok" and best["wall_s"] < REPEAT_BELOW:
+        res = run()
+        samples += 1
+        if res["status"] != "ok":
+            return res
+        best["wall_s"] = min(best["wall_s"], res["wall_s"])
+        best["peak_rss_mb"] = min(best["peak_rss_mb"], res["peak_rss_mb"])
+    best["samples"] = samples
+    return best
+
+def bench_stage(root, name, repeat=1):
+    inputs, _ = STAGES[name]
+    paths = [root / p for p in inputs]
+    if not all(p.exists() for p in paths):
+        return {"status": "no input"}
+    counts = [count_rows(p) for p in paths]
+    rows = next((c for c in counts if c), 0)
+    bytes_in = sum(sum(e.stat().st_size for e in _files(p)) if p.is_dir() else p.stat().st_size for p in paths)
+    def run():
+        code, wall, rss, out = run_measured([sys.executable, str(root / "etl" / f"{name}.py"), "--force"], root)
+        if code != 0:
+            return {"status": "failed", "wall_s": wall, "peak_rss_mb": rss, "output": out[-2000:]}
+        return {"status": "ok", "wall_s": wall, "rows": rows, "mb_in": bytes_in / 1e6, "peak_rss_mb": rss}
+    return best_of(run, repeat)
+
+# Lookups run inside a child (`bench.py --lookup NAME --root DIR`) and time only
+# their query loop; each returns the number of queries it made.
+
+def _hsk_words(root):
+    import csv
+    with open(root / "_cleanup" / "hsk30.csv", encoding="utf-8", newline="") as f:
+        return [r["Simplified"] for r in csv.DictReader(f) if r.get("Simplified")]
+
+def lookup_pinyin(root):
+    sys.path.insert(0, str(ROOT / "backend"))
+    from pinyin_util import generate_pinyin
+    words = _hsk_words(root)
+    t0 = time.perf_counter()
+    for w in words:
+        generate_pinyin(w)
+    return len(words), time.perf_counter() - t0
+
+def lookup_char_table(root):
+    from char_table import CharTable
+    text = (root / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt").read_text(encoding="utf-8")
+    text = "".join(ch for ch in text if ord(ch) >= 0x2E80)
+    with CharTable(root / "data" / "processed" / "characters.bin") as t:
+        t0 = time.perf_counter()
+        t.lookup_many(text)
+        for ch in text[:200_000]:
+            t.lookup(ch)
+        return len(text) + min(len(text), 200_000), time.perf_counter() - t0
+
+def lookup_cedict(root):
+    from cedict_index import CedictIndex
+    words = _hsk_words(root)
+    with CedictIndex(root / "data" / "processed" / "cedict.sqlite") as cd:
+        t0 = time.perf_counter()
+        for w in words:
+            cd.lookup(w.split("|")[0])
+        return len(words), time.perf_counter() - t0
+
+def lookup_components(root):
+    import csv
+    from component_query import ComponentIndex
+    with open(root / "data" / "processed" / "character_parts.csv", encoding="utf-8", newline="") as f:
+        parts = list(dict.fromkeys(r["part_symbol"] for r in csv.DictReader(f) if len(r["part_symbol"]) == 1))
+    with ComponentIndex(root / "data" / "processed" / "component_bitmaps.bin") as idx:
+        t0 = time.perf_counter()
+        for a, b in zip(parts, parts[1:] + parts[:1]):
+            idx.query(any_of=a + b, strokes=(1, 20))
+        return len(parts), time.perf_counter() - t0
+
+def lookup_strokes(root):
+    from stroke_bundle import StrokeBundle
+    with StrokeBundle(root / "data" / "processed" / "strokes.bin") as b:
+        chars = b.chars()
+        t0 = time.perf_counter()
+        for ch in chars:
+            b.get(ch)
+        return len(chars), time.perf_counter() - t0
+
+def lookup_analyzer(root):
+    from text_analyzer import Analyzer
+    analyzer = Analyzer.load(root / "data" / "00_hsk" / "HSK_all_merged.tsv",
+                             root / "data" / "processed" / "cedict.sqlite")
+    words = [w.split("|")[0] for w in _hsk_words(root)]
+    lines = ["".join(words[i:i + 8]) for i in range(0, len(words), 8)]
+    t0 = time.perf_counter()
+    for line in lines:
+        analyzer.tokens(line)
+    return len(lines), time.perf_counter() - t0
+
+def lookup_shapes(root):
+    from shape_index import ShapeIndex
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXY"
+    prefixes = [a + b + c for a in letters for b in letters for c in ("", *letters)]
+    with ShapeIndex(root / "data" / "processed" / "shape_index.bin") as ix:
+        t0 = time.perf_counter()
+        for p in prefixes:
+            ix.candidates(p)
+        return len(prefixes), time.perf_counter() - t0
+
+# name -> (function, files it needs, relative to the scratch root)
+LOOKUPS = {
+    "pinyin": (lookup_pinyin, ["_cleanup/hsk30.csv"]),
+    "char_table": (lookup_char_table, ["data/processed/characters.bin",
+                                       "data/30_strokes/makemeahanzi/dictionary.txt"]),
+    "cedict": (lookup_cedict, ["data/processed/cedict.sqlite", "_cleanup/hsk30.csv"]),
+    "components": (lookup_components, ["data/processed/component_bitmaps.bin",
+                                       "data/processed/character_parts.csv"]),
+    "strokes": (lookup_strokes, ["data/processed/strokes.bin"]),
+    "analyzer": (lookup_analyzer, ["data/00_hsk/HSK_all_merged.tsv", "data/processed/cedict.sqlite",
+                                   "_cleanup/hsk30.csv"]),
+    "shapes": (lookup_shapes, ["data/processed/shape_index.bin"]),
+}
+
+def bench_lookup(root, name, repeat=1):
+    if not all((root / p).exists() for p in LOOKUPS[name][1]):
+        return {"status": "no input"}
+    def run():
+        code, wall, rss, out = run_measured(
+            [sys.executable, str(pathlib.Path(__file__).resolve()), "--lookup", name, "--root", str(root)], ROOT)
+        if code != 0:
+            return {"status": "failed", "wall_s": wall, "peak_rss_mb": rss, "output": out[-2000:]}
+        res = json.loads(out.strip().splitlines()[-1])
+        return {"status": "ok", "wall_s": res["wall_s"], "rows": res["rows"], "peak_rss_mb": rss}
+    return best_of(run, repeat)
+
+# -- Baseline ------------------------------------------------------------------
+
+def compare(results, baseline, threshold):
+    """-> list of (key, metric, baseline, current) past the threshold."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base or cur.get("status") != "ok" or base.get("status") != "ok":
+            continue
+        for metric, floor in (("wall_s", MIN_WALL_DELTA), ("peak_rss_mb", MIN_RSS_DELTA)):
+            b, c = base.get(metric), cur.get(metric)
+            if b is not None and c is not None and c > b * (1 + threshold) and c - b > floor:
+                regressions.append((key, metric, b, c))
+    return regressions
+
+def _fmt(res, base):
+    if res["status"] != "ok":
+        return f"{res['status']:>9}"
+    rows = res.get("rows") or 0
+    rate = rows / res["wall_s"] if res["wall_s"] else 0
+    delta = ""
+    if base and base.get("status") == "ok" and base.get("wall_s"):
+        delta = f"{res['wall_s'] / base['wall_s'] - 1:+7.0%}"
+    return (f"{res['wall_s']:8.2f}s {rows:11,} rows {rate:12,.0f}/s {res['peak_rss_mb']:8.1f} MB"
+            f" {delta:>7}")
+
+def selected(only):
+    stages, lookups = list(STAGES), list(LOOKUPS)
+    if not only:
+        return stages, lookups
+    tokens = [t.strip() for t in only.split(",") if t.strip()]
+    pick_s = [s for s in stages if any(s == t or s.startswith(t + "_") for t in tokens)]
+    pick_l = [l for l in lookups if l in tokens]
+    unknown = [t for t in tokens if not any(s == t or s.startswith(t + "_") for s in stages) and t not in lookups]
+    if unknown:
+        raise SystemExit(f"Unknown benchmark(s): {', '.join(unknown)}; "
+                         f"stages: {', '.join(stages)}; lookups: {', '.join(lookups)}")
+    # A lookup reads what the stages write, so keep every stage when any lookup is picked
+    return (stages if pick_l else pick_s), pick_l
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the ETL stages and lookups on scaled synthetic corpora")
+    ap.add_argument("--scales", default="1,10,100", help="comma-separated corpus multipliers (default: 1,10,100)")
+    ap.add_argument("--only", help="comma-separated stage prefixes / lookup names, e.g. 01,04a,pinyin")
+    ap.add_argument("--work", type=pathlib.Path, default=WORK, help=f"scratch directory (default: {WORK})")
+    ap.add_argument("--baseline", type=pathlib.Path, default=BASELINE, help="baseline JSON to compare with")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / growth (default: 0.25 = 25%%)")
+    ap.add_argument("--repeat", type=int, default=3,
+                    help=f"runs per benchmark that takes under {REPEAT_BELOW:g}s; the best is kept (default: 3)")
+    ap.add_argument("--save-baseline", action="store_true", help="write the results to --baseline instead of comparing")
+    ap.add_argument("--json", type=pathlib.Path, help="also write the results here")
+    ap.add_argument("--lookup", help=argparse.SUPPRESS)
+    ap.add_argument("--corpus", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--root", type=pathlib.Path, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.lookup:
+        sys.path.insert(0, str(args.root / "etl"))
+        rows, wall = LOOKUPS[args.lookup][0](args.root)
+        print(json.dumps({"rows": rows, "wall_s": wall}))
+        return
+    if args.corpus:
+        build_corpus(args.root, args.corpus)
+        return
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    stages, lookups = selected(args.only)
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")).get("results", {})
+
+    results = {}
+    t_all = time.perf_counter()
+    for scale in scales:
+        root = args.work / f"x{scale}"
+        print(f"== x{scale}: corpus in {root}")
+        # In a child: under vfork the parent's RSS high-water mark carries over
+        # into every child's ru_maxrss, so this process has to stay small
+        subprocess.run([sys.executable, str(pathlib.Path(__file__).resolve()), "--corpus", str(scale),
+                        "--root", str(root)], check=True)
+        prepare_root(root)
+        for kind, names, fn in (("stage", stages, bench_stage), ("lookup", lookups, bench_lookup)):
+            for name in names:
+                key = f"x{scale}/{name}"
+                res = results[key] = fn(root, name, args.repeat)
+                print(f"  {kind:6} {name:26} {_fmt(res, baseline.get(key))}")
+                if res["status"] == "failed":
+                    print("    " + res["output"].strip().replace("\n", "\n    "))
+    print(f"Done in {time.perf_counter() - t_all:.1f}s")
+
+    for res in results.values():
+        res.pop("output", None)
+        if res.get("rows") and res.get("wall_s"):
+            res["rows_per_s"] = res["rows"] / res["wall_s"]
+    doc = {"python": sys.version.split()[0], "platform": sys.platform, "threshold": args.threshold,
+           "results": results}
+    if args.json:
+        args.json.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        if args.baseline.exists():
+            # Keep entries for scales / benchmarks this run didn't cover
+            old = json.loads(args.baseline.read_text(encoding="utf-8")).get("results", {})
+            doc["results"] = {**old, **results}
+        args.baseline.write_text(json.dumps(doc, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    failed = [k for k, r in results.items() if r["status"] == "failed"]
+    regressions = compare(results, baseline, args.threshold)
+    for key, metric, b, c in regressions:
+        print(f"REGRESSION {key} {metric}: {b:.2f} -> {c:.2f} ({c / b - 1:+.0%})")
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+    if failed or regressions:
+        print(f"{len(failed)} failed, {len(regressions)} regression(s) past {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
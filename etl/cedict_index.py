@@ -0,0 +1,165 @@
+# etl/cedict_index.py
+# CC-CEDICT compiled once into SQLite so lookups don't re-parse the 3.9 MB gz.
+#
+# Entries are indexed by simplified, traditional and a tone-normalized pinyin
+# key. The key is the lowercase letters with ü as v, then "|" and the sequence
+# of non-neutral tones. Both spellings land on it:
+#   CEDICT "ai4 ren5"  -> "airen|4"        HSK "àiren" -> "airen|4"
+#   CEDICT "lu:4"      -> "lv|4"           HSK "lǜ"    -> "lv|4"
+# so an HSK row's Pinyin picks the matching heteronym (行 háng vs 行 xíng).
+#
+#   python etl/cedict_index.py 行 háng
+import gzip, os, pathlib, re, sqlite3, sys, unicodedata
+from collections import namedtuple
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+CEDICT_GZ = ROOT / "_cleanup" / "cedict_1_0_ts_utf-8_mdbg.txt.gz"
+CEDICT_DB = ROOT / "data" / "processed" / "cedict.sqlite"
+
+Entry = namedtuple("Entry", "trad simp pinyin english")
+
+LINE_RE = re.compile(r"^(\S+) (\S+) \[(.*?)\] /(.*)/")
+# Combining marks left after NFD -> tone number
+TONE_MARKS = {"̄": "1", "́": "2", "̌": "3", "̀": "4"}
+DIAERESIS = "̈"
+
+SCHEMA = """
+CREATE TABLE entries (
+    id INTEGER PRIMARY KEY,
+    trad TEXT NOT NULL,
+    simp TEXT NOT NULL,
+    pinyin TEXT NOT NULL,
+    pinyin_key TEXT NOT NULL,
+    toneless TEXT NOT NULL,
+    english TEXT NOT NULL
+);
+CREATE INDEX entries_simp ON entries (simp, pinyin_key);
+CREATE INDEX entries_trad ON entries (trad, pinyin_key);
+CREATE INDEX entries_pinyin ON entries (pinyin_key);
+"""
+
+def numbered_key(py):
+    """CEDICT numbered pinyin ("Hang2", "lu:4", "yi1 dian3 r5") -> key."""
+    letters, tones = [], []
+    for syl in py.lower().replace("u:", "v").split():
+        if syl[-1:] in "12345":
+            if syl[-1] != "5":
+                tones.append(syl[-1])
+            syl = syl[:-1]
+        letters.append(re.sub(r"[^a-z]", "", syl))
+    return "".join(letters) + "|" + "".join(tones)
+
+def marked_key(py):
+    """Tone-mark pinyin ("àiren", "nǚ'ér", "bù kèqì") -> key."""
+    letters, tones = [], []
+    for ch in unicodedata.normalize("NFD", py.lower()):
+        if "a" <= ch <= "z":
+            letters.append(ch)
+        elif ch in TONE_MARKS:
+            tones.append(TONE_MARKS[ch])
+        elif ch == DIAERESIS and letters and letters[-1] == "u":
+            letters[-1] = "v"
+    return "".join(letters) + "|" + "".join(tones)
+
+def pinyin_key(py):
+    # Either spelling; a trailing tone digit marks CEDICT style
+    return numbered_key(py) if re.search(r"[1-5](\s|$)", py) else marked_key(py)
+
+def iter_cedict(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            m = LINE_RE.match(line)
+            if m:
+                trad, simp, py, defs = m.groups()
+                yield Entry(trad, simp, py, ", ".join(defs.split("/")))
+
+def compile_index(src=CEDICT_GZ, dst=CEDICT_DB):
+    """Parse the gz once and write the SQLite index (atomically). Returns the entry count."""
+    dst = pathlib.Path(dst)
+    tmp = dst.with_suffix(".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    con = sqlite3.connect(tmp)
+    con.executescript(SCHEMA)
+    rows = ((e.trad, e.simp, e.pinyin, numbered_key(e.pinyin), numbered_key(e.pinyin).split("|")[0], e.english)
+            for e in iter_cedict(src))
+    con.executemany("INSERT INTO entries (trad, simp, pinyin, pinyin_key, toneless, english) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    n = con.execute("SELECT count(*) FROM entries").fetchone()[0]
+    con.commit()
+    con.execute("VACUUM")
+    con.close()
+    os.replace(tmp, dst)
+    return n
+
+class CedictIndex:
+    """
+        with CedictIndex() as cd:
+            cd.lookup("行", "háng")     -> [Entry(trad='行', simp='行', pinyin='hang2', ...)]
+            cd.definition("行", "xíng") -> "to walk, to go, ..."
+    """
+    def __init__(self, path=CEDICT_DB):
+        self.con = sqlite3.connect(f"file:{pathlib.Path(path).as_posix()}?mode=ro", uri=True)
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _select(self, where, args):
+        cur = self.con.execute(f"SELECT trad, simp, pinyin, english, pinyin_key FROM entries "
+                               f"WHERE {where} ORDER BY id", args)
+        return [(Entry(*r[:4]), r[4]) for r in cur]
+
+    def entries(self, word):
+        """Every entry whose simplified or traditional form is word, in CEDICT order."""
+        return [e for e, _ in self._select("simp = ? OR trad = ?", (word, word))]
+
+    def by_pinyin(self, py):
+        """Every entry read py (either spelling), in CEDICT order."""
+        return [e for e, _ in self._select("pinyin_key = ?", (pinyin_key(py),))]
+
+    def lookup(self, simp, py=None, trad=None):
+        """
+        Entries for simp whose reading matches py. Falls back to a toneless
+        match, then to every entry for the word. Common-noun entries win over
+        capitalised proper-noun ones (行 xíng vs the surname Xing2), and an
+        entry whose traditional form matches trad wins over one that doesn't.
+        """
+        cands = self._select("simp = ?", (simp,)) or (self._select("trad = ?", (trad,)) if trad else [])
+        if py:
+            key = pinyin_key(py)
+            toneless = key.split("|")[0]
+            hits = ([c for c in cands if c[1] == key]
+                    or [c for c in cands if c[1].split("|")[0] == toneless]
+                    or cands)
+        else:
+            hits = cands
+        out = [e for e, _ in hits]
+        out = [e for e in out if not e.pinyin[:1].isupper()] or out
+        if trad:
+            out = [e for e in out if e.trad == trad] or out
+        return out
+
+    def definition(self, simp, py=None, trad=None):
+        return "; ".join(e.english for e in self.lookup(simp, py, trad))
+
+def main():
+    if not CEDICT_DB.exists():
+        print(f"Error: {CEDICT_DB} not found (run etl/04a_compile_cedict.py).")
+        sys.exit(1)
+    if len(sys.argv) < 2:
+        print("usage: python etl/cedict_index.py WORD [PINYIN]")
+        sys.exit(2)
+    with CedictIndex() as cd:
+        for e in cd.lookup(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None):
+            print(f"{e.trad} {e.simp} [{e.pinyin}] {e.english}")
+
+if __name__ == "__main__":
+    main()
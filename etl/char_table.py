@@ -0,0 +1,175 @@
+# etl/char_table.py
+# Binary, code-point-indexed character table (written by 01b_pack_characters.py).
+#
+# Layout (little endian):
+#   header   : magic "HZCT", u16 version, u16 n_blocks, u16 n_cols, u16 pad
+#   columns  : n_cols x (16s name, 1s typecode, 7x pad)
+#   blocks   : n_blocks x (u32 start, u32 length, u64 data_offset)
+#   data     : per block, one array per column of `length` items, each
+#              8-byte aligned; index = ord(ch) - start, 0 = no value
+import mmap, pathlib, struct
+from array import array
+
+MAGIC = b"HZCT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHH")
+COLUMN = struct.Struct("<16sc7x")
+BLOCK = struct.Struct("<IIQ")
+
+# (name, array typecode)
+COLUMNS = [
+    ("radical_no", "B"),
+    ("stroke_count", "B"),
+    ("hsk_char_level", "B"),
+    ("hsk_write_lvl", "B"),
+    ("freq_rank", "I"),
+]
+
+# CJK blocks the table can hold; chars outside them are dropped at pack time
+BLOCKS = [
+    (0x2E80, 0x2EFF),   # CJK Radicals Supplement
+    (0x2F00, 0x2FDF),   # Kangxi Radicals
+    (0x3400, 0x4DBF),   # CJK Ext A
+    (0x4E00, 0x9FFF),   # CJK Unified Ideographs
+    (0xF900, 0xFAFF),   # CJK Compatibility Ideographs
+    (0x20000, 0x2A6DF), # Ext B
+    (0x2A700, 0x2B73F), # Ext C
+    (0x2B740, 0x2B81F), # Ext D
+    (0x2B820, 0x2CEAF), # Ext E
+    (0x2CEB0, 0x2EBEF), # Ext F
+    (0x2EBF0, 0x2EE5F), # Ext I
+    (0x2F800, 0x2FA1F), # CJK Compatibility Ideographs Supplement
+    (0x30000, 0x3134F), # Ext G
+    (0x31350, 0x323AF), # Ext H
+]
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+def write_table(path, rows):
+    """
+    rows: {ch: (radical_no, stroke_count, hsk_char_level, hsk_write_lvl, freq_rank)}
+    with 0 meaning "missing". Each block is trimmed to its first..last used
+    code point so sparse extension blocks stay small.
+    """
+    per_block = []
+    for lo, hi in BLOCKS:
+        cps = [ord(ch) for ch in rows if lo <= ord(ch) <= hi]
+        if cps:
+            per_block.append((min(cps), max(cps) - min(cps) + 1))
+
+    head_len = HEADER.size + COLUMN.size * len(COLUMNS) + BLOCK.size * len(per_block)
+    offset = _align(head_len)
+    block_entries, payload = [], []
+    for start, length in per_block:
+        block_entries.append((start, length, offset))
+        for ci, (_, tc) in enumerate(COLUMNS):
+            col = array(tc, bytes(array(tc).itemsize * length))
+            for i in range(length):
+                vals = rows.get(chr(start + i))
+                if vals:
+                    col[i] = vals[ci]
+            raw = col.tobytes()
+            payload.append((offset, raw))
+            offset = _align(offset + len(raw))
+
+    # Write beside the target and swap it in, so a reader that has the old
+    # table mmapped keeps its pages instead of seeing a truncated file
+    tmp = pathlib.Path(path).with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(block_entries), len(COLUMNS), 0))
+        for name, tc in COLUMNS:
+            f.write(COLUMN.pack(name.encode(), tc.encode()))
+        for entry in block_entries:
+            f.write(BLOCK.pack(*entry))
+        for off, raw in payload:
+            f.write(b"\0" * (off - f.tell()))
+            f.write(raw)
+    tmp.replace(path)
+
+class CharTable:
+    """
+    Memory-mapped reader. Opening only parses the header; columns are
+    memoryview casts straight over the mapping, so there is no parse step
+    and pages are loaded on demand.
+
+        t = CharTable(path)
+        t.lookup("好")          -> {"radical_no": 38, "stroke_count": 6, ...} or None
+        t.lookup_many("你好")   -> {"radical_no": [...], ...}  (numpy arrays if available)
+    """
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_blocks, n_cols, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a character table (magic={magic!r}, version={version})")
+
+        pos = HEADER.size
+        self.columns = []
+        for _ in range(n_cols):
+            name, tc = COLUMN.unpack_from(self._mm, pos)
+            self.columns.append((name.rstrip(b"\0").decode(), tc.decode()))
+            pos += COLUMN.size
+
+        view = memoryview(self._mm)
+        self._blocks = []  # (start, end, {col: memoryview})
+        for _ in range(n_blocks):
+            start, length, off = BLOCK.unpack_from(self._mm, pos)
+            pos += BLOCK.size
+            cols = {}
+            for name, tc in self.columns:
+                size = array(tc).itemsize * length
+                cols[name] = view[off:off + size].cast(tc)
+                off = _align(off + size)
+            self._blocks.append((start, start + length, cols))
+
+    def close(self):
+        self._blocks = []
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _find(self, cp):
+        for start, end, cols in self._blocks:
+            if start <= cp < end:
+                return start, cols
+        return None, None
+
+    def lookup(self, ch):
+        start, cols = self._find(ord(ch))
+        if cols is None:
+            return None
+        i = ord(ch) - start
+        rec = {name: cols[name][i] for name, _ in self.columns}
+        return rec if any(rec.values()) else None
+
+    def lookup_many(self, text):
+        """Column-wise lookup for every char of text; 0 where unknown."""
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+
+        if np is None:
+            out = {name: [] for name, _ in self.columns}
+            for ch in text:
+                start, cols = self._find(ord(ch))
+                for name, _ in self.columns:
+                    out[name].append(cols[name][ord(ch) - start] if cols else 0)
+            return out
+
+        cps = np.fromiter((ord(ch) for ch in text), dtype=np.int64, count=len(text))
+        out = {name: np.zeros(len(cps), dtype=np.dtype(tc)) for name, tc in self.columns}
+        for start, end, cols in self._blocks:
+            hit = (cps >= start) & (cps < end)
+            if not hit.any():
+                continue
+            idx = cps[hit] - start
+            for name, tc in self.columns:
+                out[name][hit] = np.frombuffer(cols[name], dtype=np.dtype(tc))[idx]
+        return out
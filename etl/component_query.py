@@ -0,0 +1,247 @@
+# etl/component_query.py
+# Bitset query engine over the character part graph (character_parts.csv from
+# 02_ccd_to_csv.py, written to disk by 02b_component_bitmaps.py).
+#
+# Every character that has parts gets a dense id, ordered by (stroke count,
+# code point) so a stroke range is one contiguous run of ids. For each
+# component we store the set of characters that contain it at any depth
+# (transitive closure) as a bitmap. In memory a bitmap is a Python int, so
+# AND/OR/NOT run in C; on disk each one is zlib-compressed and only
+# inflated the first time it is queried.
+#
+# Layout (little endian):
+#   header     : magic "HZBM", u16 version, u16 pad, u32 n_chars, u32 n_components
+#   chars      : u32[n_chars] code points in id order
+#   strokes    : u8[n_chars]  stroke count per id (0 = unknown), non-decreasing
+#   directory  : n_components x (u32 code point, u32 length, u64 offset), by code point
+#   bitmaps    : zlib(int.to_bytes(little)) per component
+#
+#   python etl/component_query.py 氵 目 [--any 口 木] [--not 日] [--strokes 5-12]
+import argparse, bisect, csv, mmap, pathlib, struct, time, zlib
+from array import array
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+PARTS_CSV = ROOT / "data" / "processed" / "character_parts.csv"
+CHARS_CSV = ROOT / "data" / "processed" / "characters.csv"
+BITMAPS = ROOT / "data" / "processed" / "component_bitmaps.bin"
+
+MAGIC = b"HZBM"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+DIR_ENTRY = struct.Struct("<IIQ")
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+def load_part_graph(path=PARTS_CSV):
+    """hanzi -> set of direct parts."""
+    parts = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for rec in csv.DictReader(f):
+            ch, part = rec["hanzi"], rec["part_symbol"]
+            if ch and part and ch != part:
+                parts.setdefault(ch, set()).add(part)
+    return parts
+
+def load_stroke_counts(path=CHARS_CSV):
+    strokes = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for rec in csv.DictReader(f):
+            s = rec.get("stroke_count") or ""
+            if s.isdigit():
+                strokes[rec["hanzi"]] = int(s)
+    return strokes
+
+def build_bitmaps(parts, strokes):
+    """
+    -> (chars in id order, stroke counts in id order, {component: bitmap int}).
+    A character's bit is set in the bitmap of every component reachable from
+    it through the part graph.
+    """
+    chars = sorted(parts, key=lambda ch: (min(strokes.get(ch, 0), 255), ord(ch)))
+    ids = {ch: i for i, ch in enumerate(chars)}
+
+    # bitmaps[comp] = every character containing comp at any depth: its direct
+    # parents' bits OR their own bitmaps, over the reversed part graph.
+    # Components on a cycle contain each other and so share one bitmap: walk
+    # the strongly connected components (iterative Tarjan), each finished
+    # after every component it points into.
+    parents = {}
+    for ch, ps in parts.items():
+        for p in ps:
+            parents.setdefault(p, []).append(ch)
+    bitmaps, index, low, stack, on_stack = {}, {}, {}, [], set()
+    for root in parents:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(parents.get(root, ())))]
+        while work:
+            comp, it = work[-1]
+            for ch in it:
+                if ch not in index:
+                    index[ch] = low[ch] = len(index)
+                    stack.append(ch)
+                    on_stack.add(ch)
+                    work.append((ch, iter(parents.get(ch, ()))))
+                    break
+                if ch in on_stack:
+                    low[comp] = min(low[comp], index[ch])
+            else:
+                work.pop()
+                if work:
+                    child = work[-1][0]
+                    low[child] = min(low[child], low[comp])
+                if low[comp] == index[comp]:
+                    component = []
+                    while True:
+                        x = stack.pop()
+                        on_stack.discard(x)
+                        component.append(x)
+                        if x == comp:
+                            break
+                    m = 0
+                    for x in component:
+                        for ch in parents.get(x, ()):
+                            m |= 1 << ids[ch] | bitmaps.get(ch, 0)
+                    for x in component:
+                        bitmaps[x] = m
+    bitmaps = {comp: m for comp, m in bitmaps.items() if m}
+    return chars, [min(strokes.get(ch, 0), 255) for ch in chars], bitmaps
+
+def write_bitmaps(path, chars, stroke_list, bitmaps):
+    n = len(chars)
+    comps = sorted(bitmaps, key=ord)
+    blobs = [zlib.compress(bitmaps[c].to_bytes((bitmaps[c].bit_length() + 7) // 8, "little"), 6) for c in comps]
+
+    chars_off = HEADER.size
+    strokes_off = chars_off + 4 * n
+    dir_off = _align(strokes_off + n)
+    data_off = dir_off + DIR_ENTRY.size * len(comps)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, n, len(comps)))
+        f.write(array("I", [ord(c) for c in chars]).tobytes())
+        f.write(bytes(stroke_list))
+        f.write(b"\0" * (dir_off - f.tell()))
+        pos = data_off
+        for c, blob in zip(comps, blobs):
+            f.write(DIR_ENTRY.pack(ord(c), len(blob), pos))
+            pos += len(blob)
+        for blob in blobs:
+            f.write(blob)
+
+class ComponentIndex:
+    """
+        idx = ComponentIndex(path)
+        idx.query(all_of="氵目", none_of="口", strokes=(5, 12))  -> ["...", ...]
+        idx.containing("氵")                                      -> bitmap int
+    """
+    def __init__(self, path=BITMAPS):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n, n_comps = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a component bitmap file (magic={magic!r}, version={version})")
+        self.n = n
+        self._cps = array("I", self._mm[HEADER.size:HEADER.size + 4 * n])
+        strokes_off = HEADER.size + 4 * n
+        self._strokes = self._mm[strokes_off:strokes_off + n]
+        self._dir_off = _align(strokes_off + n)
+        self._n_comps = n_comps
+        self._dir_cps = array("I", (DIR_ENTRY.unpack_from(self._mm, self._dir_off + DIR_ENTRY.size * i)[0]
+                                    for i in range(n_comps)))
+        self._cache = {}
+        self.all = (1 << n) - 1
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def containing(self, comp):
+        """Bitmap of characters containing comp at any depth (0 if none)."""
+        m = self._cache.get(comp)
+        if m is not None:
+            return m
+        if not isinstance(comp, str) or len(comp) != 1:
+            raise ValueError(f"component must be a single character, got {comp!r}")
+        cp = ord(comp)
+        i = bisect.bisect_left(self._dir_cps, cp)
+        m = 0
+        if i < self._n_comps and self._dir_cps[i] == cp:
+            _, length, off = DIR_ENTRY.unpack_from(self._mm, self._dir_off + DIR_ENTRY.size * i)
+            m = int.from_bytes(zlib.decompress(self._mm[off:off + length]), "little")
+        self._cache[comp] = m
+        return m
+
+    def stroke_mask(self, lo=None, hi=None):
+        # ids are sorted by stroke count, so the range is one contiguous run
+        start = bisect.bisect_left(self._strokes, lo) if lo is not None else 0
+        end = bisect.bisect_right(self._strokes, hi) if hi is not None else self.n
+        return ((1 << end) - 1) ^ ((1 << start) - 1)
+
+    def bitmap(self, all_of=(), any_of=(), none_of=(), strokes=None):
+        m = self.all
+        for c in all_of:
+            m &= self.containing(c)
+        if any_of:
+            either = 0
+            for c in any_of:
+                either |= self.containing(c)
+            m &= either
+        for c in none_of:
+            m &= ~self.containing(c)
+        if strokes:
+            m &= self.stroke_mask(*strokes)
+        return m
+
+    def chars(self, m):
+        # Byte by byte: clearing bits in m itself copies the whole int each time
+        out, cps = [], self._cps
+        for i, byte in enumerate(m.to_bytes((m.bit_length() + 7) // 8, "little")):
+            base = i * 8
+            while byte:
+                low = byte & -byte
+                out.append(chr(cps[base + low.bit_length() - 1]))
+                byte ^= low
+        return out
+
+    def query(self, all_of=(), any_of=(), none_of=(), strokes=None):
+        """Characters (fewest strokes first) matching the component expression."""
+        return self.chars(self.bitmap(all_of, any_of, none_of, strokes))
+
+def parse_range(s):
+    lo, _, hi = s.partition("-")
+    return (int(lo) if lo else None, int(hi) if hi else (int(lo) if not _ else None))
+
+def main():
+    ap = argparse.ArgumentParser(description="Find characters by the components they contain")
+    ap.add_argument("all_of", nargs="*", help="components that must all be present (AND)")
+    ap.add_argument("--any", nargs="*", default=[], help="at least one of these (OR)")
+    ap.add_argument("--not", dest="none_of", nargs="*", default=[], help="none of these (NOT)")
+    ap.add_argument("--strokes", type=parse_range, help="stroke range, e.g. 5-12, 8, 10-")
+    args = ap.parse_args()
+
+    # "氵目" and "氵 目" alike: every character is one component
+    all_of, any_of, none_of = ("".join(a) for a in (args.all_of, args.any, args.none_of))
+    with ComponentIndex() as idx:
+        t0 = time.perf_counter()
+        m = idx.bitmap(all_of, any_of, none_of, args.strokes)
+        cold_us = (time.perf_counter() - t0) * 1e6
+        t0 = time.perf_counter()
+        m = idx.bitmap(all_of, any_of, none_of, args.strokes)
+        warm_us = (time.perf_counter() - t0) * 1e6
+        result = idx.chars(m)
+    print("".join(result))
+    print(f"{len(result)} characters; query {cold_us:.0f} us cold, {warm_us:.1f} us warm")
+
+if __name__ == "__main__":
+    main()
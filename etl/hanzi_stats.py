@@ -0,0 +1,240 @@
+# etl/hanzi_stats.py
+# Columnar analytics over Make Me a Hanzi's dictionary.txt (replaces the
+# Python 2 makemeahanzi/stats.py, which now calls into this module).
+#
+# dictionary.txt is parsed once into one NumPy array per field, one row per
+# entry in file order:
+#   char            code point
+#   etym_type       0 none, then ETYM_TYPES
+#   phonetic/semantic  etymology component ids (0 = none)
+#   phonetic_row/semantic_row  row of that component in this table (-1 = not in the dictionary)
+#   strokes         len(matches)
+#   op              top-level IDS operator, index into OPERATORS (0 = none)
+#   part1..part3    component ids of the top-level IDS children that are single
+#                   characters (0 = subtree / absent)
+#   radical         code point
+#   hsk_level       lowest HSK 3.0 level of any word in HSK_all_merged.tsv
+#                   using the character (7-9 -> 7, 0 = none)
+# Component ids index the `components` string column; etymology components
+# can be several characters long (e.g. a phonetic of two characters).
+# The arrays are cached in data/processed/hanzi_stats.npz and rebuilt only
+# when dictionary.txt or the HSK list change. Reports are group-bys over
+# the arrays; add one to REPORTS to get it on the command line.
+#
+#   python etl/hanzi_stats.py                      # left_right + strokes, as stats.py printed
+#   python etl/hanzi_stats.py phonetic_series hsk_etymology
+#   python etl/hanzi_stats.py --all --rebuild
+import argparse, csv, json, os, pathlib
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DICT_PATHS = [
+    ROOT / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt",
+    ROOT / "backend" / "data" / "30_strokes" / "makemeahanzi" / "dictionary.txt",
+]
+HSK_TSV = ROOT / "data" / "00_hsk" / "HSK_all_merged.tsv"
+SNAPSHOT = ROOT / "data" / "processed" / "hanzi_stats.npz"
+SNAPSHOT_VERSION = 1
+
+ETYM_TYPES = ("ideographic", "pictographic", "pictophonetic")
+# IDS operator -> number of children
+OPERATORS = {
+    '⿰': 2, '⿱': 2, '⿲': 3, '⿳': 3, '⿴': 2, '⿵': 2,
+    '⿶': 2, '⿷': 2, '⿸': 2, '⿹': 2, '⿺': 2, '⿻': 2,
+}
+OP_CHARS = ("",) + tuple(OPERATORS)
+COLUMNS = ("char", "etym_type", "phonetic", "semantic", "phonetic_row", "semantic_row",
+           "strokes", "op", "part1", "part2", "part3", "radical", "hsk_level", "components")
+
+def default_dictionary():
+    for p in DICT_PATHS:
+        if p.exists():
+            return p
+    return DICT_PATHS[0]
+
+def _skip(s, i):
+    # Index just past the IDS node starting at s[i]
+    if i >= len(s):
+        return i
+    n = OPERATORS.get(s[i])
+    i += 1
+    for _ in range(n or 0):
+        i = _skip(s, i)
+    return i
+
+def top_level(decomp):
+    """'⿰亻⿱⺈小' -> ('⿰', ['亻', None]); children that are subtrees come back as None."""
+    if not decomp or decomp[0] not in OPERATORS:
+        return "", []
+    parts, i = [], 1
+    for _ in range(OPERATORS[decomp[0]]):
+        j = _skip(decomp, i)
+        parts.append(decomp[i] if j == i + 1 else None)
+        i = j
+    return decomp[0], parts
+
+# -- Build / snapshot --------------------------------------------------------
+
+def parse_dictionary(path):
+    """One streaming pass over dictionary.txt -> {column: np.ndarray}."""
+    type_ids = {t: i + 1 for i, t in enumerate(ETYM_TYPES)}
+    op_ids = {op: i for i, op in enumerate(OP_CHARS)}
+    vocab = {"": 0}
+    comp = lambda s: vocab.setdefault(s or "", len(vocab))
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            d = json.loads(line)
+            ety = d.get("etymology") or {}
+            op, parts = top_level(d.get("decomposition", ""))
+            parts = (parts + [None, None, None])[:3]
+            rows.append((
+                ord(d["character"]), type_ids.get(ety.get("type"), 0),
+                comp(ety.get("phonetic")), comp(ety.get("semantic")),
+                len(d.get("matches") or ()), op_ids[op],
+                comp(parts[0]), comp(parts[1]), comp(parts[2]),
+                ord(d["radical"][0]) if d.get("radical") else 0,
+            ))
+    a = np.array(rows, dtype=np.int64).reshape(-1, 10)
+    cols = {
+        "char": a[:, 0].astype(np.uint32), "etym_type": a[:, 1].astype(np.uint8),
+        "phonetic": a[:, 2].astype(np.int32), "semantic": a[:, 3].astype(np.int32),
+        "strokes": a[:, 4].astype(np.uint16), "op": a[:, 5].astype(np.uint8),
+        "part1": a[:, 6].astype(np.int32), "part2": a[:, 7].astype(np.int32),
+        "part3": a[:, 8].astype(np.int32), "radical": a[:, 9].astype(np.uint32),
+        "components": np.array(list(vocab), dtype=str),
+    }
+    # component id -> dictionary row (-1 unless the component is itself an entry)
+    row_of = {ch: i for i, ch in enumerate(map(chr, cols["char"].tolist()))}
+    comp_row = np.array([row_of.get(name, -1) for name in vocab], dtype=np.int32)
+    comp_row[0] = -1
+    for name in ("phonetic", "semantic"):
+        cols[name + "_row"] = comp_row[cols[name]]
+    cols["hsk_level"] = hsk_levels(cols["char"])
+    return cols
+
+def hsk_levels(chars):
+    level = {}
+    if HSK_TSV.exists():
+        with open(HSK_TSV, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                lvl = (row.get("Level") or "").split("-")[0]
+                if not lvl.isdigit():
+                    continue
+                for ch in row.get("Simplified", "").replace("|", ""):
+                    level[ch] = min(level.get(ch, 99), int(lvl))
+    return np.array([level.get(chr(cp), 0) for cp in chars.tolist()], dtype=np.uint8)
+
+def _source_stamp(paths):
+    return np.array([[os.stat(p).st_size, os.stat(p).st_mtime_ns] if p.exists() else [0, 0] for p in paths],
+                    dtype=np.int64)
+
+def load(dict_path=None, snapshot=SNAPSHOT, rebuild=False):
+    """Columns from the snapshot, re-parsing dictionary.txt only if a source changed."""
+    dict_path = pathlib.Path(dict_path or default_dictionary())
+    stamp = _source_stamp([dict_path, HSK_TSV])
+    if not rebuild and snapshot.exists():
+        with np.load(snapshot) as z:
+            if int(z["version"]) == SNAPSHOT_VERSION and np.array_equal(z["stamp"], stamp):
+                return {c: z[c] for c in COLUMNS}
+    cols = parse_dictionary(dict_path)
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    tmp = snapshot.with_suffix(".tmp.npz")
+    np.savez(tmp, version=SNAPSHOT_VERSION, stamp=stamp, **cols)
+    os.replace(tmp, snapshot)
+    return cols
+
+# -- Reports -----------------------------------------------------------------
+# Each takes the column dict and prints; stats.py's two analyses come first
+# with their original output lines.
+
+def _type_id(name):
+    return ETYM_TYPES.index(name) + 1
+
+def left_right(c):
+    # Pictophonetic ⿰ characters with two single-character halves: which side is phonetic?
+    mask = (c["etym_type"] == _type_id("pictophonetic")) & (c["op"] == OP_CHARS.index("⿰")) \
+        & (c["part1"] != 0) & (c["part2"] != 0)
+    ph = c["phonetic"][mask]
+    total = int(mask.sum())
+    left = int((ph == c["part1"][mask]).sum())
+    right = int((ph == c["part2"][mask]).sum())
+    print("(total, left, right):", (total, left, right))
+
+def strokes(c):
+    # Phonetic vs semantic component stroke counts, where both are in the dictionary
+    mask = (c["phonetic_row"] >= 0) & (c["semantic_row"] >= 0)
+    ps = c["strokes"][c["phonetic_row"][mask]].astype(np.int64)
+    ss = c["strokes"][c["semantic_row"][mask]].astype(np.int64)
+    total = int(mask.sum())
+    counts = np.bincount(np.sign(ps - ss) + 1, minlength=3)
+    mean = lambda x: 1.0 * x / total
+    print("(total, counts, phonetic_mean, semantic_mean):", (
+        total, [mean(int(x)) for x in counts], mean(int(ps.sum())), mean(int(ss.sum()))))
+
+def phonetic_series(c, top=20):
+    # Phonetic components by the number of characters built on them
+    ph = c["phonetic"][c["phonetic"] != 0]
+    comps, counts = np.unique(ph, return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:top]
+    print(f"phonetic series: {len(comps)} components over {len(ph)} characters")
+    for i in order:
+        members = c["char"][c["phonetic"] == comps[i]]
+        sample = "".join(map(chr, members[:12].tolist()))
+        print(f"  {c['components'][comps[i]]} {counts[i]:4}  {sample}{'…' if len(members) > 12 else ''}")
+
+def hsk_etymology(c):
+    # Etymology type mix per HSK character level
+    levels = c["hsk_level"].astype(np.int64)
+    n_types = len(ETYM_TYPES) + 1
+    grid = np.bincount(levels * n_types + c["etym_type"], minlength=(levels.max() + 1) * n_types)
+    grid = grid.reshape(-1, n_types)
+    names = ("none",) + ETYM_TYPES
+    print("level " + " ".join(f"{n:>15}" for n in names) + f" {'total':>7}")
+    for lvl in range(1, len(grid)):
+        row = grid[lvl]
+        if row.sum() == 0:
+            continue
+        cells = " ".join(f"{v:6} ({v / row.sum():5.1%})" for v in row)
+        print(f"{lvl:5} {cells} {row.sum():7}")
+
+def stroke_distribution(c):
+    # Stroke count percentiles per etymology type
+    names = ("none",) + ETYM_TYPES
+    print(f"{'type':14} {'chars':>6} {'mean':>6} {'p10':>4} {'p50':>4} {'p90':>4}")
+    for t, name in enumerate(names):
+        s = c["strokes"][c["etym_type"] == t]
+        if len(s):
+            p10, p50, p90 = np.percentile(s, [10, 50, 90])
+            print(f"{name:14} {len(s):6} {s.mean():6.2f} {p10:4.0f} {p50:4.0f} {p90:4.0f}")
+
+REPORTS = {
+    "left_right": left_right,
+    "strokes": strokes,
+    "phonetic_series": phonetic_series,
+    "hsk_etymology": hsk_etymology,
+    "stroke_distribution": stroke_distribution,
+}
+DEFAULT_REPORTS = ("left_right", "strokes")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Group-by reports over Make Me a Hanzi's dictionary.txt")
+    ap.add_argument("reports", nargs="*", help=f"any of: {', '.join(REPORTS)} (default: {' '.join(DEFAULT_REPORTS)})")
+    ap.add_argument("--all", action="store_true", help="run every report")
+    ap.add_argument("--dict", help="path to dictionary.txt")
+    ap.add_argument("--rebuild", action="store_true", help="re-parse dictionary.txt even if the snapshot is current")
+    args = ap.parse_args(argv)
+    names = list(REPORTS) if args.all else (args.reports or list(DEFAULT_REPORTS))
+    unknown = [n for n in names if n not in REPORTS]
+    if unknown:
+        ap.error(f"unknown report(s): {', '.join(unknown)}")
+    cols = load(args.dict, rebuild=args.rebuild)
+    for n in names:
+        REPORTS[n](cols)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# etl/load_stage_tables.py
+# Bulk load of the processed CSVs into the stage_* tables (exports/schema.sql).
+#
+# Each source file is streamed once: header BOM / quotes stripped, values
+# typed, empty fields -> NULL. Rows go into a temporary staging table
+# (COPY ... FROM STDIN on PostgreSQL, executemany on SQLite) and are merged
+# into the real table set-based, in the same transaction:
+#   - keyed tables (stage_characters, stage_readings): upsert changed rows,
+#     delete rows that disappeared;
+#   - keyless tables (stage_parts, stage_hsk): contents swapped wholesale.
+# The tables are never renamed, so mv_character_components (which depends on
+# stage_parts) stays valid; it is refreshed after stage_parts loads.
+#
+#   python etl/load_stage_tables.py                   # PostgreSQL via DATABASE_URL / DB_* env
+#   python etl/load_stage_tables.py --sqlite stage.db
+#   python etl/load_stage_tables.py --only parts,hsk
+import argparse, csv, io, os, pathlib, sqlite3, sys, time
+from collections import namedtuple
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+PROCESSED = ROOT / "data" / "processed"
+
+Column = namedtuple("Column", "name source type")  # type: "text" | "integer"
+Table = namedtuple("Table", "name path delimiter columns key refresh")
+
+def _level(s):
+    # HSK "7-9" -> 7
+    s = s.split("-")[0]
+    return int(s) if s.isdigit() else None
+
+TABLES = [
+    Table("stage_characters", PROCESSED / "characters_slim.csv", ",",
+          [Column("hanzi", "hanzi", "text"), Column("stroke_count", "stroke_count", "integer")],
+          key=("hanzi",), refresh=()),
+    Table("stage_parts", PROCESSED / "character_parts.csv", ",",
+          [Column("hanzi", "hanzi", "text"), Column("part_symbol", "part_symbol", "text"),
+           Column("relation", "relation", "text"), Column("position", "position", "integer")],
+          key=None, refresh=("mv_character_components",)),
+    Table("stage_readings", PROCESSED / "readings_slim.csv", ",",
+          [Column("hanzi", "hanzi", "text"), Column("pinyin", "pinyin", "text"),
+           Column("english_definition", "english_definition", "text")],
+          key=("hanzi",), refresh=()),
+    Table("stage_hsk", ROOT / "data" / "00_hsk" / "HSK_all_merged.tsv", "\t",
+          [Column("value", "Simplified", "text"), Column("pinyin", "Pinyin", "text"),
+           Column("english_definition", "English", "text"), Column("hsk_level", "Level", "level")],
+          key=None, refresh=()),
+]
+
+CONVERT = {
+    "text": lambda s: s,
+    "integer": lambda s: int(s) if s.lstrip("-").isdigit() else None,
+    "level": _level,
+}
+
+def normalize_header(name):
+    # '\ufeff"hanzi"' / ' hanzi ' -> 'hanzi'
+    return name.lstrip("\ufeff").strip().strip('"').strip()
+
+def iter_rows(table):
+    """Typed tuples in table column order; empty -> None, rows missing a key skipped."""
+    with open(table.path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter=table.delimiter)
+        header = [normalize_header(h) for h in next(reader)]
+        missing = [c.source for c in table.columns if c.source not in header]
+        if missing:
+            raise ValueError(f"{table.path}: missing column(s) {', '.join(missing)}")
+        picks = [(header.index(c.source), CONVERT[c.type]) for c in table.columns]
+        key_idx = [i for i, c in enumerate(table.columns) if table.key and c.name in table.key]
+        for rec in reader:
+            if not rec:
+                continue
+            row = []
+            for i, conv in picks:
+                v = rec[i].strip() if i < len(rec) else ""
+                row.append(conv(v) if v else None)
+            row = tuple(row)
+            if any(row[k] is None for k in key_idx):
+                continue
+            yield row
+
+# -- PostgreSQL -----------------------------------------------------------
+
+def _copy_escape(v):
+    if v is None:
+        return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def copy_chunks(rows, chunk_rows=5000):
+    """COPY text-format chunks for a row stream."""
+    buf = []
+    for row in rows:
+        buf.append("\t".join(map(_copy_escape, row)))
+        if len(buf) >= chunk_rows:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    if buf:
+        yield "\n".join(buf) + "\n"
+
+class _ChunkReader(io.TextIOBase):
+    # File-like view over a chunk generator, for psycopg2's copy_expert
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buf = ""
+    def readable(self):
+        return True
+    def read(self, size=-1):
+        while size < 0 or len(self._buf) < size:
+            nxt = next(self._chunks, None)
+            if nxt is None:
+                break
+            self._buf += nxt
+        if size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+class PostgresTarget:
+    def __init__(self, dsn):
+        try:
+            import psycopg
+            self.con = psycopg.connect(dsn)
+            self._v3 = True
+        except ImportError:
+            import psycopg2
+            self.con = psycopg2.connect(dsn)
+            self._v3 = False
+
+    def _copy(self, cur, sql, rows):
+        if self._v3:
+            with cur.copy(sql) as cp:
+                for chunk in copy_chunks(rows):
+                    cp.write(chunk)
+        else:
+            cur.copy_expert(sql, _ChunkReader(copy_chunks(rows)))
+
+    def load(self, table, rows):
+        cols = [c.name for c in table.columns]
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        with self.con.cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE _load (LIKE public.{table.name} INCLUDING DEFAULTS) ON COMMIT DROP")
+            self._copy(cur, f"COPY _load ({col_list}) FROM STDIN", rows)
+            cur.execute("SELECT count(*) FROM _load")
+            n = cur.fetchone()[0]
+            if table.key:
+                keys = ", ".join(f'"{k}"' for k in table.key)
+                rest = [c for c in cols if c not in table.key]
+                sets = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in rest)
+                changed = " OR ".join(f't."{c}" IS DISTINCT FROM EXCLUDED."{c}"' for c in rest)
+                # DISTINCT ON: ON CONFLICT can't touch the same row twice; last line wins
+                cur.execute(f"""
+                    INSERT INTO public.{table.name} AS t ({col_list})
+                    SELECT DISTINCT ON ({keys}) {col_list} FROM _load ORDER BY {keys}, ctid DESC
+                    ON CONFLICT ({keys}) DO UPDATE SET {sets} WHERE {changed}""")
+                match = " AND ".join(f'l."{k}" = t."{k}"' for k in table.key)
+                cur.execute(f"DELETE FROM public.{table.name} t WHERE NOT EXISTS (SELECT 1 FROM _load l WHERE {match})")
+            else:
+                cur.execute(f"DELETE FROM public.{table.name}")
+                cur.execute(f"INSERT INTO public.{table.name} ({col_list}) SELECT {col_list} FROM _load")
+            for view in table.refresh:
+                cur.execute("SELECT 1 FROM pg_matviews WHERE matviewname = %s", (view,))
+                if cur.fetchone():
+                    cur.execute(f"REFRESH MATERIALIZED VIEW public.{view}")
+        self.con.commit()
+        with self.con.cursor() as cur:
+            cur.execute(f"ANALYZE public.{table.name}")
+        self.con.commit()
+        return n
+
+    def close(self):
+        self.con.close()
+
+def dsn_from_env():
+    if os.environ.get("DATABASE_URL"):
+        return os.environ["DATABASE_URL"]
+    parts = {"user": "DB_USER", "host": "DB_HOST", "dbname": "DB_NAME", "password": "DB_PASSWORD", "port": "DB_PORT"}
+    return " ".join(f"{k}={os.environ[v]}" for k, v in parts.items() if os.environ.get(v))
+
+# -- SQLite -----------------------------------------------------------------
+
+class SqliteTarget:
+    def __init__(self, path):
+        self.con = sqlite3.connect(path)
+        self.con.execute("PRAGMA journal_mode = WAL")
+        self.con.execute("PRAGMA synchronous = NORMAL")
+
+    def _ensure(self, table):
+        defs = [f'"{c.name}" {"INTEGER" if c.type != "text" else "TEXT"}'
+                + (" NOT NULL" if table.key and c.name in table.key else "") for c in table.columns]
+        if table.key:
+            defs.append(f"PRIMARY KEY ({', '.join(table.key)})")
+        self.con.execute(f"CREATE TABLE IF NOT EXISTS {table.name} ({', '.join(defs)})")
+
+    def load(self, table, rows):
+        cols = [c.name for c in table.columns]
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        marks = ", ".join("?" for _ in cols)
+        con = self.con
+        self._ensure(table)
+        with con:
+            con.execute("DROP TABLE IF EXISTS temp._load")
+            con.execute(f"CREATE TEMP TABLE _load ({col_list})")
+            con.executemany(f"INSERT INTO _load VALUES ({marks})", rows)
+            n = con.execute("SELECT count(*) FROM _load").fetchone()[0]
+            if table.key:
+                keys = ", ".join(f'"{k}"' for k in table.key)
+                con.execute(f"CREATE INDEX temp._load_key ON _load ({keys})")
+                rest = [c for c in cols if c not in table.key]
+                sets = ", ".join(f'"{c}" = excluded."{c}"' for c in rest)
+                changed = " OR ".join(f'{table.name}."{c}" IS NOT excluded."{c}"' for c in rest)
+                # WHERE true disambiguates the upsert clause from a join
+                con.execute(f"""
+                    INSERT INTO {table.name} ({col_list}) SELECT {col_list} FROM _load WHERE true
+                    ON CONFLICT ({keys}) DO UPDATE SET {sets} WHERE {changed}""")
+                match = " AND ".join(f'l."{k}" = {table.name}."{k}"' for k in table.key)
+                con.execute(f"DELETE FROM {table.name} WHERE NOT EXISTS (SELECT 1 FROM _load l WHERE {match})")
+            else:
+                con.execute(f"DELETE FROM {table.name}")
+                con.execute(f"INSERT INTO {table.name} ({col_list}) SELECT {col_list} FROM _load")
+            con.execute("DROP TABLE temp._load")
+        return n
+
+    def close(self):
+        self.con.close()
+
+def select_tables(only):
+    if not only:
+        return TABLES
+    want = {t.strip() for t in only.split(",") if t.strip()}
+    picked = [t for t in TABLES if t.name in want or t.name.removeprefix("stage_") in want]
+    if len(picked) != len(want):
+        raise SystemExit(f"Unknown table in {only!r}; choose from: {', '.join(t.name for t in TABLES)}")
+    return picked
+
+def main():
+    ap = argparse.ArgumentParser(description="Bulk load the processed CSVs into the stage_* tables")
+    ap.add_argument("--dsn", help="PostgreSQL DSN (default: DATABASE_URL or DB_* env, as the backend uses)")
+    ap.add_argument("--sqlite", help="load into this SQLite file instead of PostgreSQL")
+    ap.add_argument("--only", help="comma-separated tables, e.g. parts,hsk")
+    args = ap.parse_args()
+
+    tables = select_tables(args.only)
+    for t in tables:
+        if not t.path.exists():
+            print(f"Error: {t.path} not found.")
+            sys.exit(1)
+
+    target = SqliteTarget(args.sqlite) if args.sqlite else PostgresTarget(args.dsn or dsn_from_env())
+    t_all = time.perf_counter()
+    try:
+        for t in tables:
+            t0 = time.perf_counter()
+            n = target.load(t, iter_rows(t))
+            dt = time.perf_counter() - t0
+            print(f"{t.name:17} {n:7} rows in {dt:5.2f}s ({n / dt if dt else 0:,.0f} rows/sec) <- {t.path.relative_to(ROOT)}")
+    finally:
+        target.close()
+    print(f"Loaded {len(tables)} tables in {time.perf_counter() - t_all:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# etl/manifest.py
+# Content-hash manifest so ETL stages can skip work when nothing changed.
+#
+# Each stage records, in data/processed/.manifest/<stage>.json, its version
+# plus a content hash of every input and output. A stage is up to date when:
+#   - its version matches,
+#   - every input hashes the same as when it last ran (for a file the stage
+#     rewrites in place, e.g. 03b/04b, the input is compared against the
+#     stage's own recorded output),
+#   - every output still matches the newest hash any stage recorded for it
+#     (so a later in-place rewrite doesn't make the earlier stage stale).
+# Hashing is skipped when (size, mtime) are unchanged since the last record,
+# which keeps a no-op check over the 9.5k stroke JSONs to a stat walk.
+import hashlib, json, os, pathlib, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+MANIFEST_DIR = ROOT / "data" / "processed" / ".manifest"
+
+def _key(path):
+    p = pathlib.Path(path).resolve()
+    try:
+        return p.relative_to(ROOT).as_posix()
+    except ValueError:
+        return p.as_posix()
+
+def _walk(path):
+    # Sorted (relpath, size, mtime_ns) for every file under a directory
+    out = []
+    # Every entry path starts with the root's, so slicing is enough (relpath per file is not cheap)
+    root_len = len(os.path.join(path, ""))
+    stack = [path]
+    while stack:
+        d = stack.pop()
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.is_file(follow_symlinks=False):
+                    st = e.stat()
+                    out.append((e.path[root_len:].replace(os.sep, "/"), st.st_size, st.st_mtime_ns))
+    out.sort()
+    return out
+
+def _hash_file(path, h=None):
+    h = h or hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h
+
+def _stat_sig(path):
+    if path.is_dir():
+        h = hashlib.blake2b(digest_size=16)
+        for rel, size, mtime in _walk(path):
+            h.update(f"{rel}\0{size}\0{mtime}\n".encode("utf-8"))
+        return "dir:" + h.hexdigest()
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def fingerprint(path, known=None):
+    """
+    {"hash", "stat"} for a file or directory, or None if it doesn't exist.
+    `known` is a previous fingerprint; its hash is reused when stat matches.
+    """
+    path = pathlib.Path(path)
+    if not path.exists():
+        return None
+    stat = _stat_sig(path)
+    if known and known.get("stat") == stat:
+        return {"hash": known["hash"], "stat": stat}
+    if path.is_dir():
+        h = hashlib.blake2b(digest_size=16)
+        for rel, _, _ in _walk(path):
+            h.update(rel.encode("utf-8") + b"\0")
+            _hash_file(path / rel, h)
+        digest = h.hexdigest()
+    else:
+        digest = _hash_file(path).hexdigest()
+    return {"hash": digest, "stat": stat}
+
+def _load_all():
+    records = {}
+    if MANIFEST_DIR.exists():
+        for p in MANIFEST_DIR.glob("*.json"):
+            try:
+                records[p.stem] = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                continue
+    return records
+
+def _latest_outputs(records):
+    # path -> newest fingerprint any stage recorded for it as an output
+    latest = {}
+    for rec in records.values():
+        for k, fp in rec.get("outputs", {}).items():
+            if k not in latest or rec["recorded_at"] > latest[k][0]:
+                latest[k] = (rec["recorded_at"], fp)
+    return {k: fp for k, (_, fp) in latest.items()}
+
+def force_requested():
+    return "--force" in sys.argv
+
+class Stage:
+    """
+        stage = Stage("02_ccd_to_csv", 1, inputs=[SRC], outputs=[out_path])
+        if stage.skip():
+            return
+        ... do the work ...
+        stage.record()
+    """
+    def __init__(self, name, version, inputs, outputs):
+        self.name = name
+        self.version = version
+        self.inputs = [pathlib.Path(p) for p in inputs]
+        self.outputs = [pathlib.Path(p) for p in outputs]
+
+    def is_fresh(self):
+        records = _load_all()
+        rec = records.get(self.name)
+        if not rec or rec.get("version") != self.version:
+            return False
+        latest = _latest_outputs(records)
+        in_keys = [_key(p) for p in self.inputs]
+        out_keys = [_key(p) for p in self.outputs]
+        if sorted(rec.get("inputs", {})) != sorted(in_keys) or sorted(rec.get("outputs", {})) != sorted(out_keys):
+            return False
+
+        for p, k in zip(self.inputs, in_keys):
+            expected = rec["outputs"][k] if k in rec["outputs"] else rec["inputs"][k]
+            if expected is None:
+                if p.exists():
+                    return False
+                continue
+            fp = fingerprint(p, expected)
+            if fp is None or fp["hash"] != expected["hash"]:
+                return False
+        for p, k in zip(self.outputs, out_keys):
+            expected = latest.get(k)
+            fp = fingerprint(p, expected)
+            if fp is None or expected is None or fp["hash"] != expected["hash"]:
+                return False
+        return True
+
+    def skip(self, force=None):
+        """True (and prints why) when the stage can be skipped."""
+        if force is None:
+            force = force_requested()
+        if not force and self.is_fresh():
+            print(f"{self.name}: up to date, skipping (use --force to rebuild)")
+            return True
+        return False
+
+    def record(self):
+        records = _load_all()
+        prev = records.get(self.name, {})
+        latest = _latest_outputs(records)
+        prev_in = prev.get("inputs", {})
+        rec = {
+            "stage": self.name,
+            "version": self.version,
+            "recorded_at": time.time(),
+            "inputs": {},
+            "outputs": {},
+        }
+        for p in self.inputs:
+            k = _key(p)
+            rec["inputs"][k] = fingerprint(p, prev_in.get(k) or latest.get(k))
+        for p in self.outputs:
+            rec["outputs"][_key(p)] = fingerprint(p)
+        MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = MANIFEST_DIR / f"{self.name}.json.tmp"
+        tmp.write_text(json.dumps(rec, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, MANIFEST_DIR / f"{self.name}.json")
@@ -0,0 +1,119 @@
+# etl/metrics.py
+# Per-run instrumentation shared by the ETL stages: wall time per phase
+# (read / parse / transform / write ...), rows in and out, bytes read and
+# written, and peak RSS. Each run overwrites data/processed/.metrics/<stage>.json;
+# pipeline.py folds those into one run-<timestamp>.json. With --profile on the
+# command line the stage runs under cProfile and the stats are dumped next to
+# the metrics as <stage>.prof (`python -m pstats` to browse them).
+#
+#   m = Metrics(stage.name, stage.inputs, stage.outputs)
+#   with m.phase("read"):
+#       rows = load()
+#   m.rows_in = len(rows)
+#   ...
+#   m.write()
+#
+# Straight-line scripts can call m.mark("parse") instead, charging the time
+# since the previous phase ended.
+import cProfile, json, os, pathlib, sys, time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, RSS is reported as null
+    resource = None
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+METRICS_DIR = ROOT / "data" / "processed" / ".metrics"
+
+def profile_requested():
+    return "--profile" in sys.argv
+
+def peak_rss_mb(who=None):
+    """High-water RSS in MB of this process (or RUSAGE_CHILDREN), None where unsupported."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def size_of(path):
+    # Bytes in a file, or in every file under a directory; 0 if missing
+    path = pathlib.Path(path)
+    if path.is_dir():
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+    return path.stat().st_size if path.exists() else 0
+
+def size_of_all(paths):
+    return sum(size_of(p) for p in paths)
+
+class Metrics:
+    def __init__(self, name, inputs=(), outputs=(), profile=None):
+        self.name = name
+        self.inputs = [pathlib.Path(p) for p in inputs]
+        self.outputs = [pathlib.Path(p) for p in outputs]
+        self.rows_in = 0
+        self.rows_out = 0
+        self.phases = {}
+        self.started_at = time.time()
+        self._t0 = self._last = time.perf_counter()
+        self._profiler = None
+        if profile if profile is not None else profile_requested():
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _charge(self, name, seconds):
+        p = self.phases.setdefault(name, {"s": 0.0})
+        p["s"] = round(p["s"] + seconds, 4)
+        p["peak_rss_mb"] = peak_rss_mb()
+        self._last = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block; re-entering a phase name adds to its total."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._charge(name, time.perf_counter() - t0)
+
+    def mark(self, name):
+        """For straight-line scripts: charge the time since the last phase ended to `name`."""
+        self._charge(name, time.perf_counter() - self._last)
+
+    @staticmethod
+    def summary(doc):
+        phases = " | ".join(f"{n} {p['s']:.2f}s" for n, p in doc["phases"].items())
+        rss = doc["peak_rss_mb"]
+        return (f"metrics: {phases or 'no phases'}; {doc['rows_in']:,} -> {doc['rows_out']:,} rows; "
+                f"{doc['bytes_in'] / 1e6:,.1f} MB in" + (f"; peak {rss:,.0f} MB" if rss is not None else ""))
+
+    def write(self, path=None):
+        """Stop the clock (and the profiler), write the metrics JSON and print a one-line summary."""
+        wall = time.perf_counter() - self._t0
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        prof = None
+        if self._profiler:
+            self._profiler.disable()
+            prof = METRICS_DIR / f"{self.name}.prof"
+            self._profiler.dump_stats(prof)
+        doc = {
+            "stage": self.name,
+            "started_at": self.started_at,
+            "wall_s": round(wall, 4),
+            "phases": self.phases,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_s": round(self.rows_in / wall) if wall else None,
+            "bytes_in": size_of_all(self.inputs),
+            "bytes_out": size_of_all(self.outputs),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            "profile": prof.as_posix() if prof else None,
+            "argv": sys.argv[1:],
+        }
+        path = pathlib.Path(path or METRICS_DIR / f"{self.name}.json")
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(doc, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+        print(self.summary(doc))
+        return doc
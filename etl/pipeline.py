@@ -0,0 +1,252 @@
+# etl/pipeline.py
+# Single entry point for the ETL. Each stage declares its inputs and outputs;
+# the dependency graph falls out of which stage produces which file, and
+# independent stages run concurrently, each in its own process.
+#
+#   python etl/pipeline.py                 # everything
+#   python etl/pipeline.py --only 02,05    # just these stages
+#   python etl/pipeline.py --from 03       # 03 and everything downstream of it
+#   python etl/pipeline.py --force -j 4
+#   python etl/pipeline.py --profile       # + cProfile top functions of the slowest stage
+#
+# Each stage writes its phase timings / rows / RSS to data/processed/.metrics/
+# (see metrics.py); a run collects them into .metrics/run-<timestamp>.json.
+import argparse, io, json, pathlib, pstats, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from metrics import METRICS_DIR
+
+ETL = pathlib.Path(__file__).resolve().parent
+ROOT = ETL.parent
+
+HW = "data/30_strokes/hanzi_writer_data"
+PROCESSED = "data/processed"
+HSK_TSV = "data/00_hsk/HSK_all_merged.tsv"
+
+# name -> (inputs, outputs), paths relative to the project root. Keep in step
+# with the Stage(...) declarations inside each script.
+STAGES = {
+    "01_unihan_to_csv": (
+        ["data/10_unihan"],
+        [f"{PROCESSED}/characters.csv", f"{PROCESSED}/readings.csv", f"{PROCESSED}/character_variants.csv"],
+    ),
+    "01a_variant_classes": (
+        [f"{PROCESSED}/character_variants.csv", "_cleanup/cedict_1_0_ts_utf-8_mdbg.txt.gz", f"{PROCESSED}/characters.csv"],
+        [f"{PROCESSED}/variants.bin", f"{PROCESSED}/characters.csv"],
+    ),
+    "01b_pack_characters": ([f"{PROCESSED}/characters.csv"], [f"{PROCESSED}/characters.bin"]),
+    "02_ccd_to_csv": (
+        ["data/20_decomposition"],
+        [f"{PROCESSED}/character_parts.csv", f"{PROCESSED}/character_shapes.csv"],
+    ),
+    "02b_component_bitmaps": (
+        [f"{PROCESSED}/character_parts.csv", f"{PROCESSED}/characters.csv"],
+        [f"{PROCESSED}/component_bitmaps.bin"],
+    ),
+    "03_assets_hanziwriter": ([f"{HW}/data"], [f"{PROCESSED}/entity_assets.csv"]),
+    "03b_rewrite_asset_urls": ([f"{PROCESSED}/entity_assets.csv"], [f"{PROCESSED}/entity_assets.csv"]),
+    "03c_pack_strokes": ([f"{HW}/data"], [f"{PROCESSED}/strokes.bin"]),
+    "04a_compile_cedict": (["_cleanup/cedict_1_0_ts_utf-8_mdbg.txt.gz"], [f"{PROCESSED}/cedict.sqlite"]),
+    "04_merge_hsk": (["_cleanup/hsk30.csv", f"{PROCESSED}/cedict.sqlite"], [HSK_TSV]),
+    "04b_annotate_pinyin": ([HSK_TSV], [HSK_TSV]),
+    "05_generate_component_map": (
+        ["data/30_strokes/makemeahanzi/dictionary.txt"],
+        [f"{PROCESSED}/character_component_map.json", f"{PROCESSED}/component_index.csv"],
+    ),
+    "06_normalize_readings": (
+        [f"{PROCESSED}/readings_slim.csv", f"{PROCESSED}/readings.csv", HSK_TSV, f"{PROCESSED}/cedict.sqlite",
+         "_cleanup/cedict_1_0_ts_utf-8_mdbg.txt.gz"],
+        [f"{PROCESSED}/char_readings.csv", f"{PROCESSED}/reading_index.bin"],
+    ),
+    "07_shape_index": (
+        [f"{PROCESSED}/character_shapes.csv", HSK_TSV, f"{PROCESSED}/cedict.sqlite",
+         "_cleanup/cedict_1_0_ts_utf-8_mdbg.txt.gz"],
+        [f"{PROCESSED}/shape_index.bin"],
+    ),
+}
+
+def _covers(output, path):
+    # An output covers an input if they're the same path or the input is under it
+    return path == output or path.startswith(output + "/")
+
+def build_graph(stages):
+    """
+    name -> set of stage names it depends on. A stage depends on every
+    *earlier* stage (in declaration order) that writes one of its inputs; the
+    ordering rule is what makes in-place rewriters (03 -> 03b) a chain rather
+    than a cycle.
+    """
+    names = list(stages)
+    deps = {n: set() for n in names}
+    for i, name in enumerate(names):
+        inputs, _ = stages[name]
+        for producer in names[:i]:
+            _, outputs = stages[producer]
+            if any(_covers(o, p) for o in outputs for p in inputs):
+                deps[name].add(producer)
+    return deps
+
+def resolve(names, token):
+    # "03b", "03b_rewrite_asset_urls" and "rewrite_asset_urls" all select 03b_rewrite_asset_urls
+    hits = [n for n in names if n == token or n.startswith(token + "_") or n.endswith("_" + token)]
+    if len(hits) != 1:
+        raise SystemExit(f"Unknown or ambiguous stage {token!r}; choose from: {', '.join(names)}")
+    return hits[0]
+
+def downstream(deps, start):
+    out = {start}
+    changed = True
+    while changed:
+        changed = False
+        for n, ds in deps.items():
+            if n not in out and ds & out:
+                out.add(n)
+                changed = True
+    return out
+
+def select(deps, only=None, start=None):
+    names = list(deps)
+    if only:
+        return {resolve(names, t.strip()) for t in only.split(",") if t.strip()}
+    if start:
+        return downstream(deps, resolve(names, start))
+    return set(names)
+
+def run_stage(name, extra_args):
+    script = ETL / f"{name}.py"
+    started = time.time()
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, str(script), *extra_args], cwd=ROOT,
+                          capture_output=True, text=True, encoding="utf-8")
+    elapsed = time.perf_counter() - t0
+    output = proc.stdout + proc.stderr
+    doc = None
+    if proc.returncode != 0:
+        status = "failed"
+    elif ": up to date, skipping" in output:
+        status = "skipped"
+    else:
+        # A stage that did its work wrote its metrics; exiting 0 without them
+        # means it bailed out early, which counts as a failure
+        doc = stage_metrics(name, started)
+        status = "ok" if doc else "no output"
+    return name, status, elapsed, output, doc
+
+def stage_metrics(name, since):
+    # The stage's metrics file, if this run (not an earlier one) wrote it
+    try:
+        doc = json.loads((METRICS_DIR / f"{name}.json").read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    return doc if doc.get("started_at", 0) >= since else None
+
+def slowest_phase(doc):
+    if not doc or not doc.get("phases"):
+        return ""
+    name, p = max(doc["phases"].items(), key=lambda kv: kv[1]["s"])
+    return f"{name} {p['s']:.2f}s"
+
+def print_profile(name, path, top=20):
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).strip_dirs().sort_stats("cumulative").print_stats(top)
+    print(f"\ncProfile of the slowest stage, {name} ({path}):")
+    print(out.getvalue().rstrip())
+
+def critical_path(deps, selected, timings):
+    # Longest chain of measured stage times through the selected subgraph
+    best = {}
+    def finish(n):
+        if n not in best:
+            best[n] = timings.get(n, 0.0) + max((finish(d) for d in deps[n] if d in selected), default=0.0)
+        return best[n]
+    return max((finish(n) for n in selected), default=0.0)
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the ETL stages in dependency order")
+    ap.add_argument("--only", help="comma-separated stages to run (no dependencies pulled in)")
+    ap.add_argument("--from", dest="start", help="run this stage and everything downstream of it")
+    ap.add_argument("-j", "--jobs", type=int, default=4, help="max stages running at once")
+    ap.add_argument("--force", action="store_true", help="pass --force to every stage")
+    ap.add_argument("--profile", action="store_true",
+                    help="run stages under cProfile and print the slowest one's top functions")
+    ap.add_argument("--list", action="store_true", help="print the stage graph and exit")
+    args = ap.parse_args()
+
+    deps = build_graph(STAGES)
+    if args.list:
+        for n, ds in deps.items():
+            print(f"{n:28} <- {', '.join(sorted(ds)) or '-'}")
+        return
+
+    selected = select(deps, args.only, args.start)
+    extra = (["--force"] if args.force else []) + (["--profile"] if args.profile else [])
+    pending = {n: {d for d in deps[n] if d in selected} for n in STAGES if n in selected}
+    timings, statuses, metrics = {}, {}, {}
+    started = time.time()
+    t0 = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        running = {}
+        while pending or running:
+            for n in [n for n, ds in pending.items() if not ds]:
+                del pending[n]
+                running[pool.submit(run_stage, n, extra)] = n
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                del running[fut]
+                name, status, elapsed, output, doc = fut.result()
+                timings[name], statuses[name] = elapsed, status
+                if doc:
+                    metrics[name] = doc
+                print(f"=== {name} [{status}, {elapsed:.2f}s]")
+                if output.strip():
+                    print(output.rstrip())
+                if status in ("failed", "no output"):
+                    # Don't run anything built on a failed stage, directly or not
+                    blocked = {name}
+                    while True:
+                        hit = [n for n, ds in pending.items() if ds & blocked]
+                        if not hit:
+                            break
+                        for n in hit:
+                            del pending[n]
+                            statuses[n] = "blocked"
+                            blocked.add(n)
+                else:
+                    for ds in pending.values():
+                        ds.discard(name)
+
+    wall = time.perf_counter() - t0
+    crit = critical_path(deps, selected, timings)
+    print("\nStage                          status     time   peak RSS  slowest phase")
+    for n in STAGES:
+        if n in statuses:
+            t = f"{timings[n]:7.2f}s" if n in timings else "      -"
+            doc = metrics.get(n) or {}
+            rss = f"{doc['peak_rss_mb']:7.0f} MB" if doc.get("peak_rss_mb") is not None else "        -"
+            print(f"{n:30} {statuses[n]:9} {t} {rss}  {slowest_phase(doc)}")
+    print(f"wall {wall:.2f}s | sum of stages {sum(timings.values()):.2f}s | critical path {crit:.2f}s")
+
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    run_path = METRICS_DIR / f"run-{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}.json"
+    run = {
+        "started_at": started, "wall_s": round(wall, 4), "critical_path_s": round(crit, 4),
+        "jobs": args.jobs, "args": sys.argv[1:],
+        "stages": {n: {"status": statuses[n], "elapsed_s": round(timings[n], 4) if n in timings else None,
+                       "metrics": metrics.get(n)} for n in STAGES if n in statuses},
+    }
+    run_path.write_text(json.dumps(run, indent=1), encoding="utf-8")
+    print(f"metrics: {run_path}")
+
+    if args.profile:
+        profiled = [n for n in metrics if metrics[n].get("profile")]
+        if profiled:
+            slowest = max(profiled, key=lambda n: timings[n])
+            print_profile(slowest, metrics[slowest]["profile"])
+    if any(s in ("failed", "no output", "blocked") for s in statuses.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
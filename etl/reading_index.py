@@ -0,0 +1,445 @@
+# etl/reading_index.py
+# Normalized character readings and the syllable -> tone -> characters reverse
+# index behind homophone drills and pinyin-keyboard input. Stage
+# 06_normalize_readings.py compiles both: data/processed/char_readings.csv and
+# data/processed/reading_index.bin.
+#
+# Readings come from readings.csv (stage 01: kMandarin plus every kHanyuPinyin
+# hit, kCantonese, Japanese and Korean), CEDICT's single-character entries
+# (every heteronym, common-noun readings before surnames) and the tracked
+# readings_slim.csv (one reading per character, tone-marked pinyin and
+# Jyutping sharing the pinyin column). Each distinct reading string is converted once, and np.unique's
+# inverse maps the results back over the rows, so conversion costs scale
+# with the ~2k distinct readings rather than the row count. Rows are then
+# deduplicated per (char, script, reading). A reading is canonical if any
+# of its sources said so.
+#
+# Mandarin readings are stored numbered ("shi2", "lv4", neutral tone 5) with
+# the tone-marked spelling alongside; Cantonese is Jyutping, tones 1-6.
+# Character ids follow frequency order: the lowest HSK level of any word that
+# uses the character, then how many CEDICT headwords use it, then code point.
+# Posting lists are stored sorted by id, so they are already sorted by
+# frequency.
+#
+# Layout (little endian):
+#   header   : magic "HZRI", u16 version, u16 n_scripts, u32 n_chars, 1s id typecode, 3x pad
+#   scripts  : n_scripts x (16s name, u32 n_syllables, u32 syllable bytes, u32 n_postings,
+#                          u32 n_char_slots, u64 offset)
+#   chars    : u32 code point per id; u32 sorted code points; their ids
+#   per script, each array 8-byte aligned:
+#     syllables   "\n"-joined ASCII
+#     offsets     u32 x (n_syllables * 7 + 1); slot = syllable * 7 + tone, tone 0 = any tone
+#     postings    ids, ascending within a slot
+#     char_offs   u32 x (n_chars + 1); id -> its exact-tone slots, canonical first
+#     char_slots  u16
+#
+#   python etl/reading_index.py shi2                # characters read shí, most frequent first
+#   python etl/reading_index.py shí shi --limit 20  # tone marks work too; no tone = any tone
+#   python etl/reading_index.py sik6 --script cantonese
+#   python etl/reading_index.py --homophones 是
+#   python etl/reading_index.py --readings 行
+import argparse, bisect, csv, mmap, pathlib, re, sqlite3, struct, sys, time, unicodedata
+from array import array
+from collections import Counter
+from itertools import chain
+
+from cedict_index import CEDICT_DB, CEDICT_GZ, iter_cedict
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+PROCESSED = ROOT / "data" / "processed"
+READINGS_CSV = PROCESSED / "readings.csv"
+READINGS_SLIM = PROCESSED / "readings_slim.csv"
+CHAR_READINGS = PROCESSED / "char_readings.csv"
+READING_INDEX = PROCESSED / "reading_index.bin"
+
+SCRIPTS = ("mandarin", "cantonese", "japanese_on", "japanese_kun", "korean")
+INDEXED = ("mandarin", "cantonese")  # the tonal scripts
+TONES = 7  # slot 0 = any tone, then 1..6
+FIELDS = ["hanzi", "script", "reading", "marked", "is_canonical"]
+
+MAGIC = b"HZRI"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIc3x")
+SCRIPT = struct.Struct("<16sIIIIQ")
+
+# Combining marks after NFD -> tone, and back
+TONE_MARKS = {"̄": 1, "́": 2, "̌": 3, "̀": 4}
+MARK_FOR = {v: k for k, v in TONE_MARKS.items()}
+DIAERESIS = "̈"
+JYUTPING = re.compile(r"([a-z]+)([1-6])")
+NUMBERED = re.compile(r"([a-zü:]+)([1-5])")
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+# -- Syllables ---------------------------------------------------------------------
+
+def mandarin_split(s, default_tone=5):
+    """
+    Pinyin syllable, either spelling -> (letters, tone); ü is spelled v.
+        "shí" -> ("shi", 2)   "lü4" / "lu:4" / "lǜ" -> ("lv", 4)   "ma" -> ("ma", default_tone)
+    None if there are no letters.
+    """
+    s = s.strip().lower()
+    if not s:
+        return None
+    m = NUMBERED.fullmatch(s)
+    if m:
+        return m.group(1).replace("u:", "v").replace("ü", "v"), int(m.group(2))
+    letters, tone = [], int(s[-1]) if s[-1] in "12345" else default_tone
+    for ch in unicodedata.normalize("NFD", s):
+        if "a" <= ch <= "z":
+            letters.append(ch)
+        elif ch in TONE_MARKS:
+            tone = TONE_MARKS[ch]
+        elif ch == DIAERESIS and letters and letters[-1] == "u":
+            letters[-1] = "v"
+    return ("".join(letters), tone) if letters else None
+
+def mandarin_marked(letters, tone):
+    """("lv", 4) -> "lǜ": the mark goes on a or e, else the o of ou, else the last vowel
+    (m / n in syllabic m, n, ng)."""
+    s = letters.replace("v", "ü")
+    if tone not in MARK_FOR:
+        return s
+    for pick in ("a", "e", "ou"):
+        i = s.find(pick)
+        if i >= 0:
+            break
+    else:
+        i = max(s.rfind(v) for v in "iouü")
+        if i < 0:
+            i = max(s.find("m"), s.find("n"), 0)
+    return unicodedata.normalize("NFC", s[:i + 1] + MARK_FOR[tone] + s[i + 1:])
+
+def convert(script, value):
+    """Raw reading -> (reading, marked), or None if it doesn't parse."""
+    if script == "mandarin":
+        split = mandarin_split(value)
+        if split is None:
+            return None
+        return f"{split[0]}{split[1]}", mandarin_marked(*split)
+    value = value.strip().lower()
+    if script == "cantonese" and not JYUTPING.fullmatch(value):
+        return None
+    return (value, value) if value else None
+
+def split_reading(script, reading):
+    """Normalized reading -> (syllable, tone) for the tonal scripts."""
+    if script == "cantonese":
+        m = JYUTPING.fullmatch(reading)
+        return (m.group(1), int(m.group(2))) if m else None
+    return mandarin_split(reading)
+
+# -- Normalization -----------------------------------------------------------------
+
+def iter_cedict_readings(db=CEDICT_DB, gz=CEDICT_GZ):
+    """(hanzi, pinyin) for single-character CEDICT entries, both scripts, surname readings last."""
+    if pathlib.Path(db).exists():
+        con = sqlite3.connect(f"file:{pathlib.Path(db).as_posix()}?mode=ro", uri=True)
+        try:
+            entries = con.execute("SELECT simp, trad, pinyin FROM entries "
+                                  "WHERE length(simp) = 1 ORDER BY id").fetchall()
+        finally:
+            con.close()
+    else:
+        entries = [(e.simp, e.trad, e.pinyin) for e in iter_cedict(gz) if len(e.simp) == 1]
+    for proper in (False, True):
+        for simp, trad, py in entries:
+            if py[:1].isupper() == proper and " " not in py:
+                yield from ((ch, py) for ch in dict.fromkeys((simp, trad)))
+
+def iter_raw(readings_csv=READINGS_CSV, slim_csv=READINGS_SLIM, cedict_db=CEDICT_DB, cedict_gz=CEDICT_GZ):
+    """(hanzi, script, value, is_canonical) from every source that exists."""
+    if pathlib.Path(readings_csv).exists():
+        with open(readings_csv, "r", encoding="utf-8-sig", newline="") as f:
+            for rec in csv.DictReader(f):
+                if rec["entity_kind"] == "character" and len(rec["key"]) == 1:
+                    # kHanyuPinyin lists heteronyms of one entry with commas
+                    for v in rec["pinyin"].split(","):
+                        yield rec["key"], rec["script"], v, rec["is_canonical"] == "true"
+    if pathlib.Path(cedict_db).exists() or pathlib.Path(cedict_gz).exists():
+        for ch, py in iter_cedict_readings(cedict_db, cedict_gz):
+            yield ch, "mandarin", py, False
+    if pathlib.Path(slim_csv).exists():
+        with open(slim_csv, "r", encoding="utf-8-sig", newline="") as f:
+            for rec in csv.DictReader(f):
+                ch = rec["hanzi"]
+                if len(ch) != 1:
+                    continue
+                for v in rec["pinyin"].split(","):
+                    # The column holds Jyutping for characters without a Mandarin reading
+                    script = "cantonese" if JYUTPING.fullmatch(v.strip()) else "mandarin"
+                    yield ch, script, v, False
+
+def normalize(raw):
+    """
+    -> rows (hanzi, script, reading, marked, is_canonical), deduplicated per
+    (hanzi, script, reading) and sorted by code point, script, canonical
+    first, then first appearance; plus the number of raw rows read.
+    """
+    import numpy as np  # build-time only; the reader and the no-op stage check skip it
+
+    # One pass into typed columns; each distinct (script, value) gets an id and
+    # is converted once, each distinct reading gets an id to group on
+    script_no = {name: k for k, name in enumerate(SCRIPTS)}
+    cps, sid, vid, canon = array("q"), array("q"), array("q"), bytearray()
+    values, n = {}, 0
+    for ch, script, value, is_canonical in raw:
+        n += 1
+        k = script_no.get(script)
+        if k is None:
+            continue
+        cps.append(ord(ch))
+        sid.append(k)
+        vid.append(values.setdefault((k, value), len(values)))
+        canon.append(bool(is_canonical))
+    if not cps:
+        return [], n
+    conv, rid_of, readings = [None] * len(values), np.empty(len(values), dtype=np.int64), {}
+    for (k, value), i in values.items():
+        conv[i] = convert(SCRIPTS[k], value)
+        rid_of[i] = readings.setdefault(conv[i][0], len(readings)) if conv[i] else -1
+    vid = np.frombuffer(vid, dtype=np.int64)
+    rid = rid_of[vid]
+    ok = np.flatnonzero(rid >= 0)
+    cps = np.frombuffer(cps, dtype=np.int64)[ok]
+    sid = np.frombuffer(sid, dtype=np.int64)[ok]
+    vid, rid = vid[ok], rid[ok]
+    canon = np.frombuffer(canon, dtype=np.uint8)[ok].astype(bool)
+
+    key = (cps * len(SCRIPTS) + sid) * max(len(readings), 1) + rid
+    _, first, group = np.unique(key, return_index=True, return_inverse=True)
+    any_canon = np.zeros(len(first), dtype=bool)
+    np.logical_or.at(any_canon, group, canon)
+    order = np.lexsort((first, ~any_canon, sid[first], cps[first]))
+    rows = [(chr(cps[i]), SCRIPTS[sid[i]], *conv[vid[i]], bool(any_canon[g]))
+            for g, i in zip(order, first[order])]
+    return rows, n
+
+def write_rows(path, rows):
+    tmp = pathlib.Path(path).with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as w:
+        cw = csv.writer(w, lineterminator="\n")
+        cw.writerow(FIELDS)
+        for ch, script, reading, marked, canon in rows:
+            cw.writerow([ch, script, reading, marked, "true" if canon else "false"])
+    tmp.replace(path)
+
+def load_rows(path=CHAR_READINGS):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [(r["hanzi"], r["script"], r["reading"], r["marked"], r["is_canonical"] == "true")
+                for r in csv.DictReader(f)]
+
+def frequency_order(chars, hsk_words, cedict_words):
+    """chars sorted most frequent first (see the header comment)."""
+    level = {}
+    for w, lv in hsk_words.items():
+        for ch in w:
+            if lv < level.get(ch, 99):
+                level[ch] = lv
+    usage = Counter(chain.from_iterable(map(set, cedict_words)))
+    return sorted(chars, key=lambda ch: (level.get(ch, 99), -usage[ch], ord(ch)))
+
+# -- Index -------------------------------------------------------------------------
+
+def build_index(path, rows, order):
+    """Write the reverse index for rows (normalized), with character ids in `order`."""
+    import numpy as np
+
+    ids = {ch: i for i, ch in enumerate(order)}
+    n = len(order)
+    tc = "H" if n <= 0xFFFF else "I"
+    cps_by_id = array("I", map(ord, order))
+    sorted_cps = array("I", sorted(cps_by_id))
+    sorted_ids = array("I", (ids[chr(cp)] for cp in sorted_cps))
+
+    sections = []
+    for script in INDEXED:
+        mine = [(ids[ch], r) for ch, s, r, _, _ in rows if s == script and ch in ids]
+        parsed = {r: split_reading(script, r) for r in {r for _, r in mine}}
+        split = [(i, parsed[r]) for i, r in mine if parsed[r]]
+        syllables = sorted({syl for _, (syl, _) in split})
+        sidx = {syl: k for k, syl in enumerate(syllables)}
+        slot = np.array([sidx[syl] * TONES + tone for _, (syl, tone) in split], dtype=np.int64)
+        cid = np.array([i for i, _ in split], dtype=np.int64)
+        # Postings: every exact-tone slot plus the syllable's any-tone slot, CSR by (slot, id)
+        pairs = np.unique(np.concatenate([slot - slot % TONES, slot]) * n + np.concatenate([cid, cid]))
+        p_slot, p_id = pairs // n, pairs % n
+        offsets = np.searchsorted(p_slot, np.arange(len(syllables) * TONES + 1)).astype(np.uint32)
+        # Forward: id -> its slots, in row order (canonical first) by a stable sort
+        fwd = np.argsort(cid, kind="stable")
+        char_offs = np.concatenate([[0], np.cumsum(np.bincount(cid, minlength=n))]).astype(np.uint32)
+        sections.append((script, "\n".join(syllables).encode("ascii"), offsets,
+                         p_id.astype(np.dtype(tc)), char_offs, slot[fwd].astype(np.uint16)))
+
+    head = _align(HEADER.size + SCRIPT.size * len(sections))
+    blobs, pos = [], head
+    def place(data):
+        nonlocal pos
+        data = bytes(data)
+        blobs.append((pos, data))
+        start, pos = pos, _align(pos + len(data))
+        return start
+    for arr in (cps_by_id, sorted_cps, sorted_ids):
+        place(arr)
+    entries = []
+    for script, names, offsets, postings, char_offs, char_slots in sections:
+        start = place(names)
+        for arr in (offsets, postings, char_offs, char_slots):
+            place(arr.tobytes())
+        entries.append(SCRIPT.pack(script.encode(), len(offsets) // TONES, len(names), len(postings),
+                                   len(char_slots), start))
+
+    tmp = pathlib.Path(path).with_suffix(".tmp")
+    with tmp.open("wb") as w:
+        w.write(HEADER.pack(MAGIC, VERSION, len(sections), n, tc.encode()))
+        w.write(b"".join(entries))
+        for start, data in blobs:
+            w.write(b"\0" * (start - w.tell()))
+            w.write(data)
+    tmp.replace(path)
+    return {"chars": n, "scripts": {s[0]: {"syllables": len(s[2]) // TONES, "postings": len(s[3])}
+                                    for s in sections}}
+
+class ReadingIndex:
+    """
+    Memory-mapped reader. Opening parses the header and the few hundred
+    syllable names per script into a dict; a lookup is that dict, two offset
+    reads and a slice of the posting array.
+
+        with ReadingIndex() as ix:
+            ix.chars("shi2")                   -> "是时十事实市使..."  (most frequent first)
+            ix.chars("shi")                    -> every tone
+            ix.readings("行")                  -> ["xing2", "hang2", ...]
+            ix.homophones("是")                -> "时十事实..." (same syllable and tone)
+    """
+    def __init__(self, path=READING_INDEX):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_scripts, n, tc = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a reading index (magic={magic!r}, version={version})")
+        tc = tc.decode()
+        view = memoryview(self._mm)
+        pos = _align(HEADER.size + SCRIPT.size * n_scripts)
+
+        def take(count, typecode):
+            nonlocal pos
+            size = array(typecode).itemsize * count
+            arr = view[pos:pos + size].cast(typecode)
+            pos = _align(pos + size)
+            return arr
+        self._cps = take(n, "I")
+        self._sorted_cps = take(n, "I")
+        self._sorted_ids = take(n, "I")
+        self._scripts = {}
+        for k in range(n_scripts):
+            name, n_syl, names_len, n_post, n_slots, start = SCRIPT.unpack_from(self._mm, HEADER.size + k * SCRIPT.size)
+            pos = start
+            names = bytes(take(names_len, "B")).decode("ascii").split("\n") if names_len else []
+            self._scripts[name.rstrip(b"\0").decode()] = (
+                {syl: i for i, syl in enumerate(names)}, names,
+                take(n_syl * TONES + 1, "I"), take(n_post, tc), take(n + 1, "I"), take(n_slots, "H"))
+
+    def close(self):
+        self._cps = self._sorted_cps = self._sorted_ids = None
+        self._scripts = {}
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def scripts(self):
+        return list(self._scripts)
+
+    def syllables(self, script="mandarin"):
+        return list(self._scripts[script][1])
+
+    def _id(self, ch):
+        cp = ord(ch)
+        i = bisect.bisect_left(self._sorted_cps, cp)
+        return self._sorted_ids[i] if i < len(self._sorted_cps) and self._sorted_cps[i] == cp else None
+
+    def _ids(self, slot, script):
+        _, _, offsets, postings, _, _ = self._scripts[script]
+        return postings[offsets[slot]:offsets[slot + 1]]
+
+    def _slot(self, query, script):
+        # "shi2" / "shí" -> exact tone; "shi" -> any tone (0)
+        if script == "cantonese":
+            m = re.fullmatch(r"([a-z]+)([1-6])?", query.strip().lower())
+            split = (m.group(1), int(m.group(2) or 0)) if m else None
+        else:
+            split = mandarin_split(query, default_tone=0)
+        sidx = self._scripts[script][0]
+        if not split or split[0] not in sidx:
+            return None
+        return sidx[split[0]] * TONES + split[1]
+
+    def chars(self, query, script="mandarin", limit=None):
+        """Characters read `query`, most frequent first ("" if none)."""
+        slot = self._slot(query, script)
+        if slot is None:
+            return ""
+        ids = self._ids(slot, script)
+        cps = self._cps
+        return "".join(chr(cps[i]) for i in (ids[:limit] if limit else ids))
+
+    def readings(self, ch, script="mandarin"):
+        """ch's readings, numbered (canonical first)."""
+        i = self._id(ch)
+        if i is None or script not in self._scripts:
+            return []
+        _, names, _, _, char_offs, char_slots = self._scripts[script]
+        return [f"{names[s // TONES]}{s % TONES}" for s in char_slots[char_offs[i]:char_offs[i + 1]]]
+
+    def homophones(self, ch, script="mandarin", any_tone=False, limit=None):
+        """Other characters sharing one of ch's readings, most frequent first."""
+        i = self._id(ch)
+        if i is None or script not in self._scripts:
+            return ""
+        _, _, _, _, char_offs, char_slots = self._scripts[script]
+        slots = {s - s % TONES if any_tone else s for s in char_slots[char_offs[i]:char_offs[i + 1]]}
+        ids = sorted({j for s in slots for j in self._ids(s, script)} - {i})
+        cps = self._cps
+        return "".join(chr(cps[j]) for j in (ids[:limit] if limit else ids))
+
+# -- CLI ---------------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Characters by reading, readings by character, homophones")
+    ap.add_argument("queries", nargs="*", help="syllables, e.g. shi2, shí, shi (any tone), sik6")
+    ap.add_argument("--script", choices=INDEXED, default="mandarin")
+    ap.add_argument("--limit", type=int, help="at most N characters per query")
+    ap.add_argument("--homophones", metavar="CHAR", help="characters sharing CHAR's readings")
+    ap.add_argument("--any-tone", action="store_true", help="with --homophones, ignore tones")
+    ap.add_argument("--readings", metavar="CHAR", help="CHAR's readings in every indexed script")
+    args = ap.parse_args()
+
+    if not READING_INDEX.exists():
+        print(f"Error: {READING_INDEX} not found (run etl/06_normalize_readings.py).")
+        sys.exit(1)
+    sys.stdout.reconfigure(encoding="utf-8")
+    t0 = time.perf_counter()
+    with ReadingIndex() as ix:
+        load_ms = (time.perf_counter() - t0) * 1000
+        if args.homophones:
+            print(ix.homophones(args.homophones, args.script, args.any_tone, args.limit))
+        if args.readings:
+            for script in ix.scripts:
+                print(f"{script}: {' '.join(ix.readings(args.readings, script)) or '-'}")
+        for q in args.queries:
+            found = ix.chars(q, args.script, args.limit)
+            print(f"{q}: {found or '-'}")
+        if not (args.queries or args.homophones or args.readings):
+            print(f"{READING_INDEX.name}: opened in {load_ms:.2f} ms; "
+                  + ", ".join(f"{s} {len(ix.syllables(s))} syllables" for s in ix.scripts))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# etl/shape_index.py
+# Prefix index over the CCD stroke-shape signatures, for "type the first few
+# shapes of a character you can't read" lookup. Stage 07_shape_index.py
+# compiles data/processed/character_shapes.csv (stage 02) into
+# data/processed/shape_index.bin.
+#
+# A signature is the character's Cangjie code (好 VND, 明 AB, 想 DUP: one
+# letter per shape, A-Y), and each character has a composition type
+# (吅 left-right, 吕 top-bottom, 回 enclosed, 一 whole, ...). Every prefix of
+# every signature is a key, on its own and together with the composition
+# type, and each key keeps its best MAX_CANDIDATES characters: an exact
+# signature match first, then frequency order (reading_index.frequency_order),
+# then fewer strokes. A key packs into a u64, a u16 type number then the
+# prefix bytes, big-endian, so numeric order is (type, prefix) order and a
+# lookup is one bisect over the mapped key array plus a slice of the candidates.
+#
+# Layout (little endian):
+#   header     : magic "HZSI", u16 version, u16 type bytes, u32 n_keys, u32 n_candidates,
+#                u16 candidates per key, 2x pad
+#   types      : "\n"-joined UTF-8; key type number k + 1 = types[k], 0 = any type
+#   keys       : u64 x n_keys, ascending
+#   offsets    : u32 x (n_keys + 1)
+#   candidates : u32 code points
+#   each array 8-byte aligned
+#
+#   python etl/shape_index.py VN                 # characters whose code starts VN
+#   python etl/shape_index.py vn ab --kind 吅     # left-right characters only
+#   python etl/shape_index.py --types
+import argparse, bisect, csv, mmap, pathlib, struct, sys, time
+from array import array
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+PROCESSED = ROOT / "data" / "processed"
+SHAPES_CSV = PROCESSED / "character_shapes.csv"
+SHAPE_INDEX = PROCESSED / "shape_index.bin"
+
+MAGIC = b"HZSI"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIIH2x")
+MAX_PREFIX = 6  # key bytes after the u16 type number; Cangjie codes are at most 5
+MAX_CANDIDATES = 48
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+def pack_key(type_no, prefix):
+    """(type number, ASCII prefix) -> u64, ordered like the pair."""
+    return int.from_bytes(type_no.to_bytes(2, "big") + prefix.encode("ascii").ljust(MAX_PREFIX, b"\0"), "big")
+
+def load_shapes(path=SHAPES_CSV):
+    """[(hanzi, strokes, composition_type, signature)] for rows with a usable signature."""
+    out = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for r in csv.DictReader(f):
+            sig = r["signature"].upper()
+            if sig and len(sig) <= MAX_PREFIX and sig.isascii() and sig.isalnum():
+                strokes = int(r["strokes"]) if r["strokes"].isdigit() else 99
+                out.append((r["hanzi"], strokes, r["composition_type"], sig))
+    return out
+
+def build_index(path, shapes, order):
+    """Write the prefix index for shapes, ranking characters by `order` (most frequent first)."""
+    rank = {ch: i for i, ch in enumerate(order)}
+    types = sorted({t for _, _, t, _ in shapes if t})
+    type_no = {t: k + 1 for k, t in enumerate(types)}
+    buckets = {}
+    for ch, strokes, kind, sig in shapes:
+        type_nos = (0, type_no[kind]) if kind else (0,)
+        for n in range(len(sig) + 1):
+            entry = (n != len(sig), rank.get(ch, len(rank)), strokes, ord(ch))
+            for t in type_nos:
+                buckets.setdefault(pack_key(t, sig[:n]), []).append(entry)
+
+    keys = array("Q", sorted(buckets))
+    offsets = array("I", [0])
+    cands = array("I")
+    for key in keys:
+        seen = set()
+        for *_, cp in sorted(buckets[key]):
+            if cp not in seen:  # a character listed under two signatures
+                seen.add(cp)
+                cands.append(cp)
+                if len(seen) == MAX_CANDIDATES:
+                    break
+        offsets.append(len(cands))
+
+    names = "\n".join(types).encode("utf-8")
+    tmp = pathlib.Path(path).with_suffix(".tmp")
+    with tmp.open("wb") as w:
+        w.write(HEADER.pack(MAGIC, VERSION, len(names), len(keys), len(cands), MAX_CANDIDATES))
+        for data in (names, keys.tobytes(), offsets.tobytes(), cands.tobytes()):
+            w.write(b"\0" * (_align(w.tell()) - w.tell()))
+            w.write(data)
+    tmp.replace(path)
+    return {"chars": len({s[0] for s in shapes}), "types": len(types), "keys": len(keys),
+            "candidates": len(cands)}
+
+class ShapeIndex:
+    """
+    Memory-mapped reader; opening reads the header and the composition type
+    names, a lookup is a bisect over the key array and one slice.
+
+        with ShapeIndex() as ix:
+            ix.candidates("VN")              -> "好奴始...", most likely first
+            ix.candidates("A", kind="吅")    -> left-right characters starting with 日
+    """
+    def __init__(self, path=SHAPE_INDEX):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, names_len, n_keys, n_cands, self.per_key = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a shape index (magic={magic!r}, version={version})")
+        view = memoryview(self._mm)
+        pos = _align(HEADER.size)
+
+        def take(count, typecode):
+            nonlocal pos
+            size = array(typecode).itemsize * count
+            arr = view[pos:pos + size].cast(typecode)
+            pos = _align(pos + size)
+            return arr
+        names = bytes(take(names_len, "B")).decode("utf-8")
+        self.types = names.split("\n") if names else []
+        self._type_no = {t: k + 1 for k, t in enumerate(self.types)}
+        self._keys = take(n_keys, "Q")
+        self._offsets = take(n_keys + 1, "I")
+        self._cands = take(n_cands, "I")
+
+    def close(self):
+        self._keys = self._offsets = self._cands = None
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def candidates(self, prefix, kind=None, limit=20):
+        """Characters whose signature starts with `prefix` (and of composition type `kind`), best first."""
+        prefix = prefix.strip().upper()
+        t = self._type_no.get(kind) if kind else 0
+        if t is None or len(prefix) > MAX_PREFIX or not prefix.isascii():
+            return ""
+        key = pack_key(t, prefix)
+        i = bisect.bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return ""
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        return "".join(map(chr, self._cands[lo:min(hi, lo + limit) if limit else hi]))
+
+# -- CLI ---------------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Characters by the first few stroke shapes of their signature")
+    ap.add_argument("prefixes", nargs="*", help="signature prefixes, e.g. VN, ab, dup")
+    ap.add_argument("--kind", metavar="TYPE", help="composition type, e.g. 吅 (left-right), 吕 (top-bottom)")
+    ap.add_argument("--limit", type=int, default=20, help="at most N characters per prefix (0 = all kept)")
+    ap.add_argument("--types", action="store_true", help="list the composition types")
+    args = ap.parse_args()
+
+    if not SHAPE_INDEX.exists():
+        print(f"Error: {SHAPE_INDEX} not found (run etl/07_shape_index.py).")
+        sys.exit(1)
+    sys.stdout.reconfigure(encoding="utf-8")
+    t0 = time.perf_counter()
+    with ShapeIndex() as ix:
+        load_ms = (time.perf_counter() - t0) * 1000
+        if args.types:
+            print(" ".join(ix.types))
+        for p in args.prefixes:
+            print(f"{p}: {ix.candidates(p, args.kind, args.limit) or '-'}")
+        if not (args.prefixes or args.types):
+            print(f"{SHAPE_INDEX.name}: opened in {load_ms:.2f} ms; {len(ix):,} keys, "
+                  f"{len(ix.types)} composition types")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# etl/stroke_bundle.py
+# Packed stroke-data bundle (written by 03c_pack_strokes.py).
+#
+# Layout (little endian):
+#   header  : magic "HZSB", u16 version, u16 pad, u32 count
+#   cps     : u32[count]  code points, ascending
+#   offsets : u64[count]  record offset from start of file
+#   lengths : u32[count]  compressed record length
+#   records : zlib-compressed hanzi-writer JSON, concatenated
+#
+# A lookup is a binary search over the mmap'd cps column and one slice of
+# the mapping; nothing is read up front except the 12-byte header.
+import bisect, json, mmap, os, pathlib, struct, zlib
+from array import array
+
+MAGIC = b"HZSB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+def write_bundle(path, records, level=9):
+    """records: iterable of (ch, raw_json_bytes). Duplicates keep the last one."""
+    by_cp = {ord(ch): raw for ch, raw in records}
+    cps = sorted(by_cp)
+    blobs = [zlib.compress(by_cp[cp], level) for cp in cps]
+
+    n = len(cps)
+    cps_off = HEADER.size
+    offs_off = _align(cps_off + 4 * n)
+    lens_off = offs_off + 8 * n
+    data_off = _align(lens_off + 4 * n)
+
+    offsets, pos = [], data_off
+    for b in blobs:
+        offsets.append(pos)
+        pos += len(b)
+
+    # Write beside the target and swap it in: the server and any mmap reader keep
+    # the old inode until they reopen, instead of reading a file being rewritten
+    tmp = pathlib.Path(path).with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, n))
+        f.write(array("I", cps).tobytes())
+        f.write(b"\0" * (offs_off - f.tell()))
+        f.write(array("Q", offsets).tobytes())
+        f.write(array("I", [len(b) for b in blobs]).tobytes())
+        f.write(b"\0" * (data_off - f.tell()))
+        for b in blobs:
+            f.write(b)
+    os.replace(tmp, path)
+    return n
+
+class StrokeBundle:
+    """
+        with StrokeBundle(path) as b:
+            b.get("好")        -> dict (hanzi-writer JSON) or None
+            b.get_raw("好")    -> JSON bytes or None
+            "好" in b, len(b), b.chars()
+    """
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a stroke bundle (magic={magic!r}, version={version})")
+        view = memoryview(self._mm)
+        cps_off = HEADER.size
+        offs_off = _align(cps_off + 4 * n)
+        lens_off = offs_off + 8 * n
+        self._cps = view[cps_off:cps_off + 4 * n].cast("I")
+        self._offsets = view[offs_off:offs_off + 8 * n].cast("Q")
+        self._lengths = view[lens_off:lens_off + 4 * n].cast("I")
+        self._n = n
+
+    def close(self):
+        self._cps = self._offsets = self._lengths = None
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._n
+
+    def _index(self, ch):
+        cp = ord(ch)
+        i = bisect.bisect_left(self._cps, cp)
+        return i if i < self._n and self._cps[i] == cp else -1
+
+    def __contains__(self, ch):
+        return self._index(ch) >= 0
+
+    def get_raw(self, ch):
+        i = self._index(ch)
+        if i < 0:
+            return None
+        off = self._offsets[i]
+        return zlib.decompress(self._mm[off:off + self._lengths[i]])
+
+    def get(self, ch):
+        raw = self.get_raw(ch)
+        return json.loads(raw) if raw is not None else None
+
+    def chars(self):
+        return [chr(cp) for cp in self._cps]
@@ -0,0 +1,384 @@
+# etl/text_analyzer.py
+# Segments arbitrary Chinese text into HSK 3.0 vocabulary and reports, per
+# text, how much of it each level covers, which words sit at which level (with
+# their positions) and which characters no HSK word uses at all.
+#
+# The dictionary is every HSK_all_merged.tsv word, in both scripts (lowest
+# level wins), plus every all-Han CEDICT headword. Each run of Han characters
+# is segmented jieba-style. One table maps every prefix of every word to that
+# word's level, or to PREFIX when the prefix is not a word itself. From each
+# start position a walk through the table finds every word beginning there,
+# and together those matches form the DAG of possible segmentations. A
+# right-to-left pass then picks the cheapest path. Paths with fewer
+# characters outside HSK words always win, so a CEDICT headword only stands
+# for a span HSK words can't cover (北京/大学, not 北京大学). After that, a
+# token costs 1 plus a small penalty (HSK level / 100, CEDICT-only 0.1,
+# unknown 0.5), so the fewest tokens win and ties go to lower-level HSK words
+# (研究/生命/起源 over 研究生/命/起源).
+#
+# Non-Han text is skipped. Offsets are code-point indices into the line.
+#
+#   python etl/text_analyzer.py 我们研究生命起源
+#   python etl/text_analyzer.py < article.txt               # one report for the whole stream
+#   python etl/text_analyzer.py --lines --tokens < article.txt  # one JSON report per line
+#   python etl/text_analyzer.py --batch corpus.txt --workers 8 --out per_line.jsonl
+#   python etl/text_analyzer.py --eval                      # boundary F1 on HSK sentences + MB/s
+#   python etl/text_analyzer.py --serve                     # JSON-lines worker for the backend
+#     {"id": 1, "text": "我爱你"} -> {"id": 1, "report": {"chars": 3, "coverage": {"1": 1.0, ...}, ...}}
+import argparse, csv, json, multiprocessing, os, pathlib, random, re, shutil, sqlite3, sys, time
+from collections import Counter
+from contextlib import nullcontext
+
+from cedict_index import CEDICT_DB, CEDICT_GZ, iter_cedict
+from char_table import BLOCKS
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+HSK_TSV = ROOT / "data" / "00_hsk" / "HSK_all_merged.tsv"
+
+# Token levels: 1..7 are HSK 1-6 and 7-9; PREFIX only ever appears in the
+# prefix table (falsy, so `table.get(s) or UNKNOWN` reads "not a word")
+PREFIX, CEDICT, UNKNOWN = 0, 8, 9
+LABELS = (None, "1", "2", "3", "4", "5", "6", "7-9", "cedict", "unknown")
+HSK_LEVELS = range(1, 8)
+# Path cost per token, in hundredths, plus OFF_HSK per character outside HSK words;
+# OFF_HSK outweighs any token count a line can have
+COST = (None,) + tuple(100 + lv for lv in HSK_LEVELS) + (110, 150)
+OFF_HSK = 1 << 40
+CHAR_COST = (None,) + (0,) * len(HSK_LEVELS) + (OFF_HSK, OFF_HSK)
+
+HAN = "".join(f"{chr(lo)}-{chr(hi)}" for lo, hi in BLOCKS)
+HAN_RUN = re.compile(f"[{HAN}]+")
+IS_HAN = HAN_RUN.fullmatch
+
+def hsk_level(label):
+    # "1".."6", "7-9" -> 1..7
+    head = label.split("-")[0].strip()
+    return min(int(head), 7) if head.isdigit() else None
+
+def load_hsk(path=HSK_TSV):
+    """-> {word: lowest level} over the simplified and traditional forms of every row."""
+    words = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            lv = hsk_level(row.get("Level") or "")
+            if lv is None:
+                continue
+            for col in ("Simplified", "Traditional"):
+                for w in (row.get(col) or "").split("|"):
+                    w = w.strip()
+                    if w and IS_HAN(w) and lv < words.get(w, UNKNOWN):
+                        words[w] = lv
+    return words
+
+def load_cedict_words(db=CEDICT_DB, gz=CEDICT_GZ):
+    # The compiled index when stage 04a has run, else the gz itself
+    if pathlib.Path(db).exists():
+        con = sqlite3.connect(f"file:{pathlib.Path(db).as_posix()}?mode=ro", uri=True)
+        try:
+            return {w for pair in con.execute("SELECT simp, trad FROM entries") for w in pair if IS_HAN(w)}
+        finally:
+            con.close()
+    return {w for e in iter_cedict(gz) for w in (e.simp, e.trad) if IS_HAN(w)}
+
+class Analyzer:
+    def __init__(self, hsk_words, cedict_words=()):
+        table = {}
+        for w in cedict_words:
+            table[w] = CEDICT
+        for w, lv in hsk_words.items():
+            table[w] = lv
+        for w in list(table):
+            for k in range(1, len(w)):
+                table.setdefault(w[:k], PREFIX)
+        self.table = table
+        self.hsk_chars = frozenset("".join(hsk_words))
+        self.words = sum(1 for lv in table.values() if lv)
+
+    @classmethod
+    def load(cls, hsk=HSK_TSV, cedict_db=CEDICT_DB, cedict_gz=CEDICT_GZ):
+        return cls(load_hsk(hsk), load_cedict_words(cedict_db, cedict_gz))
+
+    def _segment(self, run, base, out):
+        # Cheapest path through the DAG of dictionary matches, right to left
+        get, cost, per_char, n = self.table.get, COST, CHAR_COST, len(run)
+        best = [0] * (n + 1)
+        step = [0] * n
+        level = [0] * n
+        for i in range(n - 1, -1, -1):
+            lv = get(run[i])
+            bl = lv or UNKNOWN
+            b, bj = cost[bl] + per_char[bl] + best[i + 1], i + 1
+            if lv is not None:
+                for j in range(i + 2, n + 1):
+                    lv = get(run[i:j])
+                    if lv is None:
+                        break
+                    if lv:
+                        c = cost[lv] + (j - i) * per_char[lv] + best[j]
+                        if c < b:
+                            b, bj, bl = c, j, lv
+            best[i], step[i], level[i] = b, bj, bl
+        i = 0
+        while i < n:
+            j = step[i]
+            out.append((base + i, base + j, level[i]))
+            i = j
+
+    def tokens(self, text):
+        """-> [(start, end, level)] for the Han runs of text, in order."""
+        out = []
+        table = self.table
+        for m in HAN_RUN.finditer(text):
+            run = m.group()
+            if len(run) == 1:
+                out.append((m.start(), m.end(), table.get(run) or UNKNOWN))
+            else:
+                self._segment(run, m.start(), out)
+        return out
+
+    def analyze(self, text, tokens=True):
+        """One text's report (see Report.to_dict), with [word, start, level] per token if tokens."""
+        return self.report(text, self.tokens(text), tokens)
+
+    def report(self, text, toks, tokens=True):
+        report = Report(vocab=False)
+        report.add(text, toks, self.hsk_chars)
+        doc = report.to_dict()
+        del doc["texts"]
+        if tokens:
+            doc["tokens"] = [[text[s:e], s, LABELS[lv]] for s, e, lv in toks]
+        return doc
+
+class Report:
+    """Running totals over any number of texts; reports from worker processes merge."""
+    def __init__(self, vocab=True):
+        self.texts = 0
+        self.words = [0] * len(LABELS)
+        self.chars = [0] * len(LABELS)
+        self.unknown_chars = Counter()
+        self.vocab = Counter() if vocab else None
+
+    def add(self, text, toks, hsk_chars):
+        self.texts += 1
+        words, chars, vocab = self.words, self.chars, self.vocab
+        for s, e, lv in toks:
+            words[lv] += 1
+            chars[lv] += e - s
+            if lv > 7:
+                self.unknown_chars.update(ch for ch in text[s:e] if ch not in hsk_chars)
+            if vocab is not None:
+                vocab[text[s:e], lv] += 1
+
+    def merge(self, other):
+        self.texts += other.texts
+        self.words = [a + b for a, b in zip(self.words, other.words)]
+        self.chars = [a + b for a, b in zip(self.chars, other.chars)]
+        self.unknown_chars.update(other.unknown_chars)
+        if self.vocab is not None and other.vocab is not None:
+            self.vocab.update(other.vocab)
+        return self
+
+    def to_dict(self, top=0):
+        """
+        chars / words      Han characters and tokens
+        levels             {label: {"words", "chars"}} for "1".."7-9", "cedict", "unknown"
+        coverage           {"1".."7-9": share of Han characters in words at that level or below}
+        unknown_chars      {char: count} for characters no HSK word uses, most frequent first
+        top_words          {label: [[word, count], ...]} with top > 0 (aggregates only)
+        """
+        total = sum(self.chars)
+        covered, coverage = 0, {}
+        for lv in HSK_LEVELS:
+            covered += self.chars[lv]
+            coverage[LABELS[lv]] = round(covered / total, 4) if total else None
+        doc = {
+            "texts": self.texts,
+            "chars": total,
+            "words": sum(self.words),
+            "levels": {LABELS[lv]: {"words": self.words[lv], "chars": self.chars[lv]}
+                       for lv in range(1, len(LABELS)) if self.words[lv]},
+            "coverage": coverage,
+            "unknown_chars": dict(self.unknown_chars.most_common()),
+        }
+        if top and self.vocab is not None:
+            by_level = {}
+            for (w, lv), c in self.vocab.most_common():
+                lst = by_level.setdefault(LABELS[lv], [])
+                if len(lst) < top:
+                    lst.append([w, c])
+            doc["top_words"] = {LABELS[lv]: by_level[LABELS[lv]] for lv in range(1, len(LABELS))
+                                if LABELS[lv] in by_level}
+        return doc
+
+# -- Streaming and batch -----------------------------------------------------------
+
+def analyze_stream(analyzer, lines, report, per_line=None, tokens=False, first_line=1):
+    """Feed lines into report; with per_line (a file), also write one JSON report per line."""
+    for lineno, line in enumerate(lines, first_line):
+        line = line.rstrip("\r\n")
+        toks = analyzer.tokens(line)
+        report.add(line, toks, analyzer.hsk_chars)
+        if per_line is not None:
+            doc = {"line": lineno, **analyzer.report(line, toks, tokens)}
+            per_line.write(json.dumps(doc, ensure_ascii=False) + "\n")
+    return report
+
+def _count_lines(f, start, end):
+    f.seek(start)
+    n, left = 0, end - start
+    while left:
+        block = f.read(min(left, 1 << 24))
+        n += block.count(b"\n")
+        left -= len(block)
+    return n
+
+def chunks(path, n):
+    """-> [(start, end, first_line)] byte ranges of path, each ending on a line break."""
+    size = os.path.getsize(path)
+    step = max(1, -(-size // n))
+    out = []
+    with open(path, "rb") as f:
+        start, line = 0, 1
+        while start < size:
+            f.seek(min(start + step, size))
+            f.readline()
+            end = f.tell()
+            out.append((start, end, line))
+            line += _count_lines(f, start, end)
+            start = end
+    return out
+
+def _read_lines(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            yield raw.decode("utf-8", errors="replace")
+
+_worker = None
+
+def _init_worker():
+    # Under fork the parent's analyzer is inherited; spawn loads its own
+    global _worker
+    if _worker is None:
+        _worker = Analyzer.load()
+
+def _batch_chunk(job):
+    path, start, end, first_line, part, tokens = job
+    with open(part, "w", encoding="utf-8") if part else nullcontext() as w:
+        return analyze_stream(_worker, _read_lines(path, start, end), Report(), w, tokens, first_line)
+
+def run_batch(analyzer, path, workers, out=None, tokens=False):
+    """Analyze a corpus file across worker processes. Returns the merged Report;
+    with out, per-line reports are written there in file order."""
+    global _worker
+    _worker = analyzer
+    jobs = [(str(path), s, e, line, f"{out}.part{k}" if out else None, tokens)
+            for k, (s, e, line) in enumerate(chunks(path, workers * 4))]
+    total = Report()
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool, \
+            open(out, "w", encoding="utf-8") if out else nullcontext() as w:
+        for job, report in zip(jobs, pool.imap(_batch_chunk, jobs)):
+            total.merge(report)
+            if out:
+                with open(job[4], "r", encoding="utf-8") as part:
+                    shutil.copyfileobj(part, w)
+                os.unlink(job[4])
+    return total
+
+# -- CLI ---------------------------------------------------------------------------
+
+def eval_sentences(n=5000, length=8, seed=7, hsk=HSK_TSV):
+    """Synthetic sentences of random HSK words -> [(text, {boundary offsets})]."""
+    rng = random.Random(seed)
+    words = sorted(load_hsk(hsk))
+    out = []
+    for _ in range(n):
+        picked = [rng.choice(words) for _ in range(length)]
+        bounds, pos = set(), 0
+        for w in picked:
+            pos += len(w)
+            bounds.add(pos)
+        out.append(("".join(picked), bounds))
+    return out
+
+def run_eval(analyzer):
+    """Boundary precision / recall against the word breaks of synthetic HSK sentences, plus MB/s."""
+    sents = eval_sentences()
+    tp = fp = fn = 0
+    for text, ref in sents:
+        got = {e for _, e, _ in analyzer.tokens(text)}
+        tp += len(got & ref)
+        fp += len(got - ref)
+        fn += len(ref - got)
+    text = "。\n".join(t for t, _ in sents)
+    mb = len(text.encode("utf-8")) / 1e6
+    t0 = time.perf_counter()
+    analyzer.tokens(text)
+    elapsed = time.perf_counter() - t0
+    p, r = tp / (tp + fp), tp / (tp + fn)
+    print(json.dumps({"sentences": len(sents), "boundary_precision": round(p, 4),
+                      "boundary_recall": round(r, 4), "boundary_f1": round(2 * p * r / (p + r), 4),
+                      "mb_per_s": round(mb / elapsed, 2), "sample_mb": round(mb, 2)}, indent=2))
+
+def handle_request(req, analyzer):
+    resp = {"id": req["id"]} if "id" in req else {}
+    tokens = req.get("tokens", True)
+    try:
+        if "texts" in req:
+            resp["results"] = [analyzer.analyze(str(t), tokens) for t in req["texts"]]
+        elif "text" in req:
+            resp["report"] = analyzer.analyze(str(req["text"]), tokens)
+        else:
+            resp["error"] = "No text provided"
+    except Exception as e:
+        resp["error"] = str(e)
+    return resp
+
+def main():
+    ap = argparse.ArgumentParser(description="Segment Chinese text into HSK vocabulary and report level coverage")
+    ap.add_argument("texts", nargs="*", help="texts to analyze (default: stream stdin line by line)")
+    ap.add_argument("--lines", action="store_true", help="one JSON report per input line instead of one overall")
+    ap.add_argument("--tokens", action="store_true", help="include per-word positions in --lines / --out reports")
+    ap.add_argument("--top", type=int, default=20, help="most frequent words per level in overall reports (default: 20)")
+    ap.add_argument("--batch", type=pathlib.Path, metavar="FILE", help="analyze FILE across worker processes")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for --batch (default: all cores)")
+    ap.add_argument("--out", type=pathlib.Path, help="with --batch, write per-line reports here (JSON lines)")
+    ap.add_argument("--eval", action="store_true", help="segmentation accuracy and MB/s")
+    ap.add_argument("--serve", action="store_true", help="JSON-lines worker over stdin/stdout")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    analyzer = Analyzer.load()
+    load_ms = round((time.perf_counter() - t0) * 1000, 1)
+    if args.serve:
+        print(json.dumps({"words": analyzer.words, "load_ms": load_ms}), file=sys.stderr, flush=True)
+        sys.path.insert(0, str(ROOT / "backend"))
+        import jsonl_worker
+        jsonl_worker.serve_stdio(lambda req: handle_request(req, analyzer))
+        return
+    sys.stdout.reconfigure(encoding="utf-8")
+    if args.eval:
+        run_eval(analyzer)
+    elif args.batch:
+        t0 = time.perf_counter()
+        report = run_batch(analyzer, args.batch, args.workers, args.out, args.tokens)
+        elapsed = time.perf_counter() - t0
+        print(json.dumps(report.to_dict(args.top), ensure_ascii=False, indent=1))
+        print(f"{report.texts:,} lines, {args.batch.stat().st_size / 1e6:,.1f} MB in {elapsed:.1f}s "
+              f"with {args.workers} workers", file=sys.stderr)
+    elif args.texts:
+        for t in args.texts:
+            print(json.dumps(analyzer.analyze(t), ensure_ascii=False))
+    else:
+        sys.stdin.reconfigure(encoding="utf-8")
+        report = analyze_stream(analyzer, sys.stdin, Report(), sys.stdout if args.lines else None, args.tokens)
+        if not args.lines:
+            print(json.dumps(report.to_dict(args.top), ensure_ascii=False, indent=1))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+# etl/variants.py
+# Variant equivalence classes and simplified <-> traditional string
+# conversion, compiled once into data/processed/variants.bin.
+#
+# Classes come from union-find over character_variants.csv (simplified,
+# traditional, semantic and z-variant edges; spoofing look-alikes are not
+# equivalences). Each class has one canonical member: the one CEDICT's
+# simplified headwords use most, lowest code point on a tie.
+#
+# Conversion is forward longest-match over CEDICT's simplified/traditional
+# headword pairs on top of a per-character default: the pairing CEDICT uses
+# most when its headwords are aligned character by character, or Unihan's
+# kTraditionalVariant / kSimplifiedVariant for characters CEDICT lacks.
+# Only phrases that convert differently from their characters' defaults are
+# kept (头发 -> 頭髮, 若干 -> 若干; not 中国 -> 中國), so runs of text between
+# them go through str.translate and the scan only stops, via one regex
+# search, at characters that can start a kept phrase.
+#
+#   python etl/variants.py 头发 理发店 --to trad
+#   python etl/variants.py --to simp < article.txt
+#   python etl/variants.py --class 为
+#   python etl/variants.py --eval            # HSK 3.0 traditional forms + throughput
+#   python etl/variants.py --serve           # JSON-lines worker for the backend
+#     {"id": 1, "text": "头发", "to": "trad"} -> {"id": 1, "text": "頭髮"}
+import argparse, bisect, csv, json, os, pathlib, re, struct, sys, time
+from array import array
+from collections import Counter, defaultdict
+
+from cedict_index import CEDICT_GZ, iter_cedict
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+VARIANTS_CSV = ROOT / "data" / "processed" / "character_variants.csv"
+VARIANTS_BIN = ROOT / "data" / "processed" / "variants.bin"
+HSK_CSV = ROOT / "_cleanup" / "hsk30.csv"
+
+MAGIC = b"HZVR"
+VERSION = 1
+# magic, version, reserved, class chars, s2t chars, t2s chars, s2t phrase bytes, t2s phrase bytes
+HEADER = struct.Struct("<4sHHIIIII")
+EQUIVALENT = ("simplified", "traditional", "semantic", "z-variant")
+SCRIPTS = ("trad", "simp")
+
+def load_edges(path=VARIANTS_CSV):
+    """(hanzi, other_hanzi, relation) rows between single characters."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for rec in csv.DictReader(f):
+            a, b = rec["hanzi"], rec["other_hanzi"]
+            if len(a) == 1 and len(b) == 1 and a != b:
+                yield a, b, rec["relation"]
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # path halving
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Smaller code point becomes the root, so classes don't depend on edge order
+            lo, hi = sorted((ra, rb))
+            self.parent[hi] = lo
+
+    def groups(self):
+        out = defaultdict(list)
+        for x in self.parent:
+            out[self.find(x)].append(x)
+        return list(out.values())
+
+def build_classes(edges, usage):
+    """char -> canonical member, for every character in a class of two or more."""
+    uf = UnionFind()
+    for a, b, rel in edges:
+        if rel in EQUIVALENT:
+            uf.union(a, b)
+    canon = {}
+    for members in uf.groups():
+        if len(members) > 1:
+            rep = min(members, key=lambda c: (-usage.get(c, 0), ord(c)))
+            for c in members:
+                canon[c] = rep
+    return canon
+
+def _defaults(counts, unihan):
+    # src -> dst, identity mappings dropped. Most-aligned pairing wins; Unihan
+    # breaks ties and covers characters CEDICT never uses.
+    out = {}
+    for src in counts.keys() | unihan.keys():
+        c = counts.get(src)
+        if c:
+            best = max(c.values())
+            tied = [d for d, n in c.items() if n == best]
+            dst = unihan[src] if unihan.get(src) in tied else min(tied)
+        else:
+            dst = unihan[src]
+        if dst != src:
+            out[src] = dst
+    return out
+
+def _phrases(pairs, s2t, t2s):
+    # Phrases whose first CEDICT reading differs from the char-by-char default,
+    # one dict per direction
+    to_trad, to_simp = str.maketrans(s2t), str.maketrans(t2s)
+    seen_simp, seen_trad, s2t_phr, t2s_phr = set(), set(), {}, {}
+    for simp, trad in pairs:
+        if simp not in seen_simp:
+            seen_simp.add(simp)
+            if simp.translate(to_trad) != trad:
+                s2t_phr[simp] = trad
+        if trad not in seen_trad:
+            seen_trad.add(trad)
+            if trad.translate(to_simp) != simp:
+                t2s_phr[trad] = simp
+    return s2t_phr, t2s_phr
+
+def build_tables(read_entries, edges):
+    """
+    -> (usage, s2t chars, t2s chars, s2t phrases, t2s phrases). read_entries()
+    is called twice: the character tables first, then the phrases against
+    them, so the million-odd phrase pairs are never held at once.
+    """
+    s2t_counts, t2s_counts = defaultdict(Counter), defaultdict(Counter)
+    usage = Counter()
+    for e in read_entries():
+        if len(e.simp) != len(e.trad):
+            continue
+        usage.update(e.simp)
+        for s, t in zip(e.simp, e.trad):
+            s2t_counts[s][t] += 1
+            t2s_counts[t][s] += 1
+    unihan_s2t, unihan_t2s = {}, {}
+    for a, b, rel in edges:
+        if rel == "traditional":
+            unihan_s2t.setdefault(a, b)
+        elif rel == "simplified":
+            unihan_t2s.setdefault(a, b)
+    s2t = _defaults(s2t_counts, unihan_s2t)
+    t2s = _defaults(t2s_counts, unihan_t2s)
+    pairs = ((e.simp, e.trad) for e in read_entries() if len(e.simp) == len(e.trad) > 1)
+    return (usage, s2t, t2s, *_phrases(pairs, s2t, t2s))
+
+# -- Compiled file -------------------------------------------------------------
+
+def _cps(chars):
+    return array("I", map(ord, chars))
+
+def _blob(phrases):
+    return "".join(f"{k}\t{v}\n" for k, v in sorted(phrases.items())).encode("utf-8")
+
+def write_variants(path, canon, s2t, t2s, s2t_phr, t2s_phr):
+    path = pathlib.Path(path)
+    keys = sorted(canon, key=ord)
+    s2t_keys, t2s_keys = sorted(s2t, key=ord), sorted(t2s, key=ord)
+    blobs = _blob(s2t_phr), _blob(t2s_phr)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(keys), len(s2t_keys), len(t2s_keys), *map(len, blobs)))
+        for arr in (_cps(keys), _cps(canon[k] for k in keys),
+                    _cps(s2t_keys), _cps(s2t[k] for k in s2t_keys),
+                    _cps(t2s_keys), _cps(t2s[k] for k in t2s_keys)):
+            f.write(arr.tobytes())
+        for b in blobs:
+            f.write(b)
+    os.replace(tmp, path)
+
+def compile_variants(variants_csv=VARIANTS_CSV, cedict_gz=CEDICT_GZ, dst=VARIANTS_BIN):
+    """Build and write variants.bin. Returns counts for logging."""
+    edges = list(load_edges(variants_csv))
+    usage, s2t, t2s, s2t_phr, t2s_phr = build_tables(lambda: iter_cedict(cedict_gz), edges)
+    canon = build_classes(edges, usage)
+    write_variants(dst, canon, s2t, t2s, s2t_phr, t2s_phr)
+    return {"edges": len(edges), "class_chars": len(canon), "classes": len(set(canon.values())),
+            "s2t_chars": len(s2t), "t2s_chars": len(t2s),
+            "s2t_phrases": len(s2t_phr), "t2s_phrases": len(t2s_phr)}
+
+# -- Conversion ------------------------------------------------------------------
+
+class Converter:
+    """One direction: per-character table plus longest-match phrases."""
+    def __init__(self, chars, phrases):
+        self.table = str.maketrans(chars)
+        self.phrases = phrases
+        lens = defaultdict(set)
+        for p in phrases:
+            lens[p[0]].add(len(p))
+        self._lens = {c: sorted(v, reverse=True) for c, v in lens.items()}
+        self._start = re.compile("[" + "".join(map(re.escape, sorted(lens))) + "]").search if lens else None
+
+    def __call__(self, text):
+        # Phrases are two characters or more, so a single character is a table lookup
+        if self._start is None or len(text) < 2:
+            return text.translate(self.table)
+        table, get, lens, search = self.table, self.phrases.get, self._lens, self._start
+        out, last, i, n = [], 0, 0, len(text)
+        while True:
+            m = search(text, i)
+            if m is None:
+                break
+            i = m.start()
+            for length in lens[text[i]]:
+                rep = get(text[i:i + length]) if i + length <= n else None
+                if rep is not None:
+                    if last < i:
+                        out.append(text[last:i].translate(table))
+                    out.append(rep)
+                    i = last = i + length
+                    break
+            else:
+                i += 1
+        out.append(text[last:].translate(table))
+        return "".join(out)
+
+class Variants:
+    """
+        with Variants() as v:
+            v.convert("头发", "trad")   -> "頭髮"     (also v.to_trad / v.to_simp)
+            v.canonical("爲")          -> "为"
+            v.members("为")            -> ["为", "爲", "為"]
+    Class lookups bisect the packed arrays; each direction's converter is
+    built on first use.
+    """
+    def __init__(self, path=VARIANTS_BIN):
+        data = pathlib.Path(path).read_bytes()
+        magic, version, _, n_cls, n_s2t, n_t2s, len_s2t, len_t2s = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a variants file (magic={magic!r}, version={version})")
+        off = HEADER.size
+        arrays = []
+        for n in (n_cls, n_cls, n_s2t, n_s2t, n_t2s, n_t2s):
+            a = array("I")
+            a.frombytes(data[off:off + 4 * n])
+            arrays.append(a)
+            off += 4 * n
+        self._cls_cps, self._cls_rep, s2t_src, s2t_dst, t2s_src, t2s_dst = arrays
+        self._raw = {
+            "trad": (s2t_src, s2t_dst, data[off:off + len_s2t]),
+            "simp": (t2s_src, t2s_dst, data[off + len_s2t:off + len_s2t + len_t2s]),
+        }
+        self._conv = {}
+        self._members = None
+
+    def close(self):
+        self._raw = self._conv = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def converter(self, to):
+        if to not in self._conv:
+            if to not in SCRIPTS:
+                raise ValueError(f"unknown script {to!r}; choose from {', '.join(SCRIPTS)}")
+            src, dst, blob = self._raw[to]
+            phrases = dict(line.split("\t") for line in blob.decode("utf-8").splitlines())
+            self._conv[to] = Converter(dict(zip(src, map(chr, dst))), phrases)
+        return self._conv[to]
+
+    def convert(self, text, to):
+        return self.converter(to)(text)
+
+    def to_trad(self, text):
+        return self.convert(text, "trad")
+
+    def to_simp(self, text):
+        return self.convert(text, "simp")
+
+    def canonical(self, ch):
+        """Canonical member of ch's variant class (ch itself if it has no variants)."""
+        cp = ord(ch)
+        i = bisect.bisect_left(self._cls_cps, cp)
+        return chr(self._cls_rep[i]) if i < len(self._cls_cps) and self._cls_cps[i] == cp else ch
+
+    def members(self, ch):
+        if self._members is None:
+            self._members = defaultdict(list)
+            for cp, rep in zip(self._cls_cps, self._cls_rep):
+                self._members[rep].append(chr(cp))
+        return self._members.get(ord(self.canonical(ch)), [ch])
+
+def load(path=VARIANTS_BIN):
+    # Compile on first use, as 04_merge_hsk does for the CEDICT index
+    if not pathlib.Path(path).exists():
+        compile_variants(dst=path)
+    return Variants(path)
+
+# -- CLI ---------------------------------------------------------------------------
+
+def run_eval(v):
+    """Conversion accuracy against the HSK 3.0 list's own traditional forms, plus throughput."""
+    pairs = []
+    with open(HSK_CSV, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            for s, t in zip(row["Simplified"].split("|"), row["Traditional"].split("|")):
+                if s and t:
+                    pairs.append((s, t))
+    report = {"words": len(pairs)}
+    for to, src, ref in (("trad", 0, 1), ("simp", 1, 0)):
+        conv = v.converter(to)
+        report[f"to_{to}_accuracy"] = round(sum(conv(p[src]) == p[ref] for p in pairs) / len(pairs), 4)
+    text = "，".join(e.simp for e in iter_cedict(CEDICT_GZ))
+    mb = len(text.encode("utf-8")) / 1e6
+    for to, sample in (("trad", text), ("simp", v.to_trad(text))):
+        t0 = time.perf_counter()
+        v.convert(sample, to)
+        report[f"to_{to}_mb_per_s"] = round(mb / (time.perf_counter() - t0), 1)
+    report["sample_mb"] = round(mb, 1)
+    print(json.dumps(report, indent=2))
+
+def handle_request(req, v):
+    resp = {"id": req["id"]} if "id" in req else {}
+    to = req.get("to", "trad")
+    try:
+        if "texts" in req:
+            resp["results"] = [v.convert(str(t), to) for t in req["texts"]]
+        elif "text" in req:
+            resp["text"] = v.convert(str(req["text"]), to)
+        else:
+            resp["error"] = "No text provided"
+    except Exception as e:
+        resp["error"] = str(e)
+    return resp
+
+def main():
+    ap = argparse.ArgumentParser(description="Variant classes and simplified <-> traditional conversion")
+    ap.add_argument("texts", nargs="*", help="texts to convert (default: stdin)")
+    ap.add_argument("--to", choices=SCRIPTS, default="trad")
+    ap.add_argument("--class", dest="klass", metavar="CHAR", help="print CHAR's variant class and canonical member")
+    ap.add_argument("--rebuild", action="store_true", help=f"recompile {VARIANTS_BIN.name} first")
+    ap.add_argument("--eval", action="store_true", help="HSK accuracy and MB/s")
+    ap.add_argument("--serve", action="store_true", help="JSON-lines worker over stdin/stdout")
+    args = ap.parse_args()
+
+    if args.rebuild:
+        print(json.dumps(compile_variants()), file=sys.stderr)
+    t0 = time.perf_counter()
+    v = load()
+    if args.serve:
+        print(json.dumps({"variants": str(VARIANTS_BIN), "load_ms": round((time.perf_counter() - t0) * 1000, 1)}),
+              file=sys.stderr, flush=True)
+        sys.path.insert(0, str(ROOT / "backend"))
+        import jsonl_worker
+        jsonl_worker.serve_stdio(lambda req: handle_request(req, v))
+    elif args.eval:
+        run_eval(v)
+    elif args.klass:
+        print(f"{args.klass}: canonical {v.canonical(args.klass)}, class {' '.join(v.members(args.klass))}")
+    elif args.texts:
+        for t in args.texts:
+            print(v.convert(t, args.to))
+    else:
+        sys.stdout.reconfigure(encoding="utf-8")
+        for line in sys.stdin:
+            sys.stdout.write(v.convert(line, args.to))
+
+if __name__ == "__main__":
+    main()
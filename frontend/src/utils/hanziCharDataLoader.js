@@ -1,4 +1,17 @@
 // src/utils/hanziCharDataLoader.js
+
+// Whether the server has a packed stroke bundle; asked once per page load
+let bundleAvailable = null;
+function strokeBundleAvailable() {
+  if (bundleAvailable === null) {
+    bundleAvailable = fetch('/api/strokes')
+      .then((res) => (res.ok ? res.json() : { available: false }))
+      .then((body) => Boolean(body.available))
+      .catch(() => false);
+  }
+  return bundleAvailable;
+}
+
 export async function loadCharData(hanzi) {
   // Try a filename with the character itself (needs encoding for radicals/supplement chars)
   const charUrl = `/data/30_strokes/hanzi_writer_data/data/${encodeURIComponent(hanzi)}.json`;
@@ -12,6 +25,14 @@ export async function loadCharData(hanzi) {
     return res.json();
   };
 
+  // Packed bundle first when there is one; loose files remain as a fallback
+  if (await strokeBundleAvailable()) {
+    try {
+      return await fetchJson(`/api/strokes/${encodeURIComponent(hanzi)}`);
+    } catch {
+      // not in the bundle: fall through to the loose files
+    }
+  }
   try {
     return await fetchJson(charUrl);
   } catch {